@@ -4,11 +4,12 @@ from rangefilter.filters import DateRangeFilter
 
 from credit_notes.models import CreditNote
 from credit_notes.resources import CreditNoteResource
+from mode_groothandel.exports import BackgroundCsvExportMixin
 from mutations.admin import MutationInline, SucceededMutationFilter
 
 
 @admin.register(CreditNote)
-class CreditNoteAdmin(ExportMixin, admin.ModelAdmin):
+class CreditNoteAdmin(BackgroundCsvExportMixin, ExportMixin, admin.ModelAdmin):
     """Credit Note Admin."""
 
     resource_class = CreditNoteResource
@@ -5,11 +5,14 @@ from typing import Optional
 from django.conf import settings
 from django.core.management import BaseCommand
 
-from credit_notes.services import try_create_credit_note
+from credit_notes.services import try_create_credit_note, try_update_credit_note
 from mode_groothandel.clients.api import ApiException
+from mode_groothandel.exceptions import SynchronizationError
 from mutations.models import Mutation
 from snelstart.clients.snelstart import Snelstart
+from uphance.backfill import BackfillEngine
 from uphance.clients.uphance import Uphance
+from uphance.services import CREDIT_NOTES
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +40,13 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         """Add command line arguments."""
         parser.add_argument("credit-notes", type=str)
+        parser.add_argument("--workers", type=int, default=settings.BACKFILL_WORKERS)
+        parser.add_argument("--restart", action="store_true", help="Start over instead of resuming an earlier run")
+        parser.add_argument(
+            "--force-update",
+            action="store_true",
+            help="Update credit notes that are already synchronised instead of skipping them",
+        )
 
     def handle(self, *args, **options):
         """Execute the command."""
@@ -50,12 +60,40 @@ class Command(BaseCommand):
             return
 
         snelstart_client = Snelstart.get_client()
-        for credit_note_id in credit_notes:
-            try:
-                credit_note = uphance_client.credit_note(credit_note_id)
-                if credit_note is not None:
-                    try_create_credit_note(uphance_client, snelstart_client, credit_note, Mutation.TRIGGER_MANUAL)
-                else:
-                    logger.warning(f"Invoice {credit_note_id} was not found in Uphance!")
-            except ApiException as e:
-                logger.error(f"An API exception occurred while synchronizing invoice {credit_note_id}: {e}")
+        if len(credit_notes) == 1:
+            self.synchronize_credit_note(uphance_client, snelstart_client, credit_notes.start, options["force_update"])
+        else:
+            self.synchronize_credit_notes(
+                credit_notes, options["workers"], options["restart"], options["force_update"]
+            )
+
+    def synchronize_credit_note(
+        self, uphance_client: Uphance, snelstart_client: Snelstart, credit_note_id: int, force_update: bool
+    ):
+        """Synchronize a single credit note, a credit note that is already synchronised is only updated when forced."""
+        synchronised = credit_note_id in CREDIT_NOTES.synchronised_ids(uphance_id=credit_note_id)
+        if synchronised and not force_update:
+            logger.info(f"Skipped credit note {credit_note_id} because it is already synchronised")
+            return
+
+        try:
+            credit_note = uphance_client.credit_note(credit_note_id)
+            if credit_note is not None and synchronised:
+                try_update_credit_note(uphance_client, snelstart_client, credit_note, Mutation.TRIGGER_MANUAL)
+            elif credit_note is not None:
+                try_create_credit_note(uphance_client, snelstart_client, credit_note, Mutation.TRIGGER_MANUAL)
+            else:
+                logger.warning(f"Invoice {credit_note_id} was not found in Uphance!")
+        except ApiException as e:
+            logger.error(f"An API exception occurred while synchronizing invoice {credit_note_id}: {e}")
+
+    def synchronize_credit_notes(self, credit_notes: range, workers: int, restart: bool, force_update: bool):
+        """Synchronize a range of credit notes with the backfill engine, an interrupted run is resumed."""
+        try:
+            BackfillEngine(
+                CREDIT_NOTES, credit_notes, workers=workers, restart=restart, force_update=force_update
+            ).run()
+        except (ApiException, SynchronizationError) as e:
+            logger.error(
+                f"An exception occurred while synchronizing credit notes {credit_notes.start}-{credit_notes.stop}: {e}"
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("credit_notes", "0002_alter_creditnote_credit_note_number_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="creditnote",
+            name="synchronised_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:38
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def set_last_mutation(apps, schema_editor):
+    """Set the status of the latest Mutation on every credit note."""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    Mutation = apps.get_model("mutations", "Mutation")
+    CreditNote = apps.get_model("credit_notes", "CreditNote")
+
+    content_type = ContentType.objects.filter(app_label="credit_notes", model="creditnote").first()
+    if content_type is None:
+        return
+
+    latest_mutation = Mutation.objects.filter(content_type=content_type, object_id=OuterRef("pk")).order_by(
+        "-created", "-id"
+    )
+    CreditNote.objects.update(
+        last_mutation_success=Subquery(latest_mutation.values("success")[:1]),
+        last_mutation_at=Subquery(latest_mutation.values("created")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("mutations", "0003_mutation_mutations_m_content_59be14_idx_and_more"),
+        ("credit_notes", "0003_creditnote_synchronised_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="creditnote",
+            name="last_mutation_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="creditnote",
+            name="last_mutation_success",
+            field=models.BooleanField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(set_last_mutation, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,21 @@
 import logging
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 
 from credit_notes.models import CreditNote
 from invoices.services import round_half_up
 from mode_groothandel.clients.api import ApiException
+from mode_groothandel.clients.utils import payload_fingerprint
 from mode_groothandel.exceptions import SynchronizationError
-from customers.services import match_or_create_snelstart_relatie_with_name
+from mode_groothandel.locks import keyed_lock
+from customers.resolution import CustomerResolutionContext
 from mutations.models import Mutation
+from mutations.services import record_mutation
 from snelstart.clients.snelstart import Snelstart
 from snelstart.constants import BTW_VERKOPEN_PREFIX
 from uphance.clients.models.credit_note import CreditNote as UphanceCreditNote
 from uphance.clients.uphance import Uphance
 from uphance.models import TaxMapping
+from uphance.tax_mappings import tax_mapping_resolver
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -29,8 +33,6 @@ def construct_order_and_tax_line_items(
     to_order = list()
     # Dictionary mapping tax percentages to the total amount to compute the tax over.
     compute_tax_over_amount = dict()
-    # The tax mappings belonging to the channel of the credit note.
-    filtered_tax_mappings = TaxMapping.objects.filter(channel_mapping__channel__channel_id=channel_id)
     for item in credit_note.line_items:
         amount = sum([x.quantity for x in item.line_quantities])
 
@@ -46,7 +48,7 @@ def construct_order_and_tax_line_items(
                 price_minus_tax = total_price_line
 
             try:
-                tax_mapping = filtered_tax_mappings.get(tax_amount__btw_percentage=item.tax_level)
+                tax_mapping = tax_mapping_resolver.get(channel_id, item.tax_level)
             except TaxMapping.DoesNotExist:
                 raise SynchronizationError(
                     f"Tax mapping for tax amount {item.tax_level} in channel {channel_id} does not exist"
@@ -63,7 +65,7 @@ def construct_order_and_tax_line_items(
                         "id": str(tax_mapping.grootboekcode),
                     },
                     "bedrag": "{:.2f}".format(price_minus_tax),
-                    "btwSoort": tax_mapping.tax_amount.btw_soort,
+                    "btwSoort": tax_mapping.btw_soort,
                 }
             )
 
@@ -79,7 +81,7 @@ def construct_order_and_tax_line_items(
         computed_tax_level_2_decimals = "{:.1f}".format(computed_tax_level)
 
         try:
-            tax_mapping = filtered_tax_mappings.get(tax_amount=float(computed_tax_level_2_decimals))
+            tax_mapping = tax_mapping_resolver.get(channel_id, computed_tax_level_2_decimals)
         except TaxMapping.DoesNotExist:
             raise SynchronizationError(
                 f"Error finding tax mapping for freeform amount: Tax mapping for computed tax amount "
@@ -95,7 +97,7 @@ def construct_order_and_tax_line_items(
                     "id": str(tax_mapping.grootboekcode),
                 },
                 "bedrag": "{:.2f}".format(credit_note.freeform_amount * -1),
-                "btwSoort": tax_mapping.tax_amount.btw_soort,
+                "btwSoort": tax_mapping.btw_soort,
             }
         )
 
@@ -108,9 +110,7 @@ def construct_order_and_tax_line_items(
     tax_lines = dict()
 
     for tax_mapping, total_amount_to_compute_tax_over in compute_tax_over_amount.items():
-        tax_lines[tax_mapping.tax_amount.btw_soort] = (
-            total_amount_to_compute_tax_over * tax_mapping.tax_amount.btw_percentage / 100
-        )
+        tax_lines[tax_mapping.btw_soort] = total_amount_to_compute_tax_over * tax_mapping.btw_percentage / 100
 
     tax_lines = [
         # Round tax amount by 2 digits.
@@ -123,11 +123,18 @@ def construct_order_and_tax_line_items(
 
 
 def setup_credit_note_for_synchronisation(
-    uphance_client: Uphance, snelstart_client: Snelstart, credit_note: UphanceCreditNote, trigger
+    uphance_client: Uphance,
+    snelstart_client: Snelstart,
+    credit_note: UphanceCreditNote,
+    trigger,
+    customer_context: Optional[CustomerResolutionContext] = None,
 ) -> dict:
     """Setup a credit note from Uphance for synchronisation to Snelstart."""
+    if customer_context is None:
+        customer_context = CustomerResolutionContext(uphance_client, snelstart_client, trigger)
+
     try:
-        orders = uphance_client.orders(credit_note.order_number)
+        orders = customer_context.orders(credit_note.order_number)
     except ApiException as e:
         raise SynchronizationError(f"An error occurred while requesting order number {credit_note.order_number}: {e}")
 
@@ -138,7 +145,7 @@ def setup_credit_note_for_synchronisation(
             f"Retrieved {len(orders.objects)} orders for credit note {credit_note.id} where one was expected"
         )
     try:
-        customer = uphance_client.customer_by_id(order.company_id)
+        customer = customer_context.customer_by_id(order.company_id)
     except ApiException as e:
         raise SynchronizationError(
             f"An error occurred while requesting customer with company id {order.company_id}: {e}"
@@ -158,7 +165,7 @@ def setup_credit_note_for_synchronisation(
         line_item.original_price = line_item.original_price * -1
 
     grootboek_regels, tax_lines = construct_order_and_tax_line_items(credit_note, line_items_include_tax)
-    snelstart_relatie_for_order = match_or_create_snelstart_relatie_with_name(snelstart_client, customer, trigger)
+    snelstart_relatie_for_order = customer_context.relatie_for(customer)
 
     if snelstart_relatie_for_order is None:
         raise SynchronizationError(
@@ -189,124 +196,173 @@ def get_or_create_credit_note_in_database(credit_note: UphanceCreditNote) -> Cre
         )
 
 
-def try_delete_credit_note(snelstart_client: Snelstart, credit_note_id: int, trigger: int) -> None:
-    try:
-        credit_note_in_database = CreditNote.objects.get(uphance_id=credit_note_id)
-    except CreditNote.DoesNotExist:
-        credit_note_in_database = CreditNote.objects.create(
-            uphance_id=credit_note_id,
-        )
-    if credit_note_in_database.snelstart_id is None:
-        Mutation.objects.create(
-            method=Mutation.METHOD_DELETE,
-            trigger=trigger,
-            on=credit_note_in_database,
-            success=False,
-            message=f"Unable to delete credit note {credit_note_id} because no Snelstart ID was found in the database",
-        )
+def try_delete_credit_note(snelstart_client: Snelstart, credit_note_id: int, trigger: int) -> Optional[Exception]:
+    with keyed_lock(f"credit_note:{credit_note_id}"):
+        try:
+            credit_note_in_database = CreditNote.objects.get(uphance_id=credit_note_id)
+        except CreditNote.DoesNotExist:
+            credit_note_in_database = CreditNote.objects.create(
+                uphance_id=credit_note_id,
+            )
+        if credit_note_in_database.snelstart_id is None:
+            error = SynchronizationError(
+                f"Unable to delete credit note {credit_note_id} because no Snelstart ID was found in the database"
+            )
+            record_mutation(
+                method=Mutation.METHOD_DELETE,
+                trigger=trigger,
+                on=credit_note_in_database,
+                success=False,
+                message=str(error),
+            )
+            return error
 
-    try:
-        snelstart_client.delete_verkoopboeking(credit_note_in_database.snelstart_id)
-        Mutation.objects.create(
-            method=Mutation.METHOD_DELETE,
-            trigger=trigger,
-            on=credit_note_in_database,
-            success=True,
-            message=None,
-        )
-    except ApiException as e:
-        Mutation.objects.create(
-            method=Mutation.METHOD_DELETE,
-            trigger=trigger,
-            on=credit_note_in_database,
-            success=False,
-            message=f"An API error occurred for credit note {credit_note_id}: {e}",
-        )
+        try:
+            snelstart_client.delete_verkoopboeking(credit_note_in_database.snelstart_id)
+            record_mutation(
+                method=Mutation.METHOD_DELETE,
+                trigger=trigger,
+                on=credit_note_in_database,
+                success=True,
+                message=None,
+            )
+        except ApiException as e:
+            record_mutation(
+                method=Mutation.METHOD_DELETE,
+                trigger=trigger,
+                on=credit_note_in_database,
+                success=False,
+                message=f"An API error occurred for credit note {credit_note_id}: {e}",
+            )
+            return e
 
 
 def try_update_credit_note(
-    uphance_client: Uphance, snelstart_client: Snelstart, credit_note: UphanceCreditNote, trigger: int
-) -> None:
-    credit_note_in_database = get_or_create_credit_note_in_database(credit_note)
-
-    credit_note_in_database.credit_note_number = credit_note.credit_note_number
-    credit_note_in_database.credit_note_total = credit_note.items_total + credit_note.items_tax
-    credit_note_in_database.save()
-
-    if credit_note_in_database.snelstart_id is None:
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=credit_note_in_database,
-            success=False,
-            message=f"Unable to update credit note {credit_note.id} because no Snelstart ID was found in the database",
-        )
-        return
+    uphance_client: Uphance,
+    snelstart_client: Snelstart,
+    credit_note: UphanceCreditNote,
+    trigger: int,
+    customer_context: Optional[CustomerResolutionContext] = None,
+) -> Optional[Exception]:
+    with keyed_lock(f"credit_note:{credit_note.id}"):
+        credit_note_in_database = get_or_create_credit_note_in_database(credit_note)
+
+        credit_note_in_database.credit_note_number = credit_note.credit_note_number
+        credit_note_in_database.credit_note_total = credit_note.items_total + credit_note.items_tax
+        credit_note_in_database.save()
+
+        if credit_note_in_database.snelstart_id is None:
+            error = SynchronizationError(
+                f"Unable to update credit note {credit_note.id} because no Snelstart ID was found in the database"
+            )
+            record_mutation(
+                method=Mutation.METHOD_UPDATE,
+                trigger=trigger,
+                on=credit_note_in_database,
+                success=False,
+                message=str(error),
+            )
+            return error
 
-    try:
-        credit_note_converted = setup_credit_note_for_synchronisation(
-            uphance_client, snelstart_client, credit_note, trigger
-        )
         try:
-            snelstart_client.update_verkoopboeking(credit_note_in_database.snelstart_id, credit_note_converted)
-        except ApiException as e:
-            raise SynchronizationError(
-                f"An error occurred while updating verkoopboeking {credit_note_in_database.snelstart_id} for credit "
-                f"note {credit_note.id} in Snelstart: {e}"
+            credit_note_converted = setup_credit_note_for_synchronisation(
+                uphance_client, snelstart_client, credit_note, trigger, customer_context
             )
-        logger.info(f"Successfully updated credit note {credit_note.id}")
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=credit_note_in_database,
-            success=True,
-            message=None,
-        )
-    except SynchronizationError as e:
-        logger.error(f"A Synchronization error occurred while updating credit note {credit_note.id}: {e}")
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=credit_note_in_database,
-            success=False,
-            message=f"A Synchronization error occurred while updating credit note {credit_note.id}: {e}",
-        )
+            credit_note_hash = payload_fingerprint(credit_note_converted)
+            if credit_note_hash == credit_note_in_database.synchronised_hash:
+                logger.info(f"Skipped updating credit note {credit_note.id} because it did not change")
+                record_mutation(
+                    method=Mutation.METHOD_UPDATE,
+                    trigger=trigger,
+                    on=credit_note_in_database,
+                    success=True,
+                    message="Skipped update because the credit note did not change since the last synchronisation.",
+                )
+                return
+
+            try:
+                snelstart_client.update_verkoopboeking(credit_note_in_database.snelstart_id, credit_note_converted)
+            except ApiException as e:
+                raise SynchronizationError(
+                    f"An error occurred while updating verkoopboeking {credit_note_in_database.snelstart_id} for "
+                    "credit "
+                    f"note {credit_note.id} in Snelstart: {e}"
+                )
+            logger.info(f"Successfully updated credit note {credit_note.id}")
+            credit_note_in_database.synchronised_hash = credit_note_hash
+            credit_note_in_database.save()
+            record_mutation(
+                method=Mutation.METHOD_UPDATE,
+                trigger=trigger,
+                on=credit_note_in_database,
+                success=True,
+                message=None,
+            )
+        except SynchronizationError as e:
+            logger.error(f"A Synchronization error occurred while updating credit note {credit_note.id}: {e}")
+            record_mutation(
+                method=Mutation.METHOD_UPDATE,
+                trigger=trigger,
+                on=credit_note_in_database,
+                success=False,
+                message=f"A Synchronization error occurred while updating credit note {credit_note.id}: {e}",
+            )
+            return e
 
 
 def try_create_credit_note(
-    uphance_client: Uphance, snelstart_client: Snelstart, credit_note: UphanceCreditNote, trigger: int
-) -> None:
-    credit_note_in_database = get_or_create_credit_note_in_database(credit_note)
+    uphance_client: Uphance,
+    snelstart_client: Snelstart,
+    credit_note: UphanceCreditNote,
+    trigger: int,
+    customer_context: Optional[CustomerResolutionContext] = None,
+) -> Optional[Exception]:
+    with keyed_lock(f"credit_note:{credit_note.id}"):
+        credit_note_in_database = get_or_create_credit_note_in_database(credit_note)
+        if credit_note_in_database.snelstart_id is not None:
+            # A concurrent (or earlier) synchronisation already created the credit note.
+            logger.info(f"Skipped creating credit note {credit_note.id} because it is already synchronised")
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=credit_note_in_database,
+                success=True,
+                message="Skipped creation because the credit note was already synchronised.",
+            )
+            return
 
-    try:
-        credit_note_converted = setup_credit_note_for_synchronisation(
-            uphance_client, snelstart_client, credit_note, trigger
-        )
         try:
-            verkoopboeking = snelstart_client.add_verkoopboeking(credit_note_converted)
-        except ApiException as e:
-            raise SynchronizationError(
-                f"An error occurred while adding a verkoopboeking for credit note {credit_note.credit_note_number} to "
-                f"Snelstart: {e}"
+            credit_note_converted = setup_credit_note_for_synchronisation(
+                uphance_client, snelstart_client, credit_note, trigger, customer_context
             )
+            try:
+                verkoopboeking = snelstart_client.add_verkoopboeking(credit_note_converted)
+            except ApiException as e:
+                raise SynchronizationError(
+                    "An error occurred while adding a verkoopboeking for credit note "
+                    f"{credit_note.credit_note_number} to "
+                    f"Snelstart: {e}"
+                )
 
-        logger.info(f"Successfully synchronized credit note {credit_note.id}")
-
-        credit_note_in_database.snelstart_id = verkoopboeking["id"]
-        credit_note_in_database.save()
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=credit_note_in_database,
-            success=True,
-            message=None,
-        )
-    except SynchronizationError as e:
-        logger.error(f"A Synchronization error occurred for credit note {credit_note.id}: {e}")
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=credit_note_in_database,
-            success=False,
-            message=f"A Synchronization error occurred for credit note {credit_note.id}: {e}",
-        )
+            logger.info(f"Successfully synchronized credit note {credit_note.id}")
+
+            credit_note_in_database.snelstart_id = verkoopboeking["id"]
+            credit_note_in_database.synchronised_hash = payload_fingerprint(credit_note_converted)
+            credit_note_in_database.save()
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=credit_note_in_database,
+                success=True,
+                message=None,
+            )
+        except SynchronizationError as e:
+            logger.error(f"A Synchronization error occurred for credit note {credit_note.id}: {e}")
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=credit_note_in_database,
+                success=False,
+                message=f"A Synchronization error occurred for credit note {credit_note.id}: {e}",
+            )
+            return e
@@ -1,8 +1,6 @@
 from django.contrib import admin
 from django.contrib import messages
 from django.contrib.admin.utils import quote
-from django.contrib.contenttypes.models import ContentType
-from django.db.models import Exists, Subquery, OuterRef
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from import_export.admin import ExportMixin
@@ -12,70 +10,15 @@ from customers.resources import CustomerResource
 from customers.services import match_or_create_snelstart_relatie_with_name
 from mode_groothandel.clients.api import ApiException
 from mode_groothandel.exceptions import SynchronizationError
-from mutations.admin import MutationInline
+from mode_groothandel.exports import BackgroundCsvExportMixin
+from mutations.admin import MutationInline, SucceededMutationFilter
 from mutations.models import Mutation
 from snelstart.clients.snelstart import Snelstart
 from uphance.clients.uphance import Uphance
 
 
-class SucceededMutationFilter(admin.SimpleListFilter):
-    title = "succeeded mutation"
-
-    parameter_name = "succeeded_mutation"
-
-    def __init__(self, *args, **kwargs):
-        super(SucceededMutationFilter, self).__init__(*args, **kwargs)
-        self.content_type = ContentType.objects.get_for_model(Customer)
-
-    def lookups(self, request, model_admin):
-        return [
-            ("exists", "At least one succeeded mutation"),
-            ("not_exists", "No succeeded mutations"),
-            ("latest", "Latest mutation must be succeeded"),
-            ("not_latest", "Latest mutation must be failed"),
-        ]
-
-    def queryset(self, request, queryset):
-        if self.value() == "exists":
-            return queryset.filter(
-                Exists(
-                    Mutation.objects.filter(content_type=self.content_type, object_id=OuterRef("pk")).exclude(
-                        success=False
-                    )
-                )
-            )
-        elif self.value() == "not_exists":
-            return queryset.exclude(
-                id__in=Subquery(
-                    Mutation.objects.filter(content_type=self.content_type)
-                    .exclude(success=False)
-                    .values("object_id")
-                    .distinct()
-                    .all()
-                )
-            )
-        elif self.value() == "latest":
-            return queryset.annotate(
-                latest_success=Subquery(
-                    Mutation.objects.filter(content_type=self.content_type, object_id=OuterRef("pk"))
-                    .order_by("-created")
-                    .values("success")[:1]
-                )
-            ).filter(latest_success=True)
-        elif self.value() == "not_latest":
-            return queryset.annotate(
-                latest_success=Subquery(
-                    Mutation.objects.filter(content_type=self.content_type, object_id=OuterRef("pk"))
-                    .order_by("-created")
-                    .values("success")[:1]
-                )
-            ).filter(latest_success=False)
-
-        return queryset
-
-
 @admin.register(Customer)
-class CustomerAdmin(ExportMixin, admin.ModelAdmin):
+class CustomerAdmin(BackgroundCsvExportMixin, ExportMixin, admin.ModelAdmin):
     """Customer Admin."""
 
     resource_class = CustomerResource
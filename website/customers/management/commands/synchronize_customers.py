@@ -1,5 +1,4 @@
 import logging
-from time import sleep
 
 from django.conf import settings
 from django.core.management import BaseCommand
@@ -8,6 +7,7 @@ from customers.services import match_or_create_snelstart_relatie_with_name
 from mode_groothandel.clients.api import ApiException
 from mode_groothandel.exceptions import SynchronizationError
 from mutations.models import Mutation
+from mutations.services import buffered_mutations
 from snelstart.clients.snelstart import Snelstart
 from uphance.clients.uphance import Uphance
 
@@ -20,7 +20,7 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         """Add command line arguments."""
         parser.add_argument("--customer", type=int, required=False)
-        parser.add_argument("--timeout", type=int, required=False)
+        parser.add_argument("--workers", type=int, default=settings.UPHANCE_SWEEP_WORKERS)
 
     def handle(self, *args, **options):
         """Execute the command."""
@@ -40,14 +40,11 @@ class Command(BaseCommand):
             match_or_create_snelstart_relatie_with_name(snelstart_client, customer, Mutation.TRIGGER_MANUAL)
             return
         else:
-            next_page = 1
-
             counter_processed = 0
             counter_errors = 0
 
-            while next_page is not None:
-                customers = uphance_client.customers(page=next_page)
-                for customer in customers.objects:
+            with buffered_mutations():
+                for customer in uphance_client.iter_customers(workers=options["workers"]):
                     try:
                         match_or_create_snelstart_relatie_with_name(
                             snelstart_client, customer, Mutation.TRIGGER_MANUAL
@@ -57,11 +54,6 @@ class Command(BaseCommand):
                         print(e)
                     counter_processed += 1
 
-                next_page = customers.meta.next_page
-                if next_page is not None and options["timeout"] is not None:
-                    print("Sleeping {} seconds.".format(options["timeout"]))
-                    sleep(options["timeout"])
-
             counter_success = counter_processed - counter_errors
 
             print(f"Synchronized {counter_success} out of {counter_processed} customers ({counter_errors} errors)")
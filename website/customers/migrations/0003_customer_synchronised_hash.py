@@ -0,0 +1,18 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0002_alter_customer_snelstart_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="synchronised_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -8,6 +8,13 @@ class Customer(models.Model):
     snelstart_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
     uphance_name = models.CharField(max_length=255)
     snelstart_name = models.CharField(max_length=255, null=True, blank=True)
+    # Fingerprint of the payload last written to Snelstart, used to skip writes that would not change anything.
+    synchronised_hash = models.CharField(max_length=64, null=True, blank=True)
+    # Status of the latest Mutation on this object, maintained by mutations.services.record_mutation.
+    last_mutation_success = models.BooleanField(null=True, blank=True, editable=False, db_index=True)
+    last_mutation_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Whether a Mutation on this object ever succeeded, kept when its Mutations are archived.
+    ever_succeeded = models.BooleanField(default=False, editable=False, db_index=True)
 
     def __str__(self):
         """Convert this object to string."""
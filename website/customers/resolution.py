@@ -0,0 +1,128 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+from customers.services import match_or_create_snelstart_relatie_with_name
+from mode_groothandel.clients.api import ApiException
+from mode_groothandel.exceptions import SynchronizationError
+from snelstart.clients.models.relatie import Relatie as SnelstartRelatie
+from snelstart.clients.snelstart import Snelstart
+from uphance.clients.models.api_page import ApiPage
+from uphance.clients.models.customer import Customer as UphanceCustomer
+from uphance.clients.models.sales_order import SalesOrder as UphanceSalesOrder
+from uphance.clients.uphance import Uphance
+
+logger = logging.getLogger(__name__)
+
+
+class CustomerResolutionContext:
+    """
+    Resolve Uphance customers and their Snelstart relaties once per batch of documents.
+
+    Customers, sales orders and relaties are remembered for the lifetime of the context, so documents of the same
+    customer do not retrieve the customer from Uphance or match (and update) the relatie in Snelstart again.
+    Synchronisation errors are remembered as well and raised again for every document that needs the failed customer.
+    """
+
+    def __init__(
+        self, uphance_client: Uphance, snelstart_client: Snelstart, trigger: int, workers: Optional[int] = None
+    ):
+        """Initialize a Customer Resolution Context."""
+        self.uphance_client = uphance_client
+        self.snelstart_client = snelstart_client
+        self.trigger = trigger
+        self.workers = workers if workers is not None else settings.CUSTOMER_RESOLUTION_WORKERS
+        self._customers: Dict[int, UphanceCustomer | Exception] = dict()
+        self._orders: Dict[int, ApiPage[UphanceSalesOrder] | Exception] = dict()
+        self._relaties: Dict[int, SnelstartRelatie | Exception] = dict()
+        self._locks: Dict[Tuple[int, Any], threading.Lock] = dict()
+        self._locks_lock = threading.Lock()
+
+    def _key_lock(self, memory: Dict, key: Any) -> threading.Lock:
+        """Get the lock for resolving a key of a memory."""
+        with self._locks_lock:
+            return self._locks.setdefault((id(memory), key), threading.Lock())
+
+    def _memoize[K, V](self, memory: Dict[K, V | Exception], key: K, resolve: Callable[[], V]) -> V:
+        """
+        Get a value from memory, resolve (and remember) it when it is not present.
+
+        A key is resolved by one thread at a time, so a customer is never matched or created concurrently. Only
+        synchronisation errors are remembered, an API error (e.g. a timeout) is raised and the key is resolved again
+        on the next lookup.
+        """
+        with self._key_lock(memory, key):
+            if key not in memory:
+                try:
+                    memory[key] = resolve()
+                except SynchronizationError as e:
+                    memory[key] = e
+
+            value = memory[key]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def customer_by_id(self, customer_id: int) -> UphanceCustomer:
+        """Get an Uphance customer."""
+        return self._memoize(self._customers, customer_id, lambda: self.uphance_client.customer_by_id(customer_id))
+
+    def orders(self, order_number: int) -> ApiPage[UphanceSalesOrder]:
+        """Get the Uphance sales orders with an order number."""
+        return self._memoize(self._orders, order_number, lambda: self.uphance_client.orders(order_number))
+
+    def relatie_for(self, customer: UphanceCustomer) -> SnelstartRelatie:
+        """Get (match or create) the Snelstart relatie of an Uphance customer."""
+        return self._memoize(
+            self._relaties,
+            customer.id,
+            lambda: match_or_create_snelstart_relatie_with_name(self.snelstart_client, customer, self.trigger),
+        )
+
+    def _run_concurrently[T](self, function: Callable[[T], None], items: Iterable[T]) -> None:
+        """Run a function for all items on a thread pool, errors are remembered by the functions themselves."""
+
+        def run(item: T) -> None:
+            try:
+                function(item)
+            except ApiException, SynchronizationError:
+                pass
+            finally:
+                # Threads get their own database connections, which are not closed by Django.
+                connections.close_all()
+
+        items = list(items)
+        if len(items) == 0:
+            return
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(items)))) as executor:
+            # Run in a copy of the current context, so Mutations are recorded in the recorder of this thread.
+            futures = [executor.submit(contextvars.copy_context().run, run, item) for item in items]
+            for future in futures:
+                future.result()
+
+    def prefetch_customers(self, customer_ids: Iterable[int]) -> None:
+        """Retrieve customers and resolve their relaties concurrently, before documents are posted."""
+
+        def resolve(customer_id: int) -> None:
+            self.relatie_for(self.customer_by_id(customer_id))
+
+        customer_ids = set(customer_ids) - self._relaties.keys()
+        logger.debug(f"Resolving {len(customer_ids)} customers")
+        self._run_concurrently(resolve, customer_ids)
+
+    def prefetch_orders(self, order_numbers: Iterable[int]) -> None:
+        """Retrieve sales orders concurrently and resolve the customers of the orders."""
+        order_numbers = set(order_numbers) - self._orders.keys()
+        self._run_concurrently(self.orders, order_numbers)
+
+        customer_ids = set()
+        for order_number in order_numbers:
+            orders = self._orders.get(order_number, None)
+            if isinstance(orders, ApiPage) and len(orders.objects) > 0:
+                customer_ids.add(orders.objects[0].company_id)
+        self.prefetch_customers(customer_ids)
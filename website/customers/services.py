@@ -1,33 +1,28 @@
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, List
 
 from customers.models import Customer
 from mode_groothandel.clients.api import ApiException
+from mode_groothandel.clients.utils import payload_fingerprint
 from mode_groothandel.exceptions import SynchronizationError
+from mode_groothandel.locks import keyed_lock
 from mutations.models import Mutation
+from mutations.services import record_mutation
 
 from snelstart.clients.models.relatie import Relatie as SnelstartRelatie
-from snelstart.models import CachedLand
+from snelstart.models import CachedRelatie
+from snelstart.services import cache_relatie, normalize_relatie_name
 from uphance.clients.models.customer import Customer as UphanceCustomer
 from uphance.clients.models.person import Person as UphancePerson
 from snelstart.clients.snelstart import Snelstart
 from uphance.clients.models.customer_address import CustomerAddress as UphanceCustomerAddress
-from uphance.models import Country as UphanceCountry
+from uphance.countries import country_resolver, ResolvedLand
 
 
-def convert_address_information(address: UphanceCustomerAddress) -> Optional[Tuple[dict, CachedLand]]:
+def convert_address_information(address: UphanceCustomerAddress) -> Optional[Tuple[dict, ResolvedLand]]:
     """Convert address information of an Uphance customer to address information for Snelstart."""
-    uphance_country, _ = UphanceCountry.objects.get_or_create(country_code=address.country)
-
-    if uphance_country.mapped_country_code_in_snelstart is not None:
-        # If a custom mapping exists.
-        snelstart_country = uphance_country.mapped_country_code_in_snelstart
-    else:
-        try:
-            snelstart_country = CachedLand.objects.get(landcode=address.country)
-        except CachedLand.DoesNotExist:
-            return None
-        except CachedLand.MultipleObjectsReturned:
-            return None
+    snelstart_country = country_resolver.get_land(address.country)
+    if snelstart_country is None:
+        return None
 
     return (
         {
@@ -75,7 +70,7 @@ def retrieve_contact_from_uphance_customer(customer: UphanceCustomer) -> Optiona
     return None
 
 
-def normalize_tax_number(btw_nummer: str, snelstart_country: Optional[CachedLand]):
+def normalize_tax_number(btw_nummer: str, snelstart_country: Optional[ResolvedLand]):
     """Normalize a tax number by applying some standard operations."""
     btw_nummer = btw_nummer.replace(" ", "").replace(".", "").replace("-", "")
 
@@ -127,127 +122,182 @@ def convert_uphance_customer_to_relatie(customer: UphanceCustomer) -> Dict[str,
     }
 
 
+def find_matching_relaties(
+    snelstart_client: Snelstart, name: str, btw_nummer: Optional[str]
+) -> List[SnelstartRelatie]:
+    """
+    Find the relaties in Snelstart matching a name (or tax number).
+
+    Relaties are matched with the cached relaties first. Only when no cached relatie matches (for example because it
+    was created in Snelstart after the last refresh), Snelstart is asked for relaties with the name.
+    """
+    cached_relaties = list(CachedRelatie.objects.filter(normalized_naam=normalize_relatie_name(name)))
+    if len(cached_relaties) == 0 and btw_nummer:
+        cached_relaties = list(CachedRelatie.objects.filter(btw_nummer=btw_nummer))
+    if len(cached_relaties) > 0:
+        return [
+            SnelstartRelatie(
+                _id=str(cached_relatie.snelstart_id),
+                naam=cached_relatie.naam,
+                email=cached_relatie.email,
+                telefoon=cached_relatie.telefoon,
+                btw_nummer=cached_relatie.btw_nummer,
+                modified_on=cached_relatie.modified_on,
+            )
+            for cached_relatie in cached_relaties
+        ]
+
+    name_escaped = name.replace("'", "''")
+    try:
+        relaties = snelstart_client.get_relaties(_filter=f"Naam eq '{name_escaped}'")
+    except ApiException as e:
+        raise SynchronizationError(f"An error occurred while retrieving relations for name {name} from Snelstart: {e}")
+
+    for relatie in relaties:
+        cache_relatie(relatie)
+    return relaties
+
+
 def match_or_create_snelstart_relatie_with_name(
     snelstart_client: Snelstart, customer: UphanceCustomer, trigger
 ) -> SnelstartRelatie:
     """Get or create a Snelstart relation with a name."""
-    customer_in_database, _ = Customer.objects.get_or_create(uphance_id=customer.id)
-    customer_in_database.uphance_name = customer.name
-    customer_in_database.save()
-
-    customer_converted_to_snelstart_relatie = convert_uphance_customer_to_relatie(customer)
-    converted_name = customer_converted_to_snelstart_relatie["naam"]
-
-    if customer_in_database.snelstart_id is not None:
-        # We have already matched this customer once.
-        try:
-            # We need to provide the same ID.
-            customer_converted_to_snelstart_relatie["id"] = customer_in_database.snelstart_id
-            relatie = snelstart_client.update_relatie(
-                customer_in_database.snelstart_id,
-                customer_converted_to_snelstart_relatie,
-            )
-        except ApiException as e:
-            Mutation.objects.create(
+    with keyed_lock(f"customer:{customer.id}"):
+        customer_in_database, _ = Customer.objects.get_or_create(uphance_id=customer.id)
+        customer_in_database.uphance_name = customer.name
+        customer_in_database.save()
+
+        customer_converted_to_snelstart_relatie = convert_uphance_customer_to_relatie(customer)
+        converted_name = customer_converted_to_snelstart_relatie["naam"]
+
+        if customer_in_database.snelstart_id is not None:
+            # We have already matched this customer once.
+            relatie_hash = payload_fingerprint(customer_converted_to_snelstart_relatie)
+            if relatie_hash == customer_in_database.synchronised_hash:
+                record_mutation(
+                    method=Mutation.METHOD_UPDATE,
+                    trigger=trigger,
+                    on=customer_in_database,
+                    success=True,
+                    message="Skipped update because the customer did not change since the last synchronisation.",
+                )
+                return SnelstartRelatie(
+                    _id=customer_in_database.snelstart_id,
+                    naam=customer_in_database.snelstart_name or converted_name,
+                    email=customer_converted_to_snelstart_relatie["email"],
+                    telefoon=customer_converted_to_snelstart_relatie["telefoon"],
+                    btw_nummer=customer_converted_to_snelstart_relatie["btwNummer"],
+                )
+
+            try:
+                # We need to provide the same ID.
+                customer_converted_to_snelstart_relatie["id"] = customer_in_database.snelstart_id
+                relatie = snelstart_client.update_relatie(
+                    customer_in_database.snelstart_id,
+                    customer_converted_to_snelstart_relatie,
+                )
+                cache_relatie(relatie)
+            except ApiException as e:
+                record_mutation(
+                    method=Mutation.METHOD_UPDATE,
+                    trigger=trigger,
+                    on=customer_in_database,
+                    success=False,
+                    message=f"An error occurred while updating relation {customer_in_database.snelstart_id} "
+                    f"({customer_in_database.uphance_name}) in Snelstart: {e}",
+                )
+                raise SynchronizationError(
+                    f"An error occurred while updating relation {customer_in_database.snelstart_id} "
+                    f"({customer_in_database.uphance_name}) in Snelstart: {e}"
+                )
+
+            customer_in_database.snelstart_name = converted_name
+            customer_in_database.synchronised_hash = relatie_hash
+            customer_in_database.save()
+
+            record_mutation(
                 method=Mutation.METHOD_UPDATE,
                 trigger=trigger,
                 on=customer_in_database,
-                success=False,
-                message=f"An error occurred while updating relation {customer_in_database.snelstart_id} "
-                f"({customer_in_database.uphance_name}) in Snelstart: {e}",
-            )
-            raise SynchronizationError(
-                f"An error occurred while updating relation {customer_in_database.snelstart_id} "
-                f"({customer_in_database.uphance_name}) in Snelstart: {e}"
+                success=True,
+                message=None,
             )
 
-        customer_in_database.snelstart_name = converted_name
-        customer_in_database.save()
+            return relatie
 
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=customer_in_database,
-            success=True,
-            message=None,
+        # We have not matched this customer, we should first search for a match in Snelstart.
+        relaties = find_matching_relaties(
+            snelstart_client, converted_name, customer_converted_to_snelstart_relatie["btwNummer"]
         )
 
-        return relatie
-
-    # We have not matched this customer, we should first search for a match in Snelstart.
-    name_escaped = converted_name.replace("'", "''")
-    try:
-        relaties = snelstart_client.get_relaties(_filter=f"Naam eq '{name_escaped}'")
-    except ApiException as e:
-        raise SynchronizationError(
-            f"An error occurred while retrieving relations for name {converted_name} from Snelstart: {e}"
-        )
-
-    if len(relaties) > 1:
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=customer_in_database,
-            success=False,
-            message=f"Multiple relaties found in Snelstart for {converted_name} (Uphance ID: {customer.id})",
-        )
-        raise SynchronizationError(f"Multiple relaties found in snelstart for relatie {converted_name}")
-    elif len(relaties) == 1:
-        relatie = relaties[0]
-
-        if Customer.objects.filter(snelstart_id=relatie.id).exists():
-            Mutation.objects.create(
+        if len(relaties) > 1:
+            record_mutation(
                 method=Mutation.METHOD_CREATE,
                 trigger=trigger,
                 on=customer_in_database,
                 success=False,
-                message=f"Matched customer in Uphance {customer.id} ({customer.name}) with already matched customer "
-                f"in database {relatie.id} ({relatie.naam}).",
+                message=f"Multiple relaties found in Snelstart for {converted_name} (Uphance ID: {customer.id})",
             )
-            raise SynchronizationError(
-                f"Matched customer in Uphance {customer.id} ({customer.name}) with already matched customer in "
-                f"database {relatie.id} ({relatie.naam})."
-            )
-
-        customer_in_database.snelstart_id = relatie.id
-        customer_in_database.snelstart_name = relatie.naam
-        customer_in_database.save()
-
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=customer_in_database,
-            success=True,
-            message="Matched customer in Uphance with already existing customer in Snelstart.",
-        )
-
-        return relatie
-    else:
-        try:
-            relatie = snelstart_client.add_relatie(customer_converted_to_snelstart_relatie)
-        except ApiException as e:
-            Mutation.objects.create(
+            raise SynchronizationError(f"Multiple relaties found in snelstart for relatie {converted_name}")
+        elif len(relaties) == 1:
+            relatie = relaties[0]
+
+            if Customer.objects.filter(snelstart_id=relatie.id).exists():
+                record_mutation(
+                    method=Mutation.METHOD_CREATE,
+                    trigger=trigger,
+                    on=customer_in_database,
+                    success=False,
+                    message=f"Matched customer in Uphance {customer.id} ({customer.name}) with already matched "
+                    "customer "
+                    f"in database {relatie.id} ({relatie.naam}).",
+                )
+                raise SynchronizationError(
+                    f"Matched customer in Uphance {customer.id} ({customer.name}) with already matched customer in "
+                    f"database {relatie.id} ({relatie.naam})."
+                )
+
+            customer_in_database.snelstart_id = relatie.id
+            customer_in_database.snelstart_name = relatie.naam
+            customer_in_database.save()
+
+            record_mutation(
                 method=Mutation.METHOD_CREATE,
                 trigger=trigger,
                 on=customer_in_database,
-                success=False,
-                message=f"An error occurred while adding a relation with name {converted_name} to Snelstart: {e}",
+                success=True,
+                message="Matched customer in Uphance with already existing customer in Snelstart.",
             )
 
-            raise SynchronizationError(
-                f"An error occurred while adding a relation with name {converted_name} to Snelstart: {e}"
+            return relatie
+        else:
+            try:
+                relatie = snelstart_client.add_relatie(customer_converted_to_snelstart_relatie)
+                cache_relatie(relatie)
+            except ApiException as e:
+                record_mutation(
+                    method=Mutation.METHOD_CREATE,
+                    trigger=trigger,
+                    on=customer_in_database,
+                    success=False,
+                    message=f"An error occurred while adding a relation with name {converted_name} to Snelstart: {e}",
+                )
+
+                raise SynchronizationError(
+                    f"An error occurred while adding a relation with name {converted_name} to Snelstart: {e}"
+                )
+
+            customer_in_database.snelstart_id = relatie.id
+            customer_in_database.snelstart_name = relatie.naam
+            customer_in_database.synchronised_hash = payload_fingerprint(customer_converted_to_snelstart_relatie)
+            customer_in_database.save()
+
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=customer_in_database,
+                success=True,
+                message=f"Created a new customer ({customer_in_database.snelstart_name}) in Snelstart.",
             )
 
-        customer_in_database.snelstart_id = relatie.id
-        customer_in_database.snelstart_name = relatie.naam
-        customer_in_database.save()
-
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=customer_in_database,
-            success=True,
-            message=f"Created a new customer ({customer_in_database.snelstart_name}) in Snelstart.",
-        )
-
-        return relatie
+            return relatie
@@ -4,11 +4,12 @@ from rangefilter.filters import DateRangeFilter
 
 from invoices.models import Invoice
 from invoices.resources import InvoiceResource
+from mode_groothandel.exports import BackgroundCsvExportMixin
 from mutations.admin import MutationInline, SucceededMutationFilter
 
 
 @admin.register(Invoice)
-class InvoiceAdmin(ExportMixin, admin.ModelAdmin):
+class InvoiceAdmin(BackgroundCsvExportMixin, ExportMixin, admin.ModelAdmin):
     """Invoice Admin."""
 
     resource_class = InvoiceResource
@@ -1,16 +1,18 @@
 import logging
 import re
-import time
 from typing import Optional
 
 from django.conf import settings
 from django.core.management import BaseCommand
 
-from invoices.services import try_create_invoice
+from invoices.services import try_create_invoice, try_update_invoice
 from mode_groothandel.clients.api import ApiException
+from mode_groothandel.exceptions import SynchronizationError
 from mutations.models import Mutation
 from snelstart.clients.snelstart import Snelstart
+from uphance.backfill import BackfillEngine
 from uphance.clients.uphance import Uphance
+from uphance.services import INVOICES
 
 logger = logging.getLogger(__name__)
 
@@ -38,14 +40,17 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         """Add command line arguments."""
         parser.add_argument("invoices", type=str)
-        parser.add_argument("--sleep", type=int, default=None)
-        parser.add_argument("--sleep-every", type=int, default=None)
+        parser.add_argument("--workers", type=int, default=settings.BACKFILL_WORKERS)
+        parser.add_argument("--restart", action="store_true", help="Start over instead of resuming an earlier run")
+        parser.add_argument(
+            "--force-update",
+            action="store_true",
+            help="Update invoices that are already synchronised instead of skipping them",
+        )
 
     def handle(self, *args, **options):
         """Execute the command."""
         invoices = self.parse_invoices_argument(options["invoices"])
-        sleep_seconds = options["sleep"]
-        sleep_every = options["sleep_every"]
         if invoices is None:
             return
 
@@ -55,19 +60,34 @@ class Command(BaseCommand):
             return
 
         snelstart_client = Snelstart.get_client()
-        for index, invoice_id in enumerate(invoices):
-            try:
-                invoice = uphance_client.invoice(invoice_id)
-                if invoice is not None:
-                    try_create_invoice(uphance_client, snelstart_client, invoice, Mutation.TRIGGER_MANUAL)
-                else:
-                    logger.warning(f"Invoice {invoice_id} was not found in Uphance!")
-            except ApiException as e:
-                logger.error(f"An API exception occurred while synchronizing invoice {invoice_id}: {e}")
-            if sleep_seconds is not None:
-                if sleep_every is None:
-                    print(f"Sleeping for {sleep_seconds} seconds")
-                    time.sleep(sleep_seconds)
-                elif index != 0 and index % sleep_every == 0:
-                    print(f"Sleeping for {sleep_seconds} seconds")
-                    time.sleep(sleep_seconds)
+        if len(invoices) == 1:
+            self.synchronize_invoice(uphance_client, snelstart_client, invoices.start, options["force_update"])
+        else:
+            self.synchronize_invoices(invoices, options["workers"], options["restart"], options["force_update"])
+
+    def synchronize_invoice(
+        self, uphance_client: Uphance, snelstart_client: Snelstart, invoice_id: int, force_update: bool
+    ):
+        """Synchronize a single invoice, an invoice that is already synchronised is only updated when forced."""
+        synchronised = invoice_id in INVOICES.synchronised_ids(uphance_id=invoice_id)
+        if synchronised and not force_update:
+            logger.info(f"Skipped invoice {invoice_id} because it is already synchronised")
+            return
+
+        try:
+            invoice = uphance_client.invoice(invoice_id)
+            if invoice is not None and synchronised:
+                try_update_invoice(uphance_client, snelstart_client, invoice, Mutation.TRIGGER_MANUAL)
+            elif invoice is not None:
+                try_create_invoice(uphance_client, snelstart_client, invoice, Mutation.TRIGGER_MANUAL)
+            else:
+                logger.warning(f"Invoice {invoice_id} was not found in Uphance!")
+        except ApiException as e:
+            logger.error(f"An API exception occurred while synchronizing invoice {invoice_id}: {e}")
+
+    def synchronize_invoices(self, invoices: range, workers: int, restart: bool, force_update: bool):
+        """Synchronize a range of invoices with the backfill engine, an interrupted run is resumed."""
+        try:
+            BackfillEngine(INVOICES, invoices, workers=workers, restart=restart, force_update=force_update).run()
+        except (ApiException, SynchronizationError) as e:
+            logger.error(f"An exception occurred while synchronizing invoices {invoices.start}-{invoices.stop}: {e}")
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0002_alter_invoice_invoice_number_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="synchronised_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
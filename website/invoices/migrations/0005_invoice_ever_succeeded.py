@@ -0,0 +1,36 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:53
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Q
+
+
+def set_ever_succeeded(apps, schema_editor):
+    """Mark every invoice with a succeeded Mutation as ever succeeded."""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    Mutation = apps.get_model("mutations", "Mutation")
+    Invoice = apps.get_model("invoices", "Invoice")
+
+    content_type = ContentType.objects.filter(app_label="invoices", model="invoice").first()
+    if content_type is None:
+        return
+
+    succeeded_mutations = Mutation.objects.filter(content_type=content_type, object_id=OuterRef("pk"), success=True)
+    Invoice.objects.filter(Q(last_mutation_success=True) | Exists(succeeded_mutations)).update(ever_succeeded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("mutations", "0004_mutationdailyrollup"),
+        ("invoices", "0004_invoice_last_mutation_at_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="ever_succeeded",
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(set_ever_succeeded, migrations.RunPython.noop),
+    ]
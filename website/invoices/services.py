@@ -1,18 +1,22 @@
 import logging
 from datetime import datetime
 from decimal import ROUND_HALF_UP, Decimal
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 
 from invoices.models import Invoice
 from mode_groothandel.clients.api import ApiException
+from mode_groothandel.clients.utils import payload_fingerprint
 from mode_groothandel.exceptions import SynchronizationError
-from customers.services import match_or_create_snelstart_relatie_with_name
+from mode_groothandel.locks import keyed_lock
+from customers.resolution import CustomerResolutionContext
 from mutations.models import Mutation
+from mutations.services import record_mutation
 from snelstart.clients.snelstart import Snelstart
 from snelstart.constants import BTW_VERKOPEN_PREFIX
 from uphance.clients.models.invoice import Invoice as UphanceInvoice
 from uphance.clients.uphance import Uphance
 from uphance.models import TaxMapping
+from uphance.tax_mappings import tax_mapping_resolver
 
 logger = logging.getLogger(__name__)
 
@@ -30,8 +34,6 @@ def construct_order_and_tax_line_items(
     to_order = list()
     # Dictionary mapping tax percentages to the total amount to compute the tax over.
     compute_tax_over_amount = dict()
-    # The tax mappings belonging to the channel of the invoice.
-    filtered_tax_mappings = TaxMapping.objects.filter(channel_mapping__channel__channel_id=invoice.channel_id)
     for item in invoice.line_items:
         amount = sum([x.quantity for x in item.line_quantities])
 
@@ -39,7 +41,7 @@ def construct_order_and_tax_line_items(
 
         if total_price_line != 0:
             try:
-                tax_mapping = filtered_tax_mappings.get(tax_amount__btw_percentage=item.tax_level)
+                tax_mapping = tax_mapping_resolver.get(invoice.channel_id, item.tax_level)
             except TaxMapping.DoesNotExist:
                 raise SynchronizationError(
                     f"Tax mapping for tax amount {item.tax_level} in channel {invoice.channel_id} does not exist"
@@ -56,7 +58,7 @@ def construct_order_and_tax_line_items(
                         "id": str(tax_mapping.grootboekcode),
                     },
                     "bedrag": "{:.2f}".format(total_price_line),
-                    "btwSoort": tax_mapping.tax_amount.btw_soort,
+                    "btwSoort": tax_mapping.btw_soort,
                 }
             )
 
@@ -69,14 +71,12 @@ def construct_order_and_tax_line_items(
     tax_lines = dict()
 
     for tax_mapping, total_amount_to_compute_tax_over in compute_tax_over_amount.items():
-        tax_lines[tax_mapping.tax_amount.btw_soort] = (
-            total_amount_to_compute_tax_over * tax_mapping.tax_amount.btw_percentage / 100
-        )
+        tax_lines[tax_mapping.btw_soort] = total_amount_to_compute_tax_over * tax_mapping.btw_percentage / 100
 
     if invoice.shipping_cost != 0:
         tax_level = int(invoice.shipping_tax / invoice.shipping_cost * 100)
         try:
-            tax_mapping = filtered_tax_mappings.get(tax_amount__btw_percentage=tax_level)
+            tax_mapping = tax_mapping_resolver.get(invoice.channel_id, tax_level)
         except TaxMapping.DoesNotExist:
             raise SynchronizationError(
                 f"Tax mapping for tax amount {tax_level} in channel {invoice.channel_id} does not exist"
@@ -88,16 +88,14 @@ def construct_order_and_tax_line_items(
                     "id": str(tax_mapping.grootboekcode),
                 },
                 "bedrag": "{:.2f}".format(invoice.shipping_cost),
-                "btwSoort": tax_mapping.tax_amount.btw_soort,
+                "btwSoort": tax_mapping.btw_soort,
             }
         )
 
-        if tax_mapping.tax_amount.btw_soort in tax_lines.keys():
-            tax_lines[tax_mapping.tax_amount.btw_soort] = (
-                tax_lines[tax_mapping.tax_amount.btw_soort] + invoice.shipping_tax
-            )
+        if tax_mapping.btw_soort in tax_lines.keys():
+            tax_lines[tax_mapping.btw_soort] = tax_lines[tax_mapping.btw_soort] + invoice.shipping_tax
         else:
-            tax_lines[tax_mapping.tax_amount.btw_soort] = invoice.shipping_tax
+            tax_lines[tax_mapping.btw_soort] = invoice.shipping_tax
 
     tax_lines = [
         # Round tax amount by 2 digits.
@@ -117,12 +115,19 @@ def convert_date_to_amount_of_days_until(date: datetime) -> int:
 
 
 def setup_invoice_for_synchronisation(
-    uphance_client: Uphance, snelstart_client: Snelstart, invoice: UphanceInvoice, trigger: int
+    uphance_client: Uphance,
+    snelstart_client: Snelstart,
+    invoice: UphanceInvoice,
+    trigger: int,
+    customer_context: Optional[CustomerResolutionContext] = None,
 ) -> dict:
     """Setup an invoice from Uphance for synchronisation to Snelstart."""
-    customer = uphance_client.customer_by_id(invoice.company_id)
+    if customer_context is None:
+        customer_context = CustomerResolutionContext(uphance_client, snelstart_client, trigger)
+
+    customer = customer_context.customer_by_id(invoice.company_id)
     grootboek_regels, tax_lines = construct_order_and_tax_line_items(invoice)
-    snelstart_relatie_for_order = match_or_create_snelstart_relatie_with_name(snelstart_client, customer, trigger)
+    snelstart_relatie_for_order = customer_context.relatie_for(customer)
     betalingstermijn = convert_date_to_amount_of_days_until(invoice.due_date)
 
     if snelstart_relatie_for_order is None:
@@ -146,6 +151,22 @@ def setup_invoice_for_synchronisation(
     }
 
 
+def invoice_fingerprint(invoice: UphanceInvoice, invoice_converted: dict) -> str:
+    """
+    Calculate the fingerprint of an invoice converted for synchronisation.
+
+    The betalingstermijn (and the factuurdatum of an invoice without creation date) is calculated from the current
+    date, so the due date and creation date of the invoice are hashed instead.
+    """
+    return payload_fingerprint(
+        {
+            **invoice_converted,
+            "betalingstermijn": invoice.due_date,
+            "factuurdatum": invoice.created_at,
+        }
+    )
+
+
 def get_or_create_invoice_in_database(invoice: UphanceInvoice) -> Invoice:
     try:
         return Invoice.objects.get(uphance_id=invoice.id)
@@ -157,120 +178,173 @@ def get_or_create_invoice_in_database(invoice: UphanceInvoice) -> Invoice:
         )
 
 
-def try_delete_invoice(snelstart_client: Snelstart, invoice_id: int, trigger: int) -> None:
-    try:
-        invoice_in_database = Invoice.objects.get(uphance_id=invoice_id)
-    except Invoice.DoesNotExist:
-        invoice_in_database = Invoice.objects.create(
-            uphance_id=invoice_id,
-        )
-    if invoice_in_database.snelstart_id is None:
-        Mutation.objects.create(
-            method=Mutation.METHOD_DELETE,
-            trigger=trigger,
-            on=invoice_in_database,
-            success=False,
-            message=f"Unable to delete invoice {invoice_id} because no Snelstart ID was found in the database",
-        )
+def try_delete_invoice(snelstart_client: Snelstart, invoice_id: int, trigger: int) -> Optional[Exception]:
+    with keyed_lock(f"invoice:{invoice_id}"):
+        try:
+            invoice_in_database = Invoice.objects.get(uphance_id=invoice_id)
+        except Invoice.DoesNotExist:
+            invoice_in_database = Invoice.objects.create(
+                uphance_id=invoice_id,
+            )
+        if invoice_in_database.snelstart_id is None:
+            error = SynchronizationError(
+                f"Unable to delete invoice {invoice_id} because no Snelstart ID was found in the database"
+            )
+            record_mutation(
+                method=Mutation.METHOD_DELETE,
+                trigger=trigger,
+                on=invoice_in_database,
+                success=False,
+                message=str(error),
+            )
+            return error
 
-    try:
-        snelstart_client.delete_verkoopboeking(invoice_in_database.snelstart_id)
-        Mutation.objects.create(
-            method=Mutation.METHOD_DELETE,
-            trigger=trigger,
-            on=invoice_in_database,
-            success=True,
-            message=None,
-        )
-    except ApiException as e:
-        Mutation.objects.create(
-            method=Mutation.METHOD_DELETE,
-            trigger=trigger,
-            on=invoice_in_database,
-            success=False,
-            message=f"An API error occurred for invoice {invoice_id}: {e}",
-        )
+        try:
+            snelstart_client.delete_verkoopboeking(invoice_in_database.snelstart_id)
+            record_mutation(
+                method=Mutation.METHOD_DELETE,
+                trigger=trigger,
+                on=invoice_in_database,
+                success=True,
+                message=None,
+            )
+        except ApiException as e:
+            record_mutation(
+                method=Mutation.METHOD_DELETE,
+                trigger=trigger,
+                on=invoice_in_database,
+                success=False,
+                message=f"An API error occurred for invoice {invoice_id}: {e}",
+            )
+            return e
 
 
 def try_update_invoice(
-    uphance_client: Uphance, snelstart_client: Snelstart, invoice: UphanceInvoice, trigger: int
-) -> None:
-    invoice_in_database = get_or_create_invoice_in_database(invoice)
-
-    invoice_in_database.invoice_number = invoice.invoice_number
-    invoice_in_database.invoice_total = (
-        invoice.items_total + invoice.items_tax + invoice.shipping_cost + invoice.shipping_tax
-    )
-    invoice_in_database.save()
-
-    if invoice_in_database.snelstart_id is None:
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=invoice_in_database,
-            success=False,
-            message=f"Unable to update invoice {invoice.id} because no Snelstart ID was found in the database",
+    uphance_client: Uphance,
+    snelstart_client: Snelstart,
+    invoice: UphanceInvoice,
+    trigger: int,
+    customer_context: Optional[CustomerResolutionContext] = None,
+) -> Optional[Exception]:
+    with keyed_lock(f"invoice:{invoice.id}"):
+        invoice_in_database = get_or_create_invoice_in_database(invoice)
+
+        invoice_in_database.invoice_number = invoice.invoice_number
+        invoice_in_database.invoice_total = (
+            invoice.items_total + invoice.items_tax + invoice.shipping_cost + invoice.shipping_tax
         )
-        return
+        invoice_in_database.save()
+
+        if invoice_in_database.snelstart_id is None:
+            error = SynchronizationError(
+                f"Unable to update invoice {invoice.id} because no Snelstart ID was found in the database"
+            )
+            record_mutation(
+                method=Mutation.METHOD_UPDATE,
+                trigger=trigger,
+                on=invoice_in_database,
+                success=False,
+                message=str(error),
+            )
+            return error
 
-    try:
-        invoice_converted = setup_invoice_for_synchronisation(uphance_client, snelstart_client, invoice, trigger)
-        invoice_converted["id"] = invoice_in_database.snelstart_id
         try:
-            snelstart_client.update_verkoopboeking(invoice_in_database.snelstart_id, invoice_converted)
-        except ApiException as e:
-            raise SynchronizationError(
-                f"An error occurred while updating verkoopboeking {invoice_in_database.snelstart_id} in Snelstart: {e}"
+            invoice_converted = setup_invoice_for_synchronisation(
+                uphance_client, snelstart_client, invoice, trigger, customer_context
             )
-        logger.info(f"Successfully updated invoice {invoice.id}")
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=invoice_in_database,
-            success=True,
-            message=None,
-        )
-    except SynchronizationError as e:
-        logger.error(f"A Synchronization error occurred while updating invoice {invoice.id}: {e}")
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=invoice_in_database,
-            success=False,
-            message=f"A Synchronization error occurred while updating invoice {invoice.id}: {e}",
-        )
+            invoice_hash = invoice_fingerprint(invoice, invoice_converted)
+            if invoice_hash == invoice_in_database.synchronised_hash:
+                logger.info(f"Skipped updating invoice {invoice.id} because it did not change")
+                record_mutation(
+                    method=Mutation.METHOD_UPDATE,
+                    trigger=trigger,
+                    on=invoice_in_database,
+                    success=True,
+                    message="Skipped update because the invoice did not change since the last synchronisation.",
+                )
+                return
+
+            invoice_converted["id"] = invoice_in_database.snelstart_id
+            try:
+                snelstart_client.update_verkoopboeking(invoice_in_database.snelstart_id, invoice_converted)
+            except ApiException as e:
+                raise SynchronizationError(
+                    f"An error occurred while updating verkoopboeking {invoice_in_database.snelstart_id} in "
+                    f"Snelstart: {e}"
+                )
+            logger.info(f"Successfully updated invoice {invoice.id}")
+            invoice_in_database.synchronised_hash = invoice_hash
+            invoice_in_database.save()
+            record_mutation(
+                method=Mutation.METHOD_UPDATE,
+                trigger=trigger,
+                on=invoice_in_database,
+                success=True,
+                message=None,
+            )
+        except SynchronizationError as e:
+            logger.error(f"A Synchronization error occurred while updating invoice {invoice.id}: {e}")
+            record_mutation(
+                method=Mutation.METHOD_UPDATE,
+                trigger=trigger,
+                on=invoice_in_database,
+                success=False,
+                message=f"A Synchronization error occurred while updating invoice {invoice.id}: {e}",
+            )
+            return e
 
 
 def try_create_invoice(
-    uphance_client: Uphance, snelstart_client: Snelstart, invoice: UphanceInvoice, trigger: int
-) -> None:
-    invoice_in_database = get_or_create_invoice_in_database(invoice)
+    uphance_client: Uphance,
+    snelstart_client: Snelstart,
+    invoice: UphanceInvoice,
+    trigger: int,
+    customer_context: Optional[CustomerResolutionContext] = None,
+) -> Optional[Exception]:
+    with keyed_lock(f"invoice:{invoice.id}"):
+        invoice_in_database = get_or_create_invoice_in_database(invoice)
+        if invoice_in_database.snelstart_id is not None:
+            # A concurrent (or earlier) synchronisation already created the invoice.
+            logger.info(f"Skipped creating invoice {invoice.id} because it is already synchronised")
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=invoice_in_database,
+                success=True,
+                message="Skipped creation because the invoice was already synchronised.",
+            )
+            return
 
-    try:
-        invoice_converted = setup_invoice_for_synchronisation(uphance_client, snelstart_client, invoice, trigger)
         try:
-            verkoopboeking = snelstart_client.add_verkoopboeking(invoice_converted)
-        except ApiException as e:
-            raise SynchronizationError(
-                f"An error occurred while adding a verkoopboeking for invoice {invoice.invoice_number} to Snelstart: "
-                f"{e}"
+            invoice_converted = setup_invoice_for_synchronisation(
+                uphance_client, snelstart_client, invoice, trigger, customer_context
             )
-        logger.info(f"Successfully synchronized invoice {invoice.id}")
-        invoice_in_database.snelstart_id = verkoopboeking["id"]
-        invoice_in_database.save()
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=invoice_in_database,
-            success=True,
-            message=None,
-        )
-    except SynchronizationError as e:
-        logger.error(f"A Synchronization error occurred for invoice {invoice.id}: {e}")
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=invoice_in_database,
-            success=False,
-            message=f"A Synchronization error occurred for invoice {invoice.id}: {e}",
-        )
+            try:
+                verkoopboeking = snelstart_client.add_verkoopboeking(invoice_converted)
+            except ApiException as e:
+                raise SynchronizationError(
+                    f"An error occurred while adding a verkoopboeking for invoice {invoice.invoice_number} to "
+                    "Snelstart: "
+                    f"{e}"
+                )
+            logger.info(f"Successfully synchronized invoice {invoice.id}")
+            invoice_in_database.snelstart_id = verkoopboeking["id"]
+            invoice_in_database.synchronised_hash = invoice_fingerprint(invoice, invoice_converted)
+            invoice_in_database.save()
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=invoice_in_database,
+                success=True,
+                message=None,
+            )
+        except SynchronizationError as e:
+            logger.error(f"A Synchronization error occurred for invoice {invoice.id}: {e}")
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=invoice_in_database,
+                success=False,
+                message=f"A Synchronization error occurred for invoice {invoice.id}: {e}",
+            )
+            return e
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from uphance.services import poll_documents, INVOICES
+
+
+@shared_task
+def synchronize_invoices():
+    """Synchronize all invoices."""
+    poll_documents(INVOICES)
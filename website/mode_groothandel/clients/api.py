@@ -6,9 +6,10 @@ from urllib.parse import quote_plus
 
 import requests
 import urllib3
-from requests.adapters import HTTPAdapter
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
 
 from mode_groothandel.clients.authentication import AuthClient
+from mode_groothandel.clients.rate_limit import AdaptiveThrottle, RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +36,8 @@ class ApiException(Exception):
 class ApiClient(abc.ABC):
     """API client class."""
 
-    default_retry_codes = (429, 500, 502, 503, 504)
+    # 429 is not retried by urllib3 as rate limited requests are retried by the adaptive throttle.
+    default_retry_codes = (500, 502, 503, 504)
 
     def __init__(
         self,
@@ -48,6 +50,10 @@ class ApiClient(abc.ABC):
         retries: int = 3,
         status_retries: int = 3,
         backoff_factor: float = 0.3,
+        pool_connections: int = DEFAULT_POOLSIZE,
+        pool_maxsize: int = DEFAULT_POOLSIZE,
+        rate_limiter: Optional[RateLimiter] = None,
+        rate_limit_retries: int = 5,
     ):
         """Initialize API Client."""
         if not base_url.endswith("/"):
@@ -60,6 +66,11 @@ class ApiClient(abc.ABC):
         self.backoff_factor = backoff_factor
         self.retries = retries
         self.status_retries = status_retries
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.rate_limiter = rate_limiter
+        self.rate_limit_retries = rate_limit_retries
+        self.throttle = AdaptiveThrottle(rate_limiter.rate if rate_limiter is not None else None)
 
         if isinstance(requests_session, requests.Session):
             self._session = requests_session
@@ -92,7 +103,9 @@ class ApiClient(abc.ABC):
             status_forcelist=self.status_forcelist,
         )
 
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize, max_retries=retry
+        )
         self._session.mount("http://", adapter)
         self._session.mount("https://", adapter)
 
@@ -138,8 +151,7 @@ class ApiClient(abc.ABC):
         )
 
         try:
-            response = self._session.request(method, url, headers=headers, timeout=self.requests_timeout, **args)
-
+            response = self._throttled_request(method, url, headers, args)
             response.raise_for_status()
             results = response.json()
         except requests.exceptions.HTTPError as http_error:
@@ -186,6 +198,27 @@ class ApiClient(abc.ABC):
         logger.debug("RESULTS: %s", results)
         return results
 
+    def _throttled_request(self, method, url, headers, args) -> requests.Response:
+        """Do a request respecting the rate limit, rate limited requests are retried after waiting."""
+        attempt = 0
+        while True:
+            self.throttle.wait()
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(self.throttle.rate)
+
+            response = self._session.request(method, url, headers=headers, timeout=self.requests_timeout, **args)
+
+            if response.status_code != 429:
+                self.throttle.on_success(response.headers)
+                return response
+
+            self.throttle.on_rate_limited(response.headers)
+            if attempt >= self.rate_limit_retries:
+                return response
+
+            attempt += 1
+            logger.info("Request %s to %s was rate limited, retrying (attempt %s)", method, url, attempt)
+
     @staticmethod
     def _create_querystring_safe(query: List[Tuple[str, str | None]]) -> str:
         safe_filtered_query: List[(str, str)] = list()
@@ -1,9 +1,97 @@
 import abc
+import logging
+import time
 from typing import Optional
 
+from mode_groothandel.clients.cache.cache import CacheHandler, CacheFileHandler, TOKEN_EXPIRY_MARGIN
+
+logger = logging.getLogger(__name__)
+
 
 class AuthClient(abc.ABC):
 
     @abc.abstractmethod
     def get_access_token(self) -> Optional[dict]:
         pass
+
+
+class TokenAuthClient(AuthClient):
+    """
+    Authentication client for APIs handing out expiring access tokens.
+
+    Tokens are stored in a cache handler. When a token expires, only one process refreshes it while holding the lock of
+    the cache handler, other processes wait for the lock and use the token stored by the refreshing process.
+    """
+
+    requests_timeout = 10
+
+    def __init__(self, cache: Optional[CacheHandler] = None):
+        """Initialize a Token Authentication Client."""
+        if cache is not None:
+            self.cache = cache
+        else:
+            self.cache = CacheFileHandler()
+
+    @abc.abstractmethod
+    def request_access_token(self) -> Optional[dict]:
+        """Request a new access token from the API."""
+        pass
+
+    @staticmethod
+    def token_is_valid(token: dict) -> bool:
+        if "expires_at" not in token.keys():
+            return False
+
+        now = int(time.time())
+        return token["expires_at"] - now > TOKEN_EXPIRY_MARGIN
+
+    @staticmethod
+    def _add_custom_values_to_token(token: dict) -> dict:
+        token["expires_at"] = int(time.time()) + token["expires_in"]
+        return token
+
+    def _get_valid_cached_token(self) -> Optional[dict]:
+        """Get the cached token if it is still valid."""
+        cached_token = self.cache.get_cached_token()
+        if cached_token is not None and self.token_is_valid(cached_token):
+            return cached_token
+        return None
+
+    def _refresh_access_token(self) -> Optional[dict]:
+        """Request a new access token and store it in the cache, should be called while holding the cache lock."""
+        logger.debug("Refreshing access token with %s", self.__class__.__name__)
+        new_token = self.request_access_token()
+        if new_token is not None:
+            new_token = self._add_custom_values_to_token(new_token)
+            self.cache.save_token_to_cache(new_token)
+        return new_token
+
+    def get_access_token(self) -> Optional[dict]:
+        cached_token = self._get_valid_cached_token()
+        if cached_token is not None:
+            return cached_token["access_token"]
+
+        with self.cache.lock():
+            # Another process might have refreshed the token while we were waiting for the lock.
+            cached_token = self._get_valid_cached_token()
+            if cached_token is not None:
+                return cached_token["access_token"]
+
+            new_token = self._refresh_access_token()
+            if new_token is not None:
+                return new_token["access_token"]
+            else:
+                return None
+
+    def refresh_access_token_if_expiring(self, seconds: int) -> bool:
+        """Refresh the access token if it expires within an amount of seconds, returns whether it was refreshed."""
+        with self.cache.lock():
+            cached_token = self.cache.get_cached_token()
+            if (
+                cached_token is not None
+                and "expires_at" in cached_token.keys()
+                and cached_token["expires_at"] - int(time.time()) > seconds
+            ):
+                return False
+
+            return self._refresh_access_token() is not None
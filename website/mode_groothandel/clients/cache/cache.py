@@ -1,11 +1,23 @@
 import abc
+import contextlib
 import errno
+import fcntl
 import json
 import logging
-from typing import Optional
+import os
+import tempfile
+import threading
+import time
+from typing import ContextManager, Optional
+
+from django.conf import settings
+from django.core.cache import caches
 
 logger = logging.getLogger(__name__)
 
+# Tokens are considered expired this amount of seconds before they actually expire.
+TOKEN_EXPIRY_MARGIN = 60
+
 
 class CacheHandler(abc.ABC):
     """
@@ -27,41 +39,186 @@ class CacheHandler(abc.ABC):
         """Save a token_info dictionary object to the cache and return whether the operation succeeded."""
         pass
 
+    def lock(self) -> ContextManager:
+        """
+        Lock the cache while refreshing a token.
+
+        Handlers shared between processes should make sure only one process at a time holds the lock.
+        """
+        return contextlib.nullcontext()
+
+
+class InMemoryCacheHandler(CacheHandler):
+    """
+    Cache handler keeping the token in memory until it expires.
+
+    The storage shared between processes is only read again when the token has to be refreshed. Subclasses implement
+    reading and writing the shared storage.
+    """
+
+    def __init__(self):
+        """Initialize an In Memory Cache Handler."""
+        self._token_info = None
 
-class CacheFileHandler(CacheHandler):
-    """Handles reading and writing cached authorization tokens as json files on disk."""
+    def _memory_token_is_valid(self) -> bool:
+        """Whether the token kept in memory is still valid."""
+        if self._token_info is None or "expires_at" not in self._token_info.keys():
+            return False
+        return self._token_info["expires_at"] - int(time.time()) > TOKEN_EXPIRY_MARGIN
+
+    def get_cached_token(self) -> Optional[dict]:
+        """Retrieve a cached token from memory or from the shared storage."""
+        if self._memory_token_is_valid():
+            return self._token_info
+
+        self._token_info = self._read_token()
+        return self._token_info
+
+    def save_token_to_cache(self, token_info) -> bool:
+        """Save a token in memory and in the shared storage."""
+        self._token_info = token_info
+        return self._write_token(token_info)
+
+    @abc.abstractmethod
+    def _read_token(self) -> Optional[dict]:
+        """Read a token from the shared storage."""
+        pass
+
+    @abc.abstractmethod
+    def _write_token(self, token_info) -> bool:
+        """Write a token to the shared storage."""
+        pass
+
+
+class CacheFileHandler(InMemoryCacheHandler):
+    """
+    Handles reading and writing cached authorization tokens as json files on disk.
+
+    Tokens are written atomically and refreshes are serialized with a lock file next to the cache file.
+    """
 
     def __init__(self, cache_path: Optional[str] = None):
         """Initialize a Cache File Handler."""
+        super().__init__()
         if cache_path:
             self.cache_path = cache_path
         else:
             self.cache_path = ".cache"
+        self.lock_path = f"{self.cache_path}.lock"
+        self._thread_lock = threading.Lock()
 
-    def get_cached_token(self) -> Optional[dict]:
+    def _read_token(self) -> Optional[dict]:
         """Retrieve a cached token from a cache file."""
         token_info = None
 
         try:
-            f = open(self.cache_path)
-            token_info_string = f.read()
-            f.close()
-            token_info = json.loads(token_info_string)
+            with open(self.cache_path) as f:
+                token_info = json.loads(f.read())
         except IOError as error:
             if error.errno == errno.ENOENT:
                 logger.debug("Cache does not exist at: %s", self.cache_path)
             else:
                 logger.warning("Couldn't read cache at: %s", self.cache_path)
+        except ValueError:
+            logger.warning("Couldn't parse cache at: %s", self.cache_path)
 
         return token_info
 
-    def save_token_to_cache(self, token_info) -> bool:
-        """Save a token to a cache file."""
+    def _write_token(self, token_info) -> bool:
+        """Save a token to a cache file, the file is replaced atomically so other processes never read half a file."""
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
         try:
-            f = open(self.cache_path, "w")
-            f.write(json.dumps(token_info))
-            f.close()
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=".token-")
+            try:
+                with os.fdopen(file_descriptor, "w") as f:
+                    f.write(json.dumps(token_info))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporary_path, self.cache_path)
+            except BaseException:
+                os.unlink(temporary_path)
+                raise
             return True
         except IOError:
             logger.warning("Couldn't write token to cache at: %s", self.cache_path)
             return False
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Lock the cache file for this process (and thread) while refreshing a token."""
+        with self._thread_lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class DjangoCacheHandler(InMemoryCacheHandler):
+    """
+    Handles reading and writing cached authorization tokens in a Django cache.
+
+    With a cache shared between containers (e.g. Redis) the token and the refresh lock are shared between all
+    containers. The lock is taken with cache.add, which is atomic for the Redis and Memcached backends.
+    """
+
+    lock_poll_interval = 0.1
+
+    def __init__(self, key: str, alias: str = "default", lock_timeout: int = 30):
+        """Initialize a Django Cache Handler."""
+        super().__init__()
+        self.key = key
+        self.lock_key = f"{key}:lock"
+        self.alias = alias
+        self.lock_timeout = lock_timeout
+        self._thread_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        """Get the Django cache."""
+        return caches[self.alias]
+
+    def _read_token(self) -> Optional[dict]:
+        """Retrieve a cached token from the Django cache."""
+        return self.cache.get(self.key, None)
+
+    def _write_token(self, token_info) -> bool:
+        """Save a token to the Django cache, it is removed from the cache when it expires."""
+        timeout = None
+        if "expires_at" in token_info.keys():
+            timeout = max(token_info["expires_at"] - int(time.time()), 1)
+        self.cache.set(self.key, token_info, timeout=timeout)
+        return True
+
+    @contextlib.contextmanager
+    def lock(self):
+        """
+        Lock the cache key while refreshing a token.
+
+        The lock expires after lock_timeout seconds so a killed process can not hold it forever. When the lock can not
+        be acquired within that time, the token is refreshed without the lock.
+        """
+        with self._thread_lock:
+            lock_value = f"{os.getpid()}:{threading.get_ident()}:{time.time()}"
+            deadline = time.monotonic() + self.lock_timeout
+            acquired = self.cache.add(self.lock_key, lock_value, timeout=self.lock_timeout)
+            while not acquired and time.monotonic() < deadline:
+                time.sleep(self.lock_poll_interval)
+                acquired = self.cache.add(self.lock_key, lock_value, timeout=self.lock_timeout)
+
+            if not acquired:
+                logger.warning("Couldn't acquire lock %s, continuing without it", self.lock_key)
+
+            try:
+                yield
+            finally:
+                if acquired and self.cache.get(self.lock_key, None) == lock_value:
+                    self.cache.delete(self.lock_key)
+
+
+def get_token_cache_handler(name: str, cache_path: Optional[str] = None) -> CacheHandler:
+    """Create the cache handler for the tokens of an API from Django settings."""
+    if settings.TOKEN_CACHE_BACKEND == "django":
+        return DjangoCacheHandler(f"access-token:{name}", alias=settings.TOKEN_CACHE_ALIAS)
+    else:
+        return CacheFileHandler(cache_path=cache_path)
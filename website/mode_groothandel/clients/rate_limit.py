@@ -0,0 +1,257 @@
+import abc
+import email.utils
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Mapping
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(abc.ABC):
+    """
+    Token bucket rate limiter.
+
+    The bucket holds at most `burst` tokens and is refilled with `rate` tokens per second. Every request takes one
+    token, when the bucket is empty the caller waits until a token is available. The state of the bucket is shared
+    between processes by the implementing class, so all workers talking to the same upstream share one quota.
+    """
+
+    def __init__(self, key: str, rate: float, burst: int):
+        """Initialize a Rate Limiter."""
+        self.key = key
+        self.rate = rate
+        self.burst = max(burst, 1)
+
+    def acquire(self, rate: Optional[float] = None) -> float:
+        """
+        Wait until a token is available and take it, returns the amount of seconds waited.
+
+        :param rate: the rate to refill the bucket with, defaults to the configured rate
+        """
+        if rate is None:
+            rate = self.rate
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(rate, self.burst)
+            if wait <= 0:
+                if waited > 0:
+                    logger.debug("Waited %.2f seconds for rate limit of %s", waited, self.key)
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    @abc.abstractmethod
+    def _try_acquire(self, rate: float, burst: int) -> float:
+        """Take a token if one is available, otherwise return the amount of seconds until one is available."""
+        pass
+
+
+class RedisRateLimiter(RateLimiter):
+    """Token bucket rate limiter with its state stored in Redis, shared by all hosts using the same Redis server."""
+
+    # The bucket is updated atomically within Redis, the time of the Redis server is used so that clocks of
+    # different hosts do not have to be in sync.
+    SCRIPT = """
+        local rate = tonumber(ARGV[1])
+        local burst = tonumber(ARGV[2])
+        local server_time = redis.call("TIME")
+        local now = tonumber(server_time[1]) + tonumber(server_time[2]) / 1000000
+
+        local state = redis.call("HMGET", KEYS[1], "tokens", "timestamp")
+        local tokens = tonumber(state[1]) or burst
+        local timestamp = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - timestamp) * rate)
+
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            wait = (1 - tokens) / rate
+        end
+
+        redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "timestamp", tostring(now))
+        redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 60)
+        return tostring(wait)
+    """
+
+    def __init__(self, redis_client: redis.Redis, *args, **kwargs):
+        """Initialize a Redis Rate Limiter."""
+        super().__init__(*args, **kwargs)
+        self._script = redis_client.register_script(self.SCRIPT)
+
+    def _try_acquire(self, rate: float, burst: int) -> float:
+        """Take a token from the bucket in Redis."""
+        return float(self._script(keys=[f"rate-limit:{self.key}"], args=[rate, burst]))
+
+
+class FileRateLimiter(RateLimiter):
+    """Token bucket rate limiter with its state stored in a file, shared by all processes on the same host."""
+
+    def __init__(self, directory: str, *args, **kwargs):
+        """Initialize a File Rate Limiter."""
+        super().__init__(*args, **kwargs)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{self.key}.json")
+        # flock is held per open file description, the thread lock guards against threads of the same process.
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, rate: float, burst: int) -> float:
+        """Take a token from the bucket in the state file."""
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                except ValueError:
+                    state = dict()
+
+                now = time.time()
+                tokens = state.get("tokens", burst)
+                timestamp = state.get("timestamp", now)
+                tokens = min(burst, tokens + max(0.0, now - timestamp) * rate)
+
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / rate
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": tokens, "timestamp": now}))
+                f.flush()
+                return wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class AdaptiveThrottle:
+    """
+    Adaptive (AIMD) throttle for requests to one upstream, shared by all threads of a process.
+
+    When the upstream responds with 429 Too Many Requests, the request rate is halved (multiplicative decrease) and all
+    requests wait for the time indicated by the Retry-After header. Every successful response increases the rate
+    again by a small step (additive increase) until the configured rate is reached. Rate limit headers telling that
+    no requests are remaining are honoured as well, so that a 429 can be prevented.
+    """
+
+    decrease_factor = 0.5
+    increase_ratio = 0.05
+    minimum_ratio = 0.05
+    default_retry_after = 1.0
+    maximum_retry_after = 300.0
+
+    def __init__(self, maximum_rate: Optional[float] = None):
+        """Initialize an Adaptive Throttle."""
+        self.maximum_rate = maximum_rate
+        self.rate = maximum_rate
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Wait until requests to the upstream are allowed again."""
+        wait = self._blocked_until - time.monotonic()
+        if wait > 0:
+            logger.debug("Throttled, waiting %.2f seconds", wait)
+            time.sleep(wait)
+
+    def on_success(self, headers: Mapping[str, str]) -> None:
+        """Register a response that was not rate limited."""
+        with self._lock:
+            if self.maximum_rate is not None and self.rate < self.maximum_rate:
+                self.rate = min(self.maximum_rate, self.rate + self.maximum_rate * self.increase_ratio)
+
+            remaining = self._parse_number(self._get_header(headers, "X-RateLimit-Remaining", "RateLimit-Remaining"))
+            if remaining is not None and remaining <= 0:
+                reset = self._parse_reset(self._get_header(headers, "X-RateLimit-Reset", "RateLimit-Reset"))
+                if reset is not None:
+                    self._block_for(reset)
+
+    def on_rate_limited(self, headers: Mapping[str, str]) -> float:
+        """Register a rate limited response, returns the amount of seconds requests are blocked."""
+        with self._lock:
+            if self.maximum_rate is not None:
+                self.rate = max(self.maximum_rate * self.minimum_ratio, self.rate * self.decrease_factor)
+
+            retry_after = self._parse_retry_after(self._get_header(headers, "Retry-After"))
+            if retry_after is None:
+                retry_after = self._parse_reset(self._get_header(headers, "X-RateLimit-Reset", "RateLimit-Reset"))
+            if retry_after is None:
+                retry_after = self.default_retry_after
+
+            retry_after = min(retry_after, self.maximum_retry_after)
+            self._block_for(retry_after)
+            logger.warning(
+                "Rate limited, waiting %.2f seconds and continuing at %s requests/second", retry_after, self.rate
+            )
+            return retry_after
+
+    def _block_for(self, seconds: float) -> None:
+        """Block requests for an amount of seconds."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    @staticmethod
+    def _get_header(headers: Mapping[str, str], *names: str) -> Optional[str]:
+        """Get the first header that is present."""
+        for name in names:
+            value = headers.get(name, None)
+            if value is not None:
+                return value
+        return None
+
+    @staticmethod
+    def _parse_number(value: Optional[str]) -> Optional[float]:
+        """Parse a numeric header value."""
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Parse a Retry-After header, which is either an amount of seconds or an HTTP date."""
+        seconds = AdaptiveThrottle._parse_number(value)
+        if seconds is not None:
+            return max(seconds, 0.0)
+        if value is None:
+            return None
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except TypeError, ValueError:
+            return None
+        return max(retry_at.timestamp() - time.time(), 0.0)
+
+    @staticmethod
+    def _parse_reset(value: Optional[str]) -> Optional[float]:
+        """Parse a rate limit reset header, which is either an amount of seconds or a UNIX timestamp."""
+        reset = AdaptiveThrottle._parse_number(value)
+        if reset is None:
+            return None
+        # Values larger than a year can only be a timestamp.
+        if reset > 365 * 24 * 60 * 60:
+            reset = reset - time.time()
+        return max(reset, 0.0)
+
+
+def get_rate_limiter(host: str, rate: Optional[float], burst: Optional[int]) -> Optional[RateLimiter]:
+    """Create a rate limiter for a host from Django settings, returns None when rate limiting is disabled."""
+    if not rate:
+        return None
+
+    if burst is None:
+        burst = max(int(rate), 1)
+
+    if settings.RATE_LIMIT_REDIS_URL:
+        return RedisRateLimiter(redis.Redis.from_url(settings.RATE_LIMIT_REDIS_URL), host, rate, burst)
+    else:
+        return FileRateLimiter(settings.RATE_LIMIT_PATH, host, rate, burst)
@@ -0,0 +1,64 @@
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, TypeVar
+
+from mode_groothandel.clients.api import ApiClient
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=ApiClient)
+
+
+class ClientRegistry:
+    """
+    Per-process registry of API clients.
+
+    Clients (and thereby their connection pools) are created once per process and reused afterwards. Connections can
+    not be shared between processes, so the registry is emptied in a child process after a fork (uWSGI workers and
+    Celery prefork workers both fork from a master process).
+    """
+
+    def __init__(self):
+        """Initialize a Client Registry."""
+        self._clients: Dict[str, ApiClient] = dict()
+        # Clients inherited from the parent process, kept referenced so they are never garbage collected (and their
+        # sessions closed by ApiClient.__del__) in this process.
+        self._orphaned: List[ApiClient] = list()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def get_or_create(self, name: str, factory: Callable[[], T]) -> T:
+        """Get the client registered under name, create it with factory if it does not exist yet."""
+        if self._pid != os.getpid():
+            # Fallback for when the fork hook did not run (e.g. a fork without the os module hooks).
+            self.clear()
+
+        client = self._clients.get(name, None)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(name, None)
+            if client is None:
+                logger.debug("Creating %s client for process %s", name, self._pid)
+                client = factory()
+                self._clients[name] = client
+            return client
+
+    def clear(self) -> None:
+        """
+        Forget all registered clients.
+
+        The sessions are not closed as their sockets might still be in use by the parent process. The forgotten clients
+        stay referenced, otherwise garbage collection would close their sessions via ApiClient.__del__.
+        """
+        self._lock = threading.Lock()
+        self._orphaned.extend(self._clients.values())
+        self._clients = dict()
+        self._pid = os.getpid()
+
+
+client_registry = ClientRegistry()
+
+os.register_at_fork(after_in_child=client_registry.clear)
@@ -1,3 +1,5 @@
+import hashlib
+import json
 from typing import Optional, List, Any
 
 
@@ -159,3 +161,16 @@ def apply_from_data_to_dict_or_error(fn_from_data, data: dict, key: str, *args,
         return_value[key] = fn_from_data(value, *args, **kwargs)
 
     return return_value
+
+
+def payload_fingerprint(payload: Any) -> str:
+    """
+    Calculate a fingerprint of a payload sent to an API.
+
+    The payload is serialized canonically (sorted keys, no whitespace), equal payloads have equal fingerprints.
+
+    :param payload: The payload to calculate the fingerprint of.
+    :return: The SHA-256 hash of the serialized payload.
+    """
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
@@ -1,2 +1,32 @@
+import requests
+
+from mode_groothandel.clients.api import ApiException
+
+# HTTP statuses of API errors that are expected to go away when the request is retried later.
+TRANSIENT_HTTP_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
 class SynchronizationError(Exception):
     pass
+
+
+class LockTimeoutError(SynchronizationError):
+    pass
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Whether an error is expected to go away when the work is retried later.
+
+    Lock timeouts, connection errors and API errors with a transient HTTP status are transient. The causes of an error
+    are checked as well, as API errors are wrapped in a SynchronizationError by the synchronisation services.
+    """
+    while error is not None:
+        if isinstance(error, LockTimeoutError):
+            return True
+        if isinstance(error, ApiException) and error.http_status in TRANSIENT_HTTP_STATUSES:
+            return True
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
@@ -0,0 +1,179 @@
+import csv
+import logging
+import os
+import re
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.test import RequestFactory
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from import_export.resources import ModelResource
+
+logger = logging.getLogger(__name__)
+
+# The random part of the name makes export files unguessable, also when the export directory is served publicly.
+EXPORT_NAME_PATTERN = re.compile(r"^[a-z_]+-\d{8}-\d{6}-[0-9a-f]{32}\.csv$")
+
+
+def write_csv_export(resource: ModelResource, queryset: QuerySet, path: str) -> int:
+    """
+    Write the export of a queryset to a CSV file, returns the amount of exported objects.
+
+    The objects are exported row by row (see ModelResource.iter_queryset), so the export is never kept in memory.
+    The file is written under a temporary name and moved to path when it is complete.
+    """
+    resource.before_export(queryset)
+    queryset = resource.filter_export(queryset)
+
+    exported = 0
+    with open(f"{path}.part", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(resource.get_export_headers())
+        for obj in resource.iter_queryset(queryset):
+            writer.writerow(resource.export_resource(obj))
+            exported += 1
+    os.replace(f"{path}.part", path)
+    return exported
+
+
+def get_export_directory() -> str:
+    """Get the directory of the export files, EXPORT_PATH or the exports directory in MEDIA_ROOT."""
+    if settings.EXPORT_PATH:
+        return settings.EXPORT_PATH
+    return os.path.join(settings.MEDIA_ROOT, "exports")
+
+
+def get_export_path(name: str) -> str:
+    """Get the path of an export file, raises Http404 for names that are not an export file."""
+    if EXPORT_NAME_PATTERN.match(name) is None:
+        raise Http404("Export not found")
+    return os.path.join(get_export_directory(), name)
+
+
+def start_csv_export(request, queryset: QuerySet) -> str:
+    """
+    Export the objects selected with an admin action to a CSV file in a Celery task, returns the name of the export.
+
+    The task rebuilds the queryset from the changelist of the admin: the filter parameters of the changelist (and the
+    user, as the changelist may depend on it) are passed to the task, together with the primary keys of the selected
+    objects when not all objects matching the filters are selected (these are at most one page).
+    """
+    from mode_groothandel.tasks import export_csv
+
+    select_across = request.POST.get("select_across", "0") == "1"
+    name = f"{queryset.model._meta.model_name}-{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex}.csv"
+    export_csv.delay(
+        queryset.model._meta.label,
+        request.user.pk,
+        list(request.GET.lists()),
+        None if select_across else list(queryset.values_list("pk", flat=True)),
+        name,
+    )
+    return name
+
+
+def run_csv_export(
+    model_label: str, user_id: int, params: List[Tuple[str, List[str]]], pks: Optional[List], name: str
+) -> int:
+    """Run an export started with start_csv_export."""
+    from django.apps import apps
+
+    model = apps.get_model(model_label)
+    model_admin = admin.site.get_model_admin(model)
+    opts = model._meta
+    request = RequestFactory().get(reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist"), dict(params))
+    request.user = get_user_model().objects.get(pk=user_id)
+    queryset = model_admin.get_changelist_instance(request).get_queryset(request)
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+
+    os.makedirs(get_export_directory(), exist_ok=True)
+    exported = write_csv_export(model_admin.resource_class(), queryset, get_export_path(name))
+    logger.info(f"Exported {exported} {opts.verbose_name_plural} to {name}")
+    return exported
+
+
+def delete_old_exports(max_age: Optional[int] = None) -> int:
+    """
+    Delete the export files older than max_age seconds, returns the amount of deleted files.
+
+    :param max_age: the maximum age of an export in seconds, defaults to EXPORT_RETENTION_HOURS hours
+    """
+    max_age = max_age if max_age is not None else settings.EXPORT_RETENTION_HOURS * 3600
+    directory = get_export_directory()
+    if not os.path.isdir(directory):
+        return 0
+
+    deleted = 0
+    for entry in os.scandir(directory):
+        name = entry.name.removesuffix(".part")
+        if EXPORT_NAME_PATTERN.match(name) is None or time.time() - entry.stat().st_mtime < max_age:
+            continue
+        try:
+            os.remove(entry.path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+
+    logger.info(f"Deleted {deleted} exports older than {max_age} seconds")
+    return deleted
+
+
+class BackgroundCsvExportMixin:
+    """
+    Admin mixin adding an action that exports the selected objects to CSV in the background.
+
+    Exports in the request are limited by the request timeout of the server, this export runs in a Celery task and is
+    downloaded from a link shown after starting it. Uses the resource_class of the admin. The export directory must be
+    shared between the web server and the Celery workers, exports are deleted after EXPORT_RETENTION_HOURS hours.
+    """
+
+    actions = ["export_csv_in_background"]
+
+    def get_urls(self):
+        """Add the URL to download exports."""
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path(
+                "exports/<str:name>/",
+                self.admin_site.admin_view(self.download_export_view),
+                name="%s_%s_download_export" % info,
+            ),
+        ] + super(BackgroundCsvExportMixin, self).get_urls()
+
+    @admin.action(description="Export selected objects to CSV in the background")
+    def export_csv_in_background(self, request, queryset):
+        """Start the export of the selected objects."""
+        name = start_csv_export(request, queryset)
+        url = reverse(
+            "admin:%s_%s_download_export" % (self.model._meta.app_label, self.model._meta.model_name), args=(name,)
+        )
+        self.message_user(
+            request,
+            format_html('Started the export, it can be downloaded <a href="{}">here</a> when it is finished.', url),
+            level=messages.SUCCESS,
+        )
+
+    def download_export_view(self, request, name):
+        """Download a finished export, only exports of the model of this admin can be downloaded."""
+        if not self.has_view_permission(request) or not name.startswith(f"{self.model._meta.model_name}-"):
+            raise Http404("Export not found")
+
+        export_path = get_export_path(name)
+        if not os.path.exists(export_path):
+            if os.path.exists(f"{export_path}.part"):
+                self.message_user(request, "The export is not finished yet, try again later.", level=messages.WARNING)
+            else:
+                self.message_user(request, "The export could not be found.", level=messages.WARNING)
+            return HttpResponseRedirect(
+                reverse("admin:%s_%s_changelist" % (self.model._meta.app_label, self.model._meta.model_name))
+            )
+        return FileResponse(open(export_path, "rb"), as_attachment=True, filename=name)
@@ -0,0 +1,88 @@
+import contextlib
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+from mode_groothandel.exceptions import LockTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Process local locks, used when the database does not support advisory locks. The second value of a tuple is the
+# amount of threads holding or waiting for the lock, the lock is removed when it drops to zero.
+_local_locks: Dict[str, Tuple[threading.RLock, int]] = dict()
+_local_locks_lock = threading.Lock()
+
+
+def _advisory_lock_id(key: str) -> int:
+    """Convert a key to a (signed 64-bit) Postgres advisory lock ID."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+@contextlib.contextmanager
+def _advisory_lock(key: str, timeout: float) -> Iterator[None]:
+    """Hold a Postgres session level advisory lock, shared by all processes using the database."""
+    lock_id = _advisory_lock_id(key)
+    deadline = time.monotonic() + timeout
+    wait = 0.05
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [lock_id])
+            if cursor.fetchone()[0]:
+                break
+            if time.monotonic() >= deadline:
+                raise LockTimeoutError(f"Timed out after {timeout} seconds waiting for lock {key}")
+            time.sleep(wait)
+            wait = min(wait * 2, 1.0)
+
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+
+
+@contextlib.contextmanager
+def _local_lock(key: str, timeout: float) -> Iterator[None]:
+    """Hold a process local lock."""
+    with _local_locks_lock:
+        lock, users = _local_locks.get(key, (threading.RLock(), 0))
+        _local_locks[key] = (lock, users + 1)
+
+    try:
+        if not lock.acquire(timeout=timeout):
+            raise LockTimeoutError(f"Timed out after {timeout} seconds waiting for lock {key}")
+        try:
+            yield
+        finally:
+            lock.release()
+    finally:
+        with _local_locks_lock:
+            lock, users = _local_locks[key]
+            if users <= 1:
+                del _local_locks[key]
+            else:
+                _local_locks[key] = (lock, users - 1)
+
+
+@contextlib.contextmanager
+def keyed_lock(key: str, timeout: Optional[float] = None) -> Iterator[None]:
+    """
+    Serialise work on one entity (e.g. "invoice:1234") between all threads and processes.
+
+    Work on different keys runs in parallel. The lock is a Postgres advisory lock, other databases fall back to a
+    process local lock. Locks are reentrant, so a function holding a lock can call another function taking the same
+    lock. To prevent deadlocks, a document lock is always taken before a customer lock.
+
+    :param key: the key of the entity
+    :param timeout: the maximum amount of seconds to wait for the lock, defaults to KEYED_LOCK_TIMEOUT
+    :raises LockTimeoutError: when the lock could not be acquired within the timeout
+    """
+    timeout = timeout if timeout is not None else settings.KEYED_LOCK_TIMEOUT
+    lock = _advisory_lock if connection.vendor == "postgresql" else _local_lock
+    with lock(key, timeout):
+        yield
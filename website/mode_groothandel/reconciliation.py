@@ -0,0 +1,167 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Set, Tuple, Type
+
+from django.db import models, transaction
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Sent with the model as sender after a reconciliation changed its table. Bulk operations do not send the post_save and
+# post_delete signals, so receivers that invalidate data loaded from a table should listen to this signal as well.
+reconciled = Signal()
+
+
+@dataclass
+class ReconciliationResult[M: models.Model]:
+    """The result of a reconciliation, instances contains the saved instances by their key."""
+
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    instances: Dict[Tuple, M] = field(default_factory=dict)
+
+    @property
+    def changed(self) -> bool:
+        """Whether the table was changed."""
+        return self.created > 0 or self.updated > 0 or self.deleted > 0
+
+    def as_tuple(self) -> Tuple[int, int, int]:
+        """Get the amount of created, updated and deleted rows."""
+        return self.created, self.updated, self.deleted
+
+
+def _normalize(model: Type[models.Model], values: Mapping[str, Any]) -> Dict[str, Any]:
+    """Convert values to the Python types the model fields return, so they can be compared with the database."""
+    return {name: model._meta.get_field(name).to_python(value) for name, value in values.items()}
+
+
+def reconcile[M: models.Model](
+    model: Type[M],
+    key_fields: Sequence[str],
+    rows: Iterable[Mapping[str, Any]],
+    delete_missing: bool = True,
+    batch_size: int = 500,
+) -> ReconciliationResult[M]:
+    """
+    Reconcile a table with a list of rows retrieved from upstream.
+
+    The rows are diffed against the table in memory: new rows are inserted with one bulk insert, rows of which at least
+    one field changed are updated with one bulk update and (when delete_missing is set) rows that are not present
+    upstream anymore are removed with one delete. Rows that did not change are not written at all.
+
+    :param model: the model of the table
+    :param key_fields: the fields identifying a row, these must be unique together in the table
+    :param rows: the rows retrieved from upstream, mapping field names to values
+    :param delete_missing: whether rows not present in rows should be deleted
+    :param batch_size: the amount of rows per insert or update query
+    """
+    desired: Dict[Tuple, Dict[str, Any]] = dict()
+    for row in rows:
+        values = _normalize(model, row)
+        desired[tuple(values[name] for name in key_fields)] = values
+
+    queryset = model.objects.all()
+    if not delete_missing and len(key_fields) == 1:
+        queryset = queryset.filter(**{f"{key_fields[0]}__in": [key[0] for key in desired.keys()]})
+    existing: Dict[Tuple, M] = {
+        tuple(getattr(instance, name) for name in key_fields): instance for instance in queryset
+    }
+
+    result = ReconciliationResult()
+    to_create: List[M] = list()
+    to_update: List[M] = list()
+    update_fields: Set[str] = set()
+    for key, values in desired.items():
+        instance = existing.get(key, None)
+        if instance is None:
+            instance = model(**values)
+            to_create.append(instance)
+        else:
+            changed_fields = [name for name, value in values.items() if getattr(instance, name) != value]
+            for name in changed_fields:
+                setattr(instance, name, values[name])
+            if changed_fields:
+                to_update.append(instance)
+                update_fields.update(changed_fields)
+        result.instances[key] = instance
+
+    to_delete = [instance.pk for key, instance in existing.items() if key not in desired] if delete_missing else []
+
+    with transaction.atomic():
+        if to_create:
+            value_fields = [name for name in next(iter(desired.values())).keys() if name not in key_fields]
+            # Conflicts only occur when another refresh inserted the same rows in the meantime.
+            model.objects.bulk_create(
+                to_create,
+                batch_size=batch_size,
+                update_conflicts=bool(value_fields),
+                ignore_conflicts=not value_fields,
+                unique_fields=key_fields if value_fields else None,
+                update_fields=value_fields or None,
+            )
+        if to_update:
+            model.objects.bulk_update(to_update, fields=sorted(update_fields), batch_size=batch_size)
+        if to_delete:
+            _, deleted_per_model = model.objects.filter(pk__in=to_delete).delete()
+            result.deleted = deleted_per_model.get(model._meta.label, 0)
+
+    if any(instance.pk is None for instance in to_create):
+        # Not all database backends return primary keys from a bulk insert that handles conflicts.
+        for instance in model.objects.filter(**{f"{key_fields[0]}__in": [key[0] for key in desired.keys()]}):
+            key = tuple(getattr(instance, name) for name in key_fields)
+            if key in result.instances:
+                result.instances[key] = instance
+
+    result.created = len(to_create)
+    result.updated = len(to_update)
+    logger.info(
+        f"Reconciled {model._meta.label} ({result.created} created, {result.updated} updated, {result.deleted} "
+        f"deleted)"
+    )
+    if result.changed:
+        reconciled.send(sender=model, result=result)
+    return result
+
+
+def reconcile_m2m(
+    model: Type[models.Model], field_name: str, links: Mapping[int, Iterable[int]], batch_size: int = 500
+) -> Tuple[int, int]:
+    """
+    Reconcile the links of a many-to-many field for a set of instances.
+
+    Missing links are inserted in the through table with one bulk insert and links that should not exist anymore are
+    removed with one delete. Returns the amount of added and removed links.
+
+    :param model: the model defining the many-to-many field
+    :param field_name: the name of the many-to-many field
+    :param links: the primary keys of the related objects per primary key of an instance of model
+    :param batch_size: the amount of rows per insert query
+    """
+    m2m_field = model._meta.get_field(field_name)
+    through = m2m_field.remote_field.through
+    source_column = f"{m2m_field.m2m_field_name()}_id"
+    target_column = f"{m2m_field.m2m_reverse_field_name()}_id"
+
+    desired = {(source, target) for source, targets in links.items() for target in targets}
+    existing = {
+        (source, target): pk
+        for pk, source, target in through.objects.filter(**{f"{source_column}__in": list(links.keys())}).values_list(
+            "pk", source_column, target_column
+        )
+    }
+
+    to_add = [
+        through(**{source_column: source, target_column: target}) for source, target in desired - existing.keys()
+    ]
+    to_remove = [pk for link, pk in existing.items() if link not in desired]
+
+    with transaction.atomic():
+        if to_add:
+            through.objects.bulk_create(to_add, batch_size=batch_size, ignore_conflicts=True)
+        if to_remove:
+            through.objects.filter(pk__in=to_remove).delete()
+
+    if to_add or to_remove:
+        reconciled.send(sender=model, result=None)
+    return len(to_add), len(to_remove)
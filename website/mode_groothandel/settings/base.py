@@ -133,14 +133,90 @@ UPHANCE_CACHE_PATH = os.environ.get("UPHANCE_CACHE_PATH", ".uphance-cache")
 
 UPHANCE_SECRET = os.environ.get("UPHANCE_SECRET", None)
 
+# API clients are reused within a process, these settings configure the size of their connection pools.
+UPHANCE_POOL_CONNECTIONS = int(os.environ.get("UPHANCE_POOL_CONNECTIONS", 2))
+UPHANCE_POOL_MAXSIZE = int(os.environ.get("UPHANCE_POOL_MAXSIZE", 10))
+SNELSTART_POOL_CONNECTIONS = int(os.environ.get("SNELSTART_POOL_CONNECTIONS", 2))
+SNELSTART_POOL_MAXSIZE = int(os.environ.get("SNELSTART_POOL_MAXSIZE", 10))
+SENDCLOUD_POOL_CONNECTIONS = int(os.environ.get("SENDCLOUD_POOL_CONNECTIONS", 2))
+SENDCLOUD_POOL_MAXSIZE = int(os.environ.get("SENDCLOUD_POOL_MAXSIZE", 10))
+
+# Requests to the APIs are rate limited with a token bucket shared between all processes. The rate is in requests per
+# second, the burst is the amount of requests that may be done at once. Set the rate to 0 to disable rate limiting.
+# The bucket is stored in Redis when RATE_LIMIT_REDIS_URL is set, otherwise in a file in RATE_LIMIT_PATH.
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", None)
+RATE_LIMIT_PATH = os.environ.get("RATE_LIMIT_PATH", ".rate-limit")
+UPHANCE_RATE_LIMIT = float(os.environ.get("UPHANCE_RATE_LIMIT", 2))
+UPHANCE_RATE_LIMIT_BURST = int(os.environ.get("UPHANCE_RATE_LIMIT_BURST", 5))
+SNELSTART_RATE_LIMIT = float(os.environ.get("SNELSTART_RATE_LIMIT", 5))
+SNELSTART_RATE_LIMIT_BURST = int(os.environ.get("SNELSTART_RATE_LIMIT_BURST", 10))
+SENDCLOUD_RATE_LIMIT = float(os.environ.get("SENDCLOUD_RATE_LIMIT", 5))
+SENDCLOUD_RATE_LIMIT_BURST = int(os.environ.get("SENDCLOUD_RATE_LIMIT_BURST", 10))
+# The amount of times a request is retried after a 429 response, the request rate is lowered on every 429 response.
+RATE_LIMIT_RETRIES = int(os.environ.get("RATE_LIMIT_RETRIES", 5))
+
 SNELSTART_CLIENT_KEY = os.environ.get("SNELSTART_CLIENT_KEY", None)
 SNELSTART_SUBSCRIPTION_KEY = os.environ.get("SNELSTART_SUBSCRIPTION_KEY", None)
 SNELSTART_CACHE_PATH = os.environ.get("SNELSTART_CACHE_PATH", ".snelstart-cache")
+# The amount of relaties retrieved per request when refreshing the cached relaties.
+SNELSTART_RELATIES_PAGE_SIZE = int(os.environ.get("SNELSTART_RELATIES_PAGE_SIZE", 500))
+
+# Access tokens are cached in files ("file", see UPHANCE_CACHE_PATH and SNELSTART_CACHE_PATH) or in a Django cache
+# ("django", see TOKEN_CACHE_ALIAS). Use a Django cache shared between containers (e.g. Redis) when running multiple
+# containers. Tokens are refreshed in the background when they expire within TOKEN_REFRESH_BEFORE_EXPIRY seconds.
+TOKEN_CACHE_BACKEND = os.environ.get("TOKEN_CACHE_BACKEND", "file")
+TOKEN_CACHE_ALIAS = os.environ.get("TOKEN_CACHE_ALIAS", "default")
+TOKEN_REFRESH_BEFORE_EXPIRY = int(os.environ.get("TOKEN_REFRESH_BEFORE_EXPIRY", 600))
 
 SENDCLOUD_PUBLIC_KEY = os.environ.get("SENDCLOUD_PUBLIC_KEY", None)
 SENDCLOUD_PRIVATE_KEY = os.environ.get("SENDCLOUD_PRIVATE_KEY", None)
 SENDCLOUD_DEFAULT_SHIPPING_METHOD = os.environ.get("SENDCLOUD_DEFAULT_SHIPPING_METHOD", None)
 
+# The amount of pages fetched at the same time when sweeping over all objects of an Uphance list endpoint.
+UPHANCE_SWEEP_WORKERS = int(os.environ.get("UPHANCE_SWEEP_WORKERS", 4))
+# Customers and sales orders retrieved from Uphance are cached for this amount of seconds (0 disables caching), they
+# are removed from the cache earlier when a customer or sales order webhook arrives.
+UPHANCE_CUSTOMER_CACHE_TTL = int(os.environ.get("UPHANCE_CUSTOMER_CACHE_TTL", 3600))
+UPHANCE_SALES_ORDER_CACHE_TTL = int(os.environ.get("UPHANCE_SALES_ORDER_CACHE_TTL", 3600))
+# The amount of customers resolved at the same time before a batch of invoices or credit notes is synchronised.
+CUSTOMER_RESOLUTION_WORKERS = int(os.environ.get("CUSTOMER_RESOLUTION_WORKERS", 4))
+# The amount of documents synchronised at the same time by the synchronize_* management commands for a range.
+BACKFILL_WORKERS = int(os.environ.get("BACKFILL_WORKERS", 4))
+
 MAXIMUM_AMOUNT_OF_CREDIT_NOTES_TO_SYNC = int(os.environ.get("MAXIMUM_AMOUNT_OF_CREDIT_NOTES_TO_SYNC", 5))
+MAXIMUM_AMOUNT_OF_INVOICES_TO_SYNC = int(os.environ.get("MAXIMUM_AMOUNT_OF_INVOICES_TO_SYNC", 25))
+MAXIMUM_AMOUNT_OF_PICK_TICKETS_TO_SYNC = int(os.environ.get("MAXIMUM_AMOUNT_OF_PICK_TICKETS_TO_SYNC", 25))
+# Mutations recorded during a synchronisation run or backfill are written in bulk once this amount is buffered.
+MUTATION_BUFFER_SIZE = int(os.environ.get("MUTATION_BUFFER_SIZE", 500))
+# Mutations older than MUTATION_RETENTION_DAYS days are moved to monthly gzipped JSON lines files in
+# MUTATION_ARCHIVE_PATH, only the amount of Mutations per day is kept in the database. Retention is off (0 days) by
+# default. The archive is the only copy of the archived Mutations, so MUTATION_ARCHIVE_PATH must be set explicitly to a
+# directory on persistent storage (e.g. a volume mounted in the container), Mutations are never archived without it.
+# A run of the retention task archives at most MUTATION_RETENTION_MAX_BATCHES batches.
+MUTATION_RETENTION_DAYS = int(os.environ.get("MUTATION_RETENTION_DAYS", 0))
+MUTATION_ARCHIVE_PATH = os.environ.get("MUTATION_ARCHIVE_PATH", None)
+MUTATION_RETENTION_BATCH_SIZE = int(os.environ.get("MUTATION_RETENTION_BATCH_SIZE", 1000))
+MUTATION_RETENTION_MAX_BATCHES = int(os.environ.get("MUTATION_RETENTION_MAX_BATCHES", 100))
+# Exports started from the admin are written to CSV files in this directory by a Celery worker and downloaded through
+# the web server, so it must be shared storage. Defaults to the exports directory in MEDIA_ROOT. Exports are deleted
+# after EXPORT_RETENTION_HOURS hours.
+EXPORT_PATH = os.environ.get("EXPORT_PATH", None)
+EXPORT_RETENTION_HOURS = int(os.environ.get("EXPORT_RETENTION_HOURS", 24))
+# The maximum amount of seconds to wait until another process finished synchronising the same document or customer.
+KEYED_LOCK_TIMEOUT = int(os.environ.get("KEYED_LOCK_TIMEOUT", 300))
+# A periodic synchronisation run is considered dead after this amount of seconds, so the next run can start.
+SYNC_CURSOR_LOCK_TIMEOUT = int(os.environ.get("SYNC_CURSOR_LOCK_TIMEOUT", 1800))
+# Documents that failed in a periodic synchronisation run are retried in later runs up to this amount of attempts.
+SYNC_MAXIMUM_ATTEMPTS = int(os.environ.get("SYNC_MAXIMUM_ATTEMPTS", 5))
+
+# Reference data (e.g. tax mappings) is kept in memory per process and reloaded when it changes, or at the latest
+# after this amount of seconds.
+REFERENCE_DATA_SNAPSHOT_TTL = int(os.environ.get("REFERENCE_DATA_SNAPSHOT_TTL", 3600))
+
 # This is needed because Uphance does not communicate the channel ID in credit notes yet.
 HARDCODED_CREDIT_NOTES_CHANNEL_ID = int(os.environ.get("HARDCODED_CREDIT_NOTES_CHANNEL_ID", 10880))
+
+# Webhooks are processed asynchronously, failed webhooks are retried until the maximum amount of attempts is reached.
+WEBHOOK_MAXIMUM_ATTEMPTS = int(os.environ.get("WEBHOOK_MAXIMUM_ATTEMPTS", 5))
+# Webhooks that are processing for longer than this amount of seconds are considered lost and are enqueued again.
+WEBHOOK_PROCESSING_TIMEOUT = int(os.environ.get("WEBHOOK_PROCESSING_TIMEOUT", 900))
@@ -46,3 +46,6 @@ CACHES = {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
+
+# Celery
+CELERY_TASK_ALWAYS_EAGER = True
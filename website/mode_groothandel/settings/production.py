@@ -93,9 +93,54 @@ if os.environ.get("SENTRY_DSN"):
     )
 
 # CACHES
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
-        "LOCATION": "/app/cache",
+if os.environ.get("DJANGO_CACHE_REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("DJANGO_CACHE_REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": "/app/cache",
+        }
     }
+
+# CELERY
+CELERY_BEAT_SCHEDULE = {
+    "requeue-webhook-events": {
+        "task": "uphance.tasks.requeue_webhook_events",
+        "schedule": crontab(minute="*/15"),
+    },
+    "synchronize-invoices": {
+        "task": "invoices.tasks.synchronize_invoices",
+        "schedule": crontab(minute="*/10"),
+    },
+    "synchronize-pick-tickets": {
+        "task": "pick_tickets.tasks.synchronize_pick_tickets",
+        "schedule": crontab(minute="*/10"),
+    },
+    "refresh-cached-relaties": {
+        "task": "snelstart.tasks.refresh_cached_relaties",
+        "schedule": crontab(minute="*/15"),
+    },
+    "refresh-cached-relaties-full": {
+        "task": "snelstart.tasks.refresh_cached_relaties",
+        "schedule": crontab(hour="3", minute="30"),
+        "kwargs": {"full": True},
+    },
+    "refresh-access-tokens": {
+        "task": "mode_groothandel.tasks.refresh_access_tokens",
+        "schedule": crontab(minute="*/5"),
+    },
+    "archive-mutations": {
+        "task": "mutations.tasks.archive_mutations",
+        "schedule": crontab(minute="45"),
+    },
+    "delete-old-exports": {
+        "task": "mode_groothandel.tasks.delete_old_exports",
+        "schedule": crontab(minute="50"),
+    },
 }
@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot[T]:
+    """
+    Process-local snapshot of (reference) data loaded from the database.
+
+    The data is loaded once per process and kept in memory. To let other processes know the data changed, a
+    generation number is stored in the Django cache, invalidating the snapshot increments it and every process reloads
+    its snapshot when it notices a different generation. An optional time to live bounds how long a snapshot is used
+    when an invalidation is missed (e.g. a change made with a queryset update). The generation is checked at most once
+    per generation_check_interval seconds, in between the snapshot is used without accessing the cache.
+    """
+
+    generation_check_interval = 2.0
+
+    def __init__(self, name: str, loader: Callable[[], T], ttl: Optional[int] = None):
+        """Initialize a Snapshot."""
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self._generation_key = f"snapshot:{name}:generation"
+        self._data = None
+        self._generation = None
+        self._loaded_at = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self, generation: int) -> bool:
+        """Whether the data in memory should be reloaded."""
+        if self._loaded_at is None or generation != self._generation:
+            return True
+        return self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl
+
+    def _is_checked(self) -> bool:
+        """Whether the generation was checked within the check interval."""
+        return self._checked_at is not None and time.monotonic() - self._checked_at < self.generation_check_interval
+
+    def get(self) -> T:
+        """Get the data, reloading it when it is stale."""
+        if self._is_checked() and not self._is_stale(self._generation):
+            return self._data
+
+        generation = cache.get(self._generation_key, 0)
+        self._checked_at = time.monotonic()
+        if not self._is_stale(generation):
+            return self._data
+
+        with self._lock:
+            if self._is_stale(generation):
+                logger.debug("Loading snapshot %s (generation %s)", self.name, generation)
+                self._data = self.loader()
+                self._generation = generation
+                self._loaded_at = time.monotonic()
+            return self._data
+
+    def invalidate(self) -> None:
+        """
+        Invalidate the snapshot in all processes.
+
+        Within a transaction the snapshot is invalidated when the transaction commits, otherwise another process could
+        reload the data it can still see (the old data) under the new generation and use it until the TTL expires.
+        """
+        transaction.on_commit(self._increment_generation, robust=True)
+
+    def _increment_generation(self) -> None:
+        """Increment the generation, so every process reloads its snapshot."""
+        cache.add(self._generation_key, 0, timeout=None)
+        try:
+            cache.incr(self._generation_key)
+        except ValueError:
+            # The key was evicted between add and incr.
+            cache.set(self._generation_key, 1, timeout=None)
+        self._loaded_at = None
@@ -0,0 +1,31 @@
+import logging
+from typing import List, Optional, Tuple
+
+from celery import shared_task
+from django.conf import settings
+
+from mode_groothandel.exports import delete_old_exports as delete_old_exports_service, run_csv_export
+from snelstart.clients.snelstart import Snelstart
+from uphance.clients.uphance import Uphance
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_access_tokens():
+    """Refresh the Uphance and Snelstart access tokens before they expire, so webhooks never have to wait for it."""
+    for client in (Uphance.get_client(), Snelstart.get_client()):
+        if client.auth_manager.refresh_access_token_if_expiring(settings.TOKEN_REFRESH_BEFORE_EXPIRY):
+            logger.info(f"Refreshed access token of {client.__class__.__name__}")
+
+
+@shared_task
+def export_csv(model_label: str, user_id: int, params: List[Tuple[str, List[str]]], pks: Optional[List], name: str):
+    """Export objects to a CSV file, see mode_groothandel.exports.start_csv_export."""
+    run_csv_export(model_label, user_id, params, pks, name)
+
+
+@shared_task
+def delete_old_exports():
+    """Delete the exports older than the export retention period."""
+    delete_old_exports_service()
@@ -1,11 +1,10 @@
 from django.contrib import admin
 from django.contrib.contenttypes.admin import GenericTabularInline
-from django.contrib.contenttypes.models import ContentType
-from django.db.models import Exists, OuterRef, Subquery
 from import_export.admin import ExportMixin
 from rangefilter.filters import DateRangeFilter
 
-from mutations.models import Mutation
+from mode_groothandel.exports import BackgroundCsvExportMixin
+from mutations.models import Mutation, MutationDailyRollup
 from mutations.resources import MutationResource
 
 
@@ -14,10 +13,6 @@ class SucceededMutationFilter(admin.SimpleListFilter):
 
     parameter_name = "succeeded_mutation"
 
-    def __init__(self, request, params, model, model_admin):
-        super(SucceededMutationFilter, self).__init__(request, params, model, model_admin)
-        self.content_type = ContentType.objects.get_for_model(model)
-
     def lookups(self, request, model_admin):
         return [
             ("exists", "At least one succeeded mutation"),
@@ -27,40 +22,15 @@ class SucceededMutationFilter(admin.SimpleListFilter):
         ]
 
     def queryset(self, request, queryset):
+        # Uses the denormalised status of the objects, as Mutations older than the retention period are archived.
         if self.value() == "exists":
-            return queryset.filter(
-                Exists(
-                    Mutation.objects.filter(content_type=self.content_type, object_id=OuterRef("pk")).exclude(
-                        success=False
-                    )
-                )
-            )
+            return queryset.filter(ever_succeeded=True)
         elif self.value() == "not_exists":
-            return queryset.exclude(
-                id__in=Subquery(
-                    Mutation.objects.filter(content_type=self.content_type)
-                    .exclude(success=False)
-                    .values("object_id")
-                    .distinct()
-                    .all()
-                )
-            )
+            return queryset.filter(ever_succeeded=False)
         elif self.value() == "latest":
-            return queryset.annotate(
-                latest_success=Subquery(
-                    Mutation.objects.filter(content_type=self.content_type, object_id=OuterRef("pk"))
-                    .order_by("-created")
-                    .values("success")[:1]
-                )
-            ).filter(latest_success=True)
+            return queryset.filter(last_mutation_success=True)
         elif self.value() == "not_latest":
-            return queryset.annotate(
-                latest_success=Subquery(
-                    Mutation.objects.filter(content_type=self.content_type, object_id=OuterRef("pk"))
-                    .order_by("-created")
-                    .values("success")[:1]
-                )
-            ).filter(latest_success=False)
+            return queryset.filter(last_mutation_success=False)
 
         return queryset
 
@@ -100,7 +70,7 @@ class MutationInline(GenericTabularInline):
 
 
 @admin.register(Mutation)
-class MutationsAdmin(ExportMixin, admin.ModelAdmin):
+class MutationsAdmin(BackgroundCsvExportMixin, ExportMixin, admin.ModelAdmin):
     """Mutations Admin."""
 
     resource_class = MutationResource
@@ -125,3 +95,32 @@ class MutationsAdmin(ExportMixin, admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         """No change permission for this admin view."""
         return False
+
+
+@admin.register(MutationDailyRollup)
+class MutationDailyRollupAdmin(admin.ModelAdmin):
+    """Mutation Daily Rollups Admin."""
+
+    list_filter = [
+        "success",
+        "method",
+        "content_type",
+        ("date", DateRangeFilter),
+    ]
+
+    list_display = [
+        "date",
+        "content_type",
+        "method",
+        "trigger",
+        "success",
+        "count",
+    ]
+
+    def has_add_permission(self, request):
+        """No add permission for this admin view."""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """No change permission for this admin view."""
+        return False
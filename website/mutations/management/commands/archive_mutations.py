@@ -0,0 +1,37 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import BaseCommand, CommandError
+
+from mutations.retention import archive_mutations
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Archive Mutations older than the retention period."""
+
+    def add_arguments(self, parser):
+        """Add command line arguments."""
+        parser.add_argument("--days", type=int, default=settings.MUTATION_RETENTION_DAYS)
+        parser.add_argument("--batch-size", type=int, default=settings.MUTATION_RETENTION_BATCH_SIZE)
+        parser.add_argument(
+            "--max-batches", type=int, default=None, help="The maximum amount of batches, defaults to all batches"
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        if options["days"] <= 0:
+            print("Mutation retention is off, set MUTATION_RETENTION_DAYS or --days to archive Mutations")
+            return
+
+        max_batches = options["max_batches"] if options["max_batches"] is not None else 2**31
+        try:
+            archived = archive_mutations(
+                retention_days=options["days"], batch_size=options["batch_size"], max_batches=max_batches
+            )
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        print(f"Archived {archived} mutations to {settings.MUTATION_ARCHIVE_PATH}")
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("mutations", "0002_alter_mutation_trigger"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="mutation",
+            index=models.Index(
+                fields=["content_type", "object_id", "-created"], name="mutations_m_content_59be14_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mutation",
+            index=models.Index(fields=["content_type", "success", "object_id"], name="mutations_m_content_a5d16f_idx"),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("mutations", "0003_mutation_mutations_m_content_59be14_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MutationDailyRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("method", models.PositiveIntegerField(choices=[(0, "Create"), (1, "Update"), (2, "Delete")])),
+                ("trigger", models.PositiveIntegerField(choices=[(0, "Webhook"), (1, "Manual"), (2, "Cron")])),
+                ("success", models.BooleanField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "content_type",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="contenttypes.contenttype"),
+                ),
+            ],
+            options={
+                "unique_together": {("date", "content_type", "method", "trigger", "success")},
+            },
+        ),
+    ]
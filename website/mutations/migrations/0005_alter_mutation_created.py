@@ -0,0 +1,19 @@
+# Generated by Django 6.0.9 on 2026-10-18 10:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mutations", "0004_mutationdailyrollup"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="mutation",
+            name="created",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
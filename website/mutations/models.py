@@ -2,6 +2,7 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.db.models import ForeignKey, PositiveIntegerField
+from django.utils import timezone
 
 
 class Mutation(models.Model):
@@ -18,7 +19,8 @@ class Mutation(models.Model):
 
     TRIGGERS = ((TRIGGER_WEBHOOK, "Webhook"), (TRIGGER_MANUAL, "Manual"), (TRIGGER_CRON, "Cron"))
 
-    created = models.DateTimeField(auto_now_add=True)
+    # Set when the Mutation is recorded, not when it is written, as buffered Mutations are written in bulk later.
+    created = models.DateTimeField(default=timezone.now, editable=False)
     method = models.PositiveIntegerField(choices=TYPES)
     trigger = models.PositiveIntegerField(choices=TRIGGERS)
     content_type = ForeignKey(ContentType, on_delete=models.CASCADE)
@@ -27,6 +29,16 @@ class Mutation(models.Model):
     success = models.BooleanField()
     message = models.TextField(null=True, blank=True)
 
+    class Meta:
+        """Meta class."""
+
+        indexes = [
+            # The Mutations of an object, latest first.
+            models.Index(fields=["content_type", "object_id", "-created"]),
+            # The objects of a type with (or without) a succeeded Mutation.
+            models.Index(fields=["content_type", "success", "object_id"]),
+        ]
+
     @staticmethod
     def get_method_str(method_int: int) -> str:
         """Convert int method to str."""
@@ -41,3 +53,23 @@ class Mutation(models.Model):
         """Convert this object to string."""
         method_str = self.get_method_str(self.method)
         return f"{method_str} mutation on {self.on} at {self.created}"
+
+
+class MutationDailyRollup(models.Model):
+    """The amount of Mutations per day, kept after the Mutations themselves are archived."""
+
+    date = models.DateField()
+    content_type = ForeignKey(ContentType, on_delete=models.CASCADE)
+    method = models.PositiveIntegerField(choices=Mutation.TYPES)
+    trigger = models.PositiveIntegerField(choices=Mutation.TRIGGERS)
+    success = models.BooleanField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        """Convert this object to string."""
+        return f"{self.count} {Mutation.get_method_str(self.method)} mutations on {self.content_type} at {self.date}"
+
+    class Meta:
+        """Meta class."""
+
+        unique_together = (("date", "content_type", "method", "trigger", "success"),)
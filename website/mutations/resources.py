@@ -1,8 +1,94 @@
+from itertools import batched
+from typing import Dict, Iterable
+
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import Max, Subquery
 from import_export import resources
 from import_export.fields import Field
 
 from mutations import models
+from mutations.models import Mutation
+
+
+def latest_mutations(content_type: ContentType, object_ids: Iterable[int]) -> Dict[int, Mutation]:
+    """Get the latest Mutation of every object with one query."""
+    latest_ids = (
+        Mutation.objects.filter(content_type=content_type, object_id__in=list(object_ids))
+        .values("object_id")
+        .annotate(latest_id=Max("id"))
+        .values("latest_id")
+    )
+    return {mutation.object_id: mutation for mutation in Mutation.objects.filter(id__in=Subquery(latest_ids))}
+
+
+class LatestMutationResourceMixin:
+    """
+    Export the latest Mutation of every object with a model resource.
+
+    The objects are exported in chunks, the latest Mutations of the objects in a chunk are retrieved with one query.
+    """
+
+    ATTRIBUTE_MUTATION_METHOD = "mutation_method"
+    ATTRIBUTE_MUTATION_TRIGGER = "mutation_trigger"
+    ATTRIBUTE_MUTATION_SUCCESS = "mutation_success"
+    ATTRIBUTE_MUTATION_MESSAGE = "mutation_message"
+
+    def __init__(self, **kwargs):
+        super(LatestMutationResourceMixin, self).__init__(**kwargs)
+        self.content_type = ContentType.objects.get_for_model(self._meta.model)
+        self._latest_mutations: Dict[int, Mutation] = dict()
+
+    def before_export(self, queryset, *args, **kwargs):
+        """Add the fields for the last mutation."""
+        self.fields[self.ATTRIBUTE_MUTATION_METHOD] = Field(
+            column_name="Mutation method", attribute=self.ATTRIBUTE_MUTATION_METHOD, readonly=True
+        )
+        self.fields[self.ATTRIBUTE_MUTATION_TRIGGER] = Field(
+            column_name="Mutation trigger", attribute=self.ATTRIBUTE_MUTATION_TRIGGER, readonly=True
+        )
+        self.fields[self.ATTRIBUTE_MUTATION_SUCCESS] = Field(
+            column_name="Mutation success", attribute=self.ATTRIBUTE_MUTATION_SUCCESS, readonly=True
+        )
+        self.fields[self.ATTRIBUTE_MUTATION_MESSAGE] = Field(
+            column_name="Mutation message", attribute=self.ATTRIBUTE_MUTATION_MESSAGE, readonly=True
+        )
+
+    def iter_queryset(self, queryset):
+        """Iterate over the objects in chunks, retrieving the latest Mutations per chunk."""
+        for chunk in batched(super(LatestMutationResourceMixin, self).iter_queryset(queryset), self.get_chunk_size()):
+            self._latest_mutations = latest_mutations(self.content_type, [obj.pk for obj in chunk])
+            yield from chunk
+
+    def export_mutation_field(self, field, obj):
+        """Export the custom mutation fields."""
+        latest_mutation = self._latest_mutations.get(obj.pk, None)
+        if latest_mutation is None and obj.pk not in self._latest_mutations:
+            # The object is not exported by iter_queryset (e.g. when exporting a single object).
+            latest_mutation = latest_mutations(self.content_type, [obj.pk]).get(obj.pk, None)
+
+        if latest_mutation is not None:
+            if field.attribute == self.ATTRIBUTE_MUTATION_TRIGGER:
+                return latest_mutation.trigger
+            elif field.attribute == self.ATTRIBUTE_MUTATION_SUCCESS:
+                return latest_mutation.success
+            elif field.attribute == self.ATTRIBUTE_MUTATION_MESSAGE:
+                return latest_mutation.message
+            elif field.attribute == self.ATTRIBUTE_MUTATION_METHOD:
+                return latest_mutation.method
+
+        return None
+
+    def export_field(self, field, obj, **kwargs):
+        """Check for added mutation field before exporting."""
+        if field.attribute in [
+            self.ATTRIBUTE_MUTATION_TRIGGER,
+            self.ATTRIBUTE_MUTATION_MESSAGE,
+            self.ATTRIBUTE_MUTATION_SUCCESS,
+            self.ATTRIBUTE_MUTATION_METHOD,
+        ]:
+            return self.export_mutation_field(field, obj)
+        else:
+            return super(LatestMutationResourceMixin, self).export_field(field, obj, **kwargs)
 
 
 class MutationResource(resources.ModelResource):
@@ -21,21 +107,40 @@ class MutationResource(resources.ModelResource):
 
     def before_export(self, queryset, *args, **kwargs):
         """Initialize by creating a field for content type that is supported."""
-        for obj in queryset:
-            if obj.content_type == self.customer_type:
-                self.fields[self.ATTRIBUTE_CUSTOMER_NAME] = Field(
-                    column_name="Customer name", attribute=self.ATTRIBUTE_CUSTOMER_NAME, readonly=True
-                )
-                self.fields[self.ATTRIBUTE_CUSTOMER_UPHANCE_ID] = Field(
-                    column_name="Customer Uphance ID", attribute=self.ATTRIBUTE_CUSTOMER_UPHANCE_ID, readonly=True
-                )
-                self.fields[self.ATTRIBUTE_CUSTOMER_SNELSTART_ID] = Field(
-                    column_name="Customer Snelstart ID", attribute=self.ATTRIBUTE_CUSTOMER_SNELSTART_ID, readonly=True
+        if queryset is not None and queryset.filter(content_type=self.customer_type).exists():
+            self.fields[self.ATTRIBUTE_CUSTOMER_NAME] = Field(
+                column_name="Customer name", attribute=self.ATTRIBUTE_CUSTOMER_NAME, readonly=True
+            )
+            self.fields[self.ATTRIBUTE_CUSTOMER_UPHANCE_ID] = Field(
+                column_name="Customer Uphance ID", attribute=self.ATTRIBUTE_CUSTOMER_UPHANCE_ID, readonly=True
+            )
+            self.fields[self.ATTRIBUTE_CUSTOMER_SNELSTART_ID] = Field(
+                column_name="Customer Snelstart ID", attribute=self.ATTRIBUTE_CUSTOMER_SNELSTART_ID, readonly=True
+            )
+
+    def iter_queryset(self, queryset):
+        """Iterate over the Mutations in chunks, retrieving the objects of the Mutations per content type per chunk."""
+        for chunk in batched(super(MutationResource, self).iter_queryset(queryset), self.get_chunk_size()):
+            object_ids = dict()
+            for mutation in chunk:
+                object_ids.setdefault(mutation.content_type_id, set()).add(mutation.object_id)
+
+            objects = dict()
+            for content_type_id, ids in object_ids.items():
+                model = ContentType.objects.get_for_id(content_type_id).model_class()
+                if model is not None:
+                    objects[content_type_id] = model._default_manager.in_bulk(ids)
+
+            for mutation in chunk:
+                # Fill the cache of the GenericForeignKey, so that the object is not retrieved per Mutation.
+                Mutation.on.set_cached_value(
+                    mutation, objects.get(mutation.content_type_id, dict()).get(mutation.object_id, None)
                 )
+                yield mutation
 
     def export_customer_field(self, field, obj):
         """Export the custom customer fields."""
-        if obj.content_type == self.customer_type:
+        if obj.content_type_id == self.customer_type.id and obj.on is not None:
             if field.attribute == self.ATTRIBUTE_CUSTOMER_NAME:
                 return obj.on.uphance_name
             elif field.attribute == self.ATTRIBUTE_CUSTOMER_UPHANCE_ID:
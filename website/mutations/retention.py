@@ -0,0 +1,146 @@
+import datetime
+import fcntl
+import gzip
+import json
+import logging
+import os
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from mutations.models import Mutation, MutationDailyRollup
+
+logger = logging.getLogger(__name__)
+
+
+def _check_archive_path() -> None:
+    """Refuse to archive when no archive path is configured, as the archive is the only copy of archived Mutations."""
+    if not settings.MUTATION_ARCHIVE_PATH:
+        raise ImproperlyConfigured(
+            "MUTATION_ARCHIVE_PATH must be set to a directory on persistent storage to archive Mutations"
+        )
+
+
+def _archive_path(month: datetime.date) -> str:
+    """Get the path of the archive file of a month."""
+    return os.path.join(settings.MUTATION_ARCHIVE_PATH, f"mutations-{month:%Y-%m}.jsonl.gz")
+
+
+def _write_archive(month: datetime.date, rows: List[Dict]) -> None:
+    """
+    Append rows to the archive file of a month.
+
+    Every write appends a gzip member to the file, a file with multiple members is read as one stream by gzip. The file
+    is locked while writing and synced to disk before the Mutations are deleted from the database.
+    """
+    with open(_archive_path(month), "ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            with gzip.GzipFile(fileobj=f, mode="wb") as archive:
+                for row in rows:
+                    archive.write(json.dumps(row, default=str).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _add_to_rollups(counts: Counter) -> None:
+    """Add counted Mutations to the daily rollups."""
+    for (date, content_type_id, method, trigger, success), count in counts.items():
+        key = dict(date=date, content_type_id=content_type_id, method=method, trigger=trigger, success=success)
+        if MutationDailyRollup.objects.filter(**key).update(count=F("count") + count) == 0:
+            MutationDailyRollup.objects.create(count=count, **key)
+
+
+def archive_mutation_batch(before: datetime.datetime, batch_size: int) -> int:
+    """
+    Archive one batch of the oldest Mutations created before a moment, returns the amount of archived Mutations.
+
+    The Mutations are written to the archive files of the months they were created in, counted in the daily rollups
+    and deleted in one transaction. Mutations are appended to the archive before the transaction commits, so a batch of
+    which the transaction fails is archived again by the next run (the archived rows contain the Mutation ID).
+
+    :raises ImproperlyConfigured: when MUTATION_ARCHIVE_PATH is not set
+    """
+    _check_archive_path()
+    with transaction.atomic():
+        rows = list(
+            Mutation.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(created__lt=before)
+            .order_by("id")
+            .values(
+                "id",
+                "created",
+                "method",
+                "trigger",
+                "content_type_id",
+                "content_type__app_label",
+                "content_type__model",
+                "object_id",
+                "success",
+                "message",
+            )[:batch_size]
+        )
+        if len(rows) == 0:
+            return 0
+
+        per_month: Dict[datetime.date, List[Dict]] = defaultdict(list)
+        counts: Counter[Tuple] = Counter()
+        for row in rows:
+            date = timezone.localdate(row["created"])
+            per_month[date.replace(day=1)].append(
+                {
+                    "id": row["id"],
+                    "created": row["created"].isoformat(),
+                    "method": row["method"],
+                    "trigger": row["trigger"],
+                    "content_type": f"{row['content_type__app_label']}.{row['content_type__model']}",
+                    "object_id": row["object_id"],
+                    "success": row["success"],
+                    "message": row["message"],
+                }
+            )
+            counts[(date, row["content_type_id"], row["method"], row["trigger"], row["success"])] += 1
+
+        for month, month_rows in per_month.items():
+            _write_archive(month, month_rows)
+        _add_to_rollups(counts)
+        Mutation.objects.filter(id__in=[row["id"] for row in rows]).delete()
+    return len(rows)
+
+
+def archive_mutations(
+    retention_days: Optional[int] = None, batch_size: Optional[int] = None, max_batches: Optional[int] = None
+) -> int:
+    """
+    Archive the Mutations older than the retention period in bounded batches, returns the amount of archived Mutations.
+
+    :param retention_days: the amount of days Mutations are kept in the database, defaults to MUTATION_RETENTION_DAYS
+    :param batch_size: the amount of Mutations archived per transaction, defaults to MUTATION_RETENTION_BATCH_SIZE
+    :param max_batches: the maximum amount of batches to archive, defaults to MUTATION_RETENTION_MAX_BATCHES
+    :raises ImproperlyConfigured: when retention is on and MUTATION_ARCHIVE_PATH is not set
+    """
+    retention_days = retention_days if retention_days is not None else settings.MUTATION_RETENTION_DAYS
+    batch_size = batch_size if batch_size is not None else settings.MUTATION_RETENTION_BATCH_SIZE
+    max_batches = max_batches if max_batches is not None else settings.MUTATION_RETENTION_MAX_BATCHES
+    if retention_days <= 0:
+        return 0
+
+    _check_archive_path()
+    os.makedirs(settings.MUTATION_ARCHIVE_PATH, exist_ok=True)
+    before = timezone.now() - datetime.timedelta(days=retention_days)
+    archived = 0
+    for _ in range(max_batches):
+        amount = archive_mutation_batch(before, batch_size)
+        archived += amount
+        if amount < batch_size:
+            break
+
+    logger.info(f"Archived {archived} mutations created before {before}")
+    return archived
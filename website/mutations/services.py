@@ -0,0 +1,144 @@
+import contextlib
+import datetime
+import contextvars
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from mutations.models import Mutation
+
+logger = logging.getLogger(__name__)
+
+
+def _has_mutation_status(model: Type[models.Model]) -> bool:
+    """Whether a model keeps the status of its latest Mutation."""
+    return any(field.name == "last_mutation_success" for field in model._meta.concrete_fields)
+
+
+def _update_mutation_status(mutations: Iterable[Mutation]) -> None:
+    """
+    Store the status of the latest Mutation on the objects of the Mutations.
+
+    The status is only written when it is newer than the stored status, so a flush of an older buffer does not
+    overwrite the status written by another process. Objects with a succeeded Mutation are marked as ever succeeded.
+    """
+    latest: Dict[Tuple[Type[models.Model], int], Mutation] = dict()
+    succeeded: Dict[Type[models.Model], Set[int]] = defaultdict(set)
+    for mutation in mutations:
+        model = mutation.content_type.model_class()
+        if model is not None and _has_mutation_status(model):
+            latest[(model, mutation.object_id)] = mutation
+            if mutation.success:
+                succeeded[model].add(mutation.object_id)
+
+    for model, ids in succeeded.items():
+        model.objects.filter(pk__in=ids, ever_succeeded=False).update(ever_succeeded=True)
+
+    # Objects are only updated together when their latest Mutations have the same status and creation time, so that
+    # every object is compared with (and gets) the creation time of its own latest Mutation.
+    object_ids: Dict[Tuple[Type[models.Model], bool, datetime.datetime], Set[int]] = defaultdict(set)
+    for (model, object_id), mutation in latest.items():
+        object_ids[(model, mutation.success, mutation.created)].add(object_id)
+
+    for (model, success, mutation_at), ids in object_ids.items():
+        model.objects.filter(
+            Q(last_mutation_at__isnull=True) | Q(last_mutation_at__lte=mutation_at), pk__in=ids
+        ).update(last_mutation_success=success, last_mutation_at=mutation_at)
+
+
+def _set_mutation_status(mutation: Mutation) -> None:
+    """Set the status of a Mutation on the object in memory, so a later save of the object does not revert it."""
+    obj = mutation.on
+    if obj is not None and _has_mutation_status(type(obj)):
+        obj.last_mutation_success = mutation.success
+        obj.last_mutation_at = mutation.created
+        obj.ever_succeeded = obj.ever_succeeded or mutation.success
+
+
+class MutationRecorder:
+    """
+    Buffer Mutations and write them with bulk inserts.
+
+    Mutations are written when the amount of buffered Mutations reaches flush_size and when the recorder is flushed.
+    The recorder may be shared between threads, a buffer is written by the thread that fills it.
+    """
+
+    def __init__(self, flush_size: Optional[int] = None):
+        """Initialize a Mutation Recorder."""
+        self.flush_size = max(1, flush_size if flush_size is not None else settings.MUTATION_BUFFER_SIZE)
+        self._buffer: List[Mutation] = list()
+        self._lock = threading.Lock()
+
+    def record(self, **kwargs) -> Mutation:
+        """Buffer a Mutation, the Mutation is not saved yet when it is returned."""
+        # The GenericForeignKey resolves the content type from the (per process cached) ContentType manager. The
+        # creation time is set here, so it is the time the Mutation was recorded and not the time it is written.
+        mutation = Mutation(**{"created": timezone.now(), **kwargs})
+        _set_mutation_status(mutation)
+        with self._lock:
+            self._buffer.append(mutation)
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self.flush()
+        return mutation
+
+    def flush(self) -> int:
+        """Write the buffered Mutations, returns the amount of Mutations written."""
+        with self._lock:
+            mutations, self._buffer = self._buffer, list()
+        if len(mutations) == 0:
+            return 0
+        Mutation.objects.bulk_create(mutations, batch_size=self.flush_size)
+        _update_mutation_status(mutations)
+        logger.debug(f"Wrote {len(mutations)} mutations")
+        return len(mutations)
+
+
+# The recorder of the buffered_mutations block being executed, if any.
+_recorder: contextvars.ContextVar[Optional[MutationRecorder]] = contextvars.ContextVar("recorder", default=None)
+
+
+@contextlib.contextmanager
+def buffered_mutations(flush_size: Optional[int] = None) -> Iterator[MutationRecorder]:
+    """
+    Buffer the Mutations recorded within the block and write them in bulk.
+
+    The buffered Mutations are written when the block is left, also when an exception escapes it. A nested block uses
+    the recorder of the outer block. Threads do not inherit the recorder, submit work to a thread pool with
+    contextvars.copy_context().run to record in the recorder of the submitting thread.
+    """
+    recorder = _recorder.get()
+    if recorder is not None:
+        yield recorder
+        return
+
+    recorder = MutationRecorder(flush_size)
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+        recorder.flush()
+
+
+def record_mutation(**kwargs) -> Mutation:
+    """
+    Record a Mutation, it is buffered within a buffered_mutations block and saved right away otherwise.
+
+    The status of the Mutation is stored on the object (see the last_mutation_success, last_mutation_at and
+    ever_succeeded fields) when the Mutation is written.
+    """
+    recorder = _recorder.get()
+    if recorder is not None:
+        return recorder.record(**kwargs)
+
+    mutation = Mutation.objects.create(**kwargs)
+    _set_mutation_status(mutation)
+    _update_mutation_status([mutation])
+    return mutation
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from mutations.retention import archive_mutations as archive_mutations_service
+
+
+@shared_task
+def archive_mutations():
+    """Archive the Mutations older than the retention period."""
+    archive_mutations_service()
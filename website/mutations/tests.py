@@ -0,0 +1,39 @@
+import contextvars
+
+from django.test import TestCase
+
+from invoices.models import Invoice
+from mutations.models import Mutation
+from mutations.services import buffered_mutations, record_mutation
+
+
+class RecordMutationTest(TestCase):
+    """Tests of recording Mutations and the status of the latest Mutation stored on objects."""
+
+    def test_buffered_mutation_keeps_recording_time(self):
+        """A buffered Mutation written after a newer Mutation is dated before it and does not overwrite its status."""
+        invoice = Invoice.objects.create(uphance_id=1)
+
+        with buffered_mutations():
+            failure = record_mutation(
+                method=Mutation.METHOD_CREATE, trigger=Mutation.TRIGGER_CRON, on=invoice, success=False, message=None
+            )
+            # Recorded outside the buffered_mutations block (e.g. by a webhook), so it is written right away.
+            success = contextvars.Context().run(
+                record_mutation,
+                method=Mutation.METHOD_UPDATE,
+                trigger=Mutation.TRIGGER_WEBHOOK,
+                on=Invoice.objects.get(id=invoice.id),
+                success=True,
+                message=None,
+            )
+            self.assertFalse(Mutation.objects.filter(success=False).exists())
+
+        failure.refresh_from_db()
+        success.refresh_from_db()
+        self.assertLess(failure.created, success.created)
+
+        invoice.refresh_from_db()
+        self.assertTrue(invoice.last_mutation_success)
+        self.assertEqual(invoice.last_mutation_at, success.created)
+        self.assertTrue(invoice.ever_succeeded)
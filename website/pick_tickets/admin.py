@@ -2,13 +2,14 @@ from django.contrib import admin
 from import_export.admin import ExportMixin
 from rangefilter.filters import DateRangeFilter
 
+from mode_groothandel.exports import BackgroundCsvExportMixin
 from mutations.admin import MutationInline, SucceededMutationFilter
 from pick_tickets.models import PickTicket
 from pick_tickets.resources import PickTicketResource
 
 
 @admin.register(PickTicket)
-class PickTicketAdmin(ExportMixin, admin.ModelAdmin):
+class PickTicketAdmin(BackgroundCsvExportMixin, ExportMixin, admin.ModelAdmin):
     """Pick Ticket Admin."""
 
     resource_class = PickTicketResource
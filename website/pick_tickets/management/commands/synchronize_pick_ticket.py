@@ -1,6 +1,5 @@
 import logging
 import re
-import time
 from typing import Optional
 
 from django.conf import settings
@@ -9,9 +8,11 @@ from django.core.management import BaseCommand
 from mode_groothandel.clients.api import ApiException
 from mode_groothandel.exceptions import SynchronizationError
 from mutations.models import Mutation
-from pick_tickets.services import try_create_pick_ticket
+from pick_tickets.services import try_create_pick_ticket, try_create_or_update_pick_ticket
 from sendcloud.client.sendcloud import Sendcloud
+from uphance.backfill import BackfillEngine
 from uphance.clients.uphance import Uphance
+from uphance.services import PICK_TICKETS
 
 logger = logging.getLogger(__name__)
 
@@ -39,14 +40,17 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         """Add command line arguments."""
         parser.add_argument("pick-tickets", type=str)
-        parser.add_argument("--sleep", type=int, default=None)
-        parser.add_argument("--sleep-every", type=int, default=None)
+        parser.add_argument("--workers", type=int, default=settings.BACKFILL_WORKERS)
+        parser.add_argument("--restart", action="store_true", help="Start over instead of resuming an earlier run")
+        parser.add_argument(
+            "--force-update",
+            action="store_true",
+            help="Update pick tickets that are already synchronised instead of skipping them",
+        )
 
     def handle(self, *args, **options):
         """Execute the command."""
         pick_tickets = self.parse_pick_tickets_argument(options["pick-tickets"])
-        sleep_seconds = options["sleep"]
-        sleep_every = options["sleep_every"]
         if pick_tickets is None:
             return
 
@@ -55,21 +59,47 @@ class Command(BaseCommand):
             logger.error("Unable to set the Uphance Organisation")
             return
 
-        sendlcloud_client = Sendcloud.get_client()
-        for index, pick_ticket_id in enumerate(pick_tickets):
-            try:
-                pick_ticket = uphance_client.pick_ticket(pick_ticket_id)
-                try:
-                    try_create_pick_ticket(sendlcloud_client, pick_ticket, Mutation.TRIGGER_MANUAL)
-                    print(f"Successfully synchronized pick ticket {pick_ticket}")
-                except SynchronizationError as e:
-                    logger.error(e)
-            except ApiException as e:
-                logger.error(f"An API exception occurred while synchronizing pick ticket {pick_ticket_id}: {e}")
-            if sleep_seconds is not None:
-                if sleep_every is None:
-                    print(f"Sleeping for {sleep_seconds} seconds")
-                    time.sleep(sleep_seconds)
-                elif index != 0 and index % sleep_every == 0:
-                    print(f"Sleeping for {sleep_seconds} seconds")
-                    time.sleep(sleep_seconds)
+        sendcloud_client = Sendcloud.get_client()
+        if len(pick_tickets) == 1:
+            self.synchronize_pick_ticket(uphance_client, sendcloud_client, pick_tickets.start, options["force_update"])
+        else:
+            self.synchronize_pick_tickets(
+                pick_tickets, options["workers"], options["restart"], options["force_update"]
+            )
+
+    def _try_create_pick_ticket(self, sendcloud_client: Sendcloud, pick_ticket, update: bool):
+        """Create (or update) a pick ticket in Sendcloud."""
+        try:
+            if update:
+                try_create_or_update_pick_ticket(sendcloud_client, pick_ticket, Mutation.TRIGGER_MANUAL)
+            else:
+                try_create_pick_ticket(sendcloud_client, pick_ticket, Mutation.TRIGGER_MANUAL)
+            print(f"Successfully synchronized pick ticket {pick_ticket}")
+        except SynchronizationError as e:
+            logger.error(e)
+
+    def synchronize_pick_ticket(
+        self, uphance_client: Uphance, sendcloud_client: Sendcloud, pick_ticket_id: int, force_update: bool
+    ):
+        """Synchronize a single pick ticket, a pick ticket that is already synchronised is only updated when forced."""
+        synchronised = pick_ticket_id in PICK_TICKETS.synchronised_ids(uphance_id=pick_ticket_id)
+        if synchronised and not force_update:
+            logger.info(f"Skipped pick ticket {pick_ticket_id} because it is already synchronised")
+            return
+
+        try:
+            pick_ticket = uphance_client.pick_ticket(pick_ticket_id)
+            self._try_create_pick_ticket(sendcloud_client, pick_ticket, synchronised)
+        except ApiException as e:
+            logger.error(f"An API exception occurred while synchronizing pick ticket {pick_ticket_id}: {e}")
+
+    def synchronize_pick_tickets(self, pick_tickets: range, workers: int, restart: bool, force_update: bool):
+        """Synchronize a range of pick tickets with the backfill engine, an interrupted run is resumed."""
+        try:
+            BackfillEngine(
+                PICK_TICKETS, pick_tickets, workers=workers, restart=restart, force_update=force_update
+            ).run()
+        except (ApiException, SynchronizationError) as e:
+            logger.error(
+                f"An exception occurred while synchronizing pick tickets {pick_tickets.start}-{pick_tickets.stop}: {e}"
+            )
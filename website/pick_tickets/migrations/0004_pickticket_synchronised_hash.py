@@ -0,0 +1,18 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pick_tickets", "0003_alter_pickticket_order_id_alter_pickticket_sale_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pickticket",
+            name="synchronised_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -9,6 +9,13 @@ class PickTicket(models.Model):
     shipment_number = models.IntegerField(null=True, blank=True)
     order_id = models.IntegerField(null=True, blank=True)
     sale_id = models.IntegerField(null=True, blank=True)
+    # Fingerprint of the payload last written to Sendcloud, used to skip writes that would not change anything.
+    synchronised_hash = models.CharField(max_length=64, null=True, blank=True)
+    # Status of the latest Mutation on this object, maintained by mutations.services.record_mutation.
+    last_mutation_success = models.BooleanField(null=True, blank=True, editable=False, db_index=True)
+    last_mutation_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Whether a Mutation on this object ever succeeded, kept when its Mutations are archived.
+    ever_succeeded = models.BooleanField(default=False, editable=False, db_index=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
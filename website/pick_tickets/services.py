@@ -5,14 +5,18 @@ from typing import Optional, Tuple, List, Any
 from django.conf import settings
 
 from mode_groothandel.clients.api import ApiException
+from mode_groothandel.clients.utils import payload_fingerprint
 from mode_groothandel.exceptions import SynchronizationError
+from mode_groothandel.locks import keyed_lock
 from mutations.models import Mutation
+from mutations.services import record_mutation
 from pick_tickets.models import PickTicket
 from sendcloud.client.sendcloud import Sendcloud
 from sendcloud.client.models.shipping_method import ShippingMethod as SendcloudShippingMethod
+from sendcloud.shipping_methods import shipping_method_index
 from uphance.clients.models.pick_ticket import PickTicket as UphancePickTicket
 from uphance.constants import PICK_TICkET_STATUS_SHIPPED
-from uphance.models import Country as UphanceCountry
+from uphance.countries import country_resolver
 
 logger = logging.getLogger(__name__)
 
@@ -182,13 +186,12 @@ def setup_pick_ticket_for_synchronisation(
 
 def get_shipping_method(sendcloud_client: Sendcloud, selected_shipping_method_name: str) -> SendcloudShippingMethod:
     try:
-        shipping_methods = sendcloud_client.get_shipping_methods()
+        shipping_method = shipping_method_index.get(sendcloud_client, selected_shipping_method_name)
     except ApiException as e:
         raise SynchronizationError(f"An error occurred while retrieving the shipping methods from Sendcloud: {e}")
 
-    for shipping_method in shipping_methods:
-        if shipping_method.name == selected_shipping_method_name:
-            return shipping_method
+    if shipping_method is not None:
+        return shipping_method
 
     raise SynchronizationError(
         f"Shipping method '{selected_shipping_method_name}' could not be found in the shipping methods retrieved from "
@@ -196,162 +199,207 @@ def get_shipping_method(sendcloud_client: Sendcloud, selected_shipping_method_na
     )
 
 
-def try_delete_pick_ticket(sendcloud_client: Sendcloud, pick_ticket_id: int, trigger: int) -> None:
-    try:
-        pick_ticket_in_database = PickTicket.objects.get(uphance_id=pick_ticket_id)
-    except PickTicket.DoesNotExist:
-        pick_ticket_in_database = PickTicket.objects.create(
-            uphance_id=pick_ticket_id,
-        )
-
-    if pick_ticket_in_database.sendcloud_id is None:
-        Mutation.objects.create(
-            method=Mutation.METHOD_DELETE,
-            trigger=trigger,
-            on=pick_ticket_in_database,
-            success=False,
-            message=f"Unable to delete pick ticket {pick_ticket_id} because no Sendcloud ID was found in the database",
-        )
-
-    try:
-        sendcloud_client.cancel_parcel(pick_ticket_in_database.sendcloud_id)
-        Mutation.objects.create(
-            method=Mutation.METHOD_DELETE,
-            trigger=trigger,
-            on=pick_ticket_in_database,
-            success=True,
-            message=None,
-        )
-    except ApiException as e:
-        Mutation.objects.create(
-            method=Mutation.METHOD_DELETE,
-            trigger=trigger,
-            on=pick_ticket_in_database,
-            success=False,
-            message=f"An API error occurred while deleting pick ticket {pick_ticket_id}: {e}",
-        )
-
-
-def try_update_pick_ticket(sendcloud_client: Sendcloud, pick_ticket: UphancePickTicket, trigger: int) -> None:
-    pick_ticket_in_database = get_or_create_pick_ticket_in_database(pick_ticket)
-
-    pick_ticket_in_database.shipment_number = pick_ticket.shipment_number
-    pick_ticket_in_database.order_id = pick_ticket.order_id
-    pick_ticket_in_database.sale_id = pick_ticket.sale_id
-    pick_ticket_in_database.save()
-
-    if pick_ticket_in_database.sendcloud_id is None:
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=pick_ticket_in_database,
-            success=False,
-            message=f"Unable to update pick ticket {pick_ticket.id} because no Sendcloud ID was found in the database",
-        )
-        return
-
-    country, _ = UphanceCountry.objects.get_or_create(country_code=pick_ticket.address.country)
-    if country.mapped_shipping_method_for_pick_tickets is not None:
-        shipping_method_name = country.mapped_shipping_method_for_pick_tickets.name
-    else:
-        shipping_method_name = settings.SENDCLOUD_DEFAULT_SHIPPING_METHOD
+def try_delete_pick_ticket(sendcloud_client: Sendcloud, pick_ticket_id: int, trigger: int) -> Optional[Exception]:
+    with keyed_lock(f"pick_ticket:{pick_ticket_id}"):
+        try:
+            pick_ticket_in_database = PickTicket.objects.get(uphance_id=pick_ticket_id)
+        except PickTicket.DoesNotExist:
+            pick_ticket_in_database = PickTicket.objects.create(
+                uphance_id=pick_ticket_id,
+            )
 
-    if shipping_method_name is None:
-        raise SynchronizationError(
-            f"No default shipping method indicated in Django settings and no shipping method specified for country "
-            f"{country.country_code}"
-        )
+        if pick_ticket_in_database.sendcloud_id is None:
+            error = SynchronizationError(
+                f"Unable to delete pick ticket {pick_ticket_id} because no Sendcloud ID was found in the database"
+            )
+            record_mutation(
+                method=Mutation.METHOD_DELETE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=False,
+                message=str(error),
+            )
+            return error
 
-    try:
-        shipping_method = get_shipping_method(sendcloud_client, shipping_method_name)
-        pick_ticket_converted = setup_pick_ticket_for_synchronisation(pick_ticket, shipping_method)
         try:
-            pick_ticket_converted["parcel"]["id"] = pick_ticket_in_database.sendcloud_id
-            sendcloud_client.update_parcel(pick_ticket_converted)
+            sendcloud_client.cancel_parcel(pick_ticket_in_database.sendcloud_id)
+            record_mutation(
+                method=Mutation.METHOD_DELETE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=True,
+                message=None,
+            )
         except ApiException as e:
-            raise SynchronizationError(
-                f"An error occurred while updating a parcel for pick ticket {pick_ticket.id} to Sendcloud: {e}"
+            record_mutation(
+                method=Mutation.METHOD_DELETE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=False,
+                message=f"An API error occurred while deleting pick ticket {pick_ticket_id}: {e}",
             )
-        logger.info(f"Successfully updated pick ticket {pick_ticket.id}")
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=pick_ticket_in_database,
-            success=True,
-            message=None,
-        )
-    except SynchronizationError as e:
-        logger.error(f"A Synchronization error occurred while updating pick ticket {pick_ticket.id}: {e}")
-        Mutation.objects.create(
-            method=Mutation.METHOD_UPDATE,
-            trigger=trigger,
-            on=pick_ticket_in_database,
-            success=False,
-            message=f"A Synchronization error occurred while updating pick ticket {pick_ticket.id}: {e}",
-        )
-
-
-def try_create_pick_ticket(sendcloud_client: Sendcloud, pick_ticket: UphancePickTicket, trigger: int) -> None:
-    pick_ticket_in_database = get_or_create_pick_ticket_in_database(pick_ticket)
-
-    if pick_ticket.status != PICK_TICkET_STATUS_SHIPPED:
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=pick_ticket_in_database,
-            success=False,
-            message=f"Ignored creation of pick ticket because status is {pick_ticket.status}",
-        )
-        return
-
-    country, _ = UphanceCountry.objects.get_or_create(country_code=pick_ticket.address.country)
-    if country.mapped_shipping_method_for_pick_tickets is not None:
-        shipping_method_name = country.mapped_shipping_method_for_pick_tickets.name
-    else:
-        shipping_method_name = settings.SENDCLOUD_DEFAULT_SHIPPING_METHOD
+            return e
 
-    if shipping_method_name is None:
-        raise SynchronizationError(
-            f"No default shipping method indicated in Django settings and no shipping method specified for country "
-            f"{country.country_code}"
-        )
 
-    try:
-        shipping_method = get_shipping_method(sendcloud_client, shipping_method_name)
-        pick_ticket_converted = setup_pick_ticket_for_synchronisation(pick_ticket, shipping_method)
+def try_update_pick_ticket(
+    sendcloud_client: Sendcloud, pick_ticket: UphancePickTicket, trigger: int
+) -> Optional[Exception]:
+    with keyed_lock(f"pick_ticket:{pick_ticket.id}"):
+        pick_ticket_in_database = get_or_create_pick_ticket_in_database(pick_ticket)
+
+        pick_ticket_in_database.shipment_number = pick_ticket.shipment_number
+        pick_ticket_in_database.order_id = pick_ticket.order_id
+        pick_ticket_in_database.sale_id = pick_ticket.sale_id
+        pick_ticket_in_database.save()
+
+        if pick_ticket_in_database.sendcloud_id is None:
+            error = SynchronizationError(
+                f"Unable to update pick ticket {pick_ticket.id} because no Sendcloud ID was found in the database"
+            )
+            record_mutation(
+                method=Mutation.METHOD_UPDATE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=False,
+                message=str(error),
+            )
+            return error
+
+        country = country_resolver.get_country(pick_ticket.address.country)
+        if country.shipping_method_name is not None:
+            shipping_method_name = country.shipping_method_name
+        else:
+            shipping_method_name = settings.SENDCLOUD_DEFAULT_SHIPPING_METHOD
+
+        if shipping_method_name is None:
+            raise SynchronizationError(
+                f"No default shipping method indicated in Django settings and no shipping method specified for "
+                f"country {country.country_code}"
+            )
+
         try:
-            parcel = sendcloud_client.create_parcel(pick_ticket_converted)
-        except ApiException as e:
+            shipping_method = get_shipping_method(sendcloud_client, shipping_method_name)
+            pick_ticket_converted = setup_pick_ticket_for_synchronisation(pick_ticket, shipping_method)
+            pick_ticket_hash = payload_fingerprint(pick_ticket_converted)
+            if pick_ticket_hash == pick_ticket_in_database.synchronised_hash:
+                logger.info(f"Skipped updating pick ticket {pick_ticket.id} because it did not change")
+                record_mutation(
+                    method=Mutation.METHOD_UPDATE,
+                    trigger=trigger,
+                    on=pick_ticket_in_database,
+                    success=True,
+                    message="Skipped update because the pick ticket did not change since the last synchronisation.",
+                )
+                return
+
+            try:
+                pick_ticket_converted["parcel"]["id"] = pick_ticket_in_database.sendcloud_id
+                sendcloud_client.update_parcel(pick_ticket_converted)
+            except ApiException as e:
+                raise SynchronizationError(
+                    f"An error occurred while updating a parcel for pick ticket {pick_ticket.id} to Sendcloud: {e}"
+                )
+            logger.info(f"Successfully updated pick ticket {pick_ticket.id}")
+            pick_ticket_in_database.synchronised_hash = pick_ticket_hash
+            pick_ticket_in_database.save()
+            record_mutation(
+                method=Mutation.METHOD_UPDATE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=True,
+                message=None,
+            )
+        except SynchronizationError as e:
+            logger.error(f"A Synchronization error occurred while updating pick ticket {pick_ticket.id}: {e}")
+            record_mutation(
+                method=Mutation.METHOD_UPDATE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=False,
+                message=f"A Synchronization error occurred while updating pick ticket {pick_ticket.id}: {e}",
+            )
+            return e
+
+
+def try_create_pick_ticket(
+    sendcloud_client: Sendcloud, pick_ticket: UphancePickTicket, trigger: int
+) -> Optional[Exception]:
+    with keyed_lock(f"pick_ticket:{pick_ticket.id}"):
+        pick_ticket_in_database = get_or_create_pick_ticket_in_database(pick_ticket)
+        if pick_ticket_in_database.sendcloud_id is not None:
+            # A concurrent (or earlier) synchronisation already created the pick ticket.
+            logger.info(f"Skipped creating pick ticket {pick_ticket.id} because it is already synchronised")
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=True,
+                message="Skipped creation because the pick ticket was already synchronised.",
+            )
+            return
+
+        if pick_ticket.status != PICK_TICkET_STATUS_SHIPPED:
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=False,
+                message=f"Ignored creation of pick ticket because status is {pick_ticket.status}",
+            )
+            # Not an error, the pick ticket is created by a later update when it is shipped.
+            return None
+
+        country = country_resolver.get_country(pick_ticket.address.country)
+        if country.shipping_method_name is not None:
+            shipping_method_name = country.shipping_method_name
+        else:
+            shipping_method_name = settings.SENDCLOUD_DEFAULT_SHIPPING_METHOD
+
+        if shipping_method_name is None:
             raise SynchronizationError(
-                f"An error occurred while adding a parcel for pick ticket {pick_ticket.id} to Sendcloud: {e}"
+                f"No default shipping method indicated in Django settings and no shipping method specified for "
+                f"country {country.country_code}"
             )
-        logger.info(f"Successfully synchronized pick ticket {pick_ticket.id}")
-        pick_ticket_in_database.sendcloud_id = parcel["parcel"]["id"]
-        pick_ticket_in_database.save()
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=pick_ticket_in_database,
-            success=True,
-            message=None,
-        )
-    except SynchronizationError as e:
-        logger.error(f"A Synchronization error occurred for pick ticket {pick_ticket.id}: {e}")
-        Mutation.objects.create(
-            method=Mutation.METHOD_CREATE,
-            trigger=trigger,
-            on=pick_ticket_in_database,
-            success=False,
-            message=f"A Synchronization error occurred for pick ticket {pick_ticket.id}: {e}",
-        )
+
+        try:
+            shipping_method = get_shipping_method(sendcloud_client, shipping_method_name)
+            pick_ticket_converted = setup_pick_ticket_for_synchronisation(pick_ticket, shipping_method)
+            try:
+                parcel = sendcloud_client.create_parcel(pick_ticket_converted)
+            except ApiException as e:
+                raise SynchronizationError(
+                    f"An error occurred while adding a parcel for pick ticket {pick_ticket.id} to Sendcloud: {e}"
+                )
+            logger.info(f"Successfully synchronized pick ticket {pick_ticket.id}")
+            pick_ticket_in_database.sendcloud_id = parcel["parcel"]["id"]
+            pick_ticket_in_database.synchronised_hash = payload_fingerprint(pick_ticket_converted)
+            pick_ticket_in_database.save()
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=True,
+                message=None,
+            )
+        except SynchronizationError as e:
+            logger.error(f"A Synchronization error occurred for pick ticket {pick_ticket.id}: {e}")
+            record_mutation(
+                method=Mutation.METHOD_CREATE,
+                trigger=trigger,
+                on=pick_ticket_in_database,
+                success=False,
+                message=f"A Synchronization error occurred for pick ticket {pick_ticket.id}: {e}",
+            )
+            return e
 
 
 def try_create_or_update_pick_ticket(
     sendcloud_client: Sendcloud, pick_ticket: UphancePickTicket, trigger: int
-) -> None:
-    pick_ticket_in_database = get_or_create_pick_ticket_in_database(pick_ticket)
-
-    if pick_ticket_in_database.sendcloud_id is None:
-        return try_create_pick_ticket(sendcloud_client, pick_ticket, trigger)
-    else:
-        return try_update_pick_ticket(sendcloud_client, pick_ticket, trigger)
+) -> Optional[Exception]:
+    with keyed_lock(f"pick_ticket:{pick_ticket.id}"):
+        pick_ticket_in_database = get_or_create_pick_ticket_in_database(pick_ticket)
+
+        if pick_ticket_in_database.sendcloud_id is None:
+            return try_create_pick_ticket(sendcloud_client, pick_ticket, trigger)
+        else:
+            return try_update_pick_ticket(sendcloud_client, pick_ticket, trigger)
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from uphance.services import poll_documents, PICK_TICKETS
+
+
+@shared_task
+def synchronize_pick_tickets():
+    """Synchronize all pick tickets."""
+    poll_documents(PICK_TICKETS)
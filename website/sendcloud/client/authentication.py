@@ -13,8 +13,9 @@ class SendcloudAuthClient(AuthClient):
         """Initialize Authentication Client."""
         self.public_key = public_key
         self.private_key = private_key
+        # Sendcloud uses Basic authentication which does not expire, so the credentials are only encoded once.
+        self._access_token = base64.b64encode(bytes(f"{self.public_key}:{self.private_key}", "utf-8")).decode("utf-8")
 
     def get_access_token(self) -> str:
         """Retrieve the access token as header information."""
-        b = base64.b64encode(bytes(f"{self.public_key}:{self.private_key}", "utf-8"))  # bytes
-        return b.decode("utf-8")
+        return self._access_token
@@ -4,6 +4,8 @@ from typing import List, Any
 from django.conf import settings
 
 from mode_groothandel.clients.api import ApiClient
+from mode_groothandel.clients.rate_limit import get_rate_limiter
+from mode_groothandel.clients.registry import client_registry
 from sendcloud.client.authentication import SendcloudAuthClient
 from sendcloud.client.models.shipping_method import ShippingMethod
 
@@ -15,13 +17,27 @@ class Sendcloud(ApiClient):
 
     @staticmethod
     def get_client() -> "Sendcloud":
+        """Get the Sendcloud client of this process."""
+        return client_registry.get_or_create("sendcloud", Sendcloud._create_client)
+
+    @staticmethod
+    def _create_client() -> "Sendcloud":
         """Create a Sendcloud client from Django settings."""
         sendcloud_public_key = settings.SENDCLOUD_PUBLIC_KEY
         sendcloud_private_key = settings.SENDCLOUD_PRIVATE_KEY
 
         sendcloud_auth_client = SendcloudAuthClient(sendcloud_public_key, sendcloud_private_key)
 
-        return Sendcloud("https://panel.sendcloud.sc/api/v2/", auth_manager=sendcloud_auth_client)
+        return Sendcloud(
+            "https://panel.sendcloud.sc/api/v2/",
+            auth_manager=sendcloud_auth_client,
+            pool_connections=settings.SENDCLOUD_POOL_CONNECTIONS,
+            pool_maxsize=settings.SENDCLOUD_POOL_MAXSIZE,
+            rate_limiter=get_rate_limiter(
+                "panel.sendcloud.sc", settings.SENDCLOUD_RATE_LIMIT, settings.SENDCLOUD_RATE_LIMIT_BURST
+            ),
+            rate_limit_retries=settings.RATE_LIMIT_RETRIES,
+        )
 
     def _auth_headers(self):
         """Retrieve the authentication headers."""
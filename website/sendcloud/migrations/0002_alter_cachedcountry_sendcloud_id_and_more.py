@@ -0,0 +1,23 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sendcloud", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cachedcountry",
+            name="sendcloud_id",
+            field=models.PositiveIntegerField(unique=True),
+        ),
+        migrations.AlterField(
+            model_name="cachedshippingmethod",
+            name="sendcloud_id",
+            field=models.PositiveIntegerField(unique=True),
+        ),
+    ]
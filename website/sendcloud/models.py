@@ -4,7 +4,7 @@ from django.db import models
 class CachedCountry(models.Model):
     """Available countries in Sendcloud."""
 
-    sendcloud_id = models.PositiveIntegerField()
+    sendcloud_id = models.PositiveIntegerField(unique=True)
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     iso_2 = models.CharField(max_length=2)
@@ -18,7 +18,7 @@ class CachedCountry(models.Model):
 class CachedShippingMethod(models.Model):
     """Available shipping methods in Sendcloud."""
 
-    sendcloud_id = models.PositiveIntegerField()
+    sendcloud_id = models.PositiveIntegerField(unique=True)
     name = models.CharField(max_length=255)
     carrier = models.CharField(max_length=255)
     min_weight = models.DecimalField(max_digits=10, decimal_places=3)
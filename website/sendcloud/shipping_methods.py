@@ -0,0 +1,74 @@
+import logging
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from mode_groothandel.snapshots import Snapshot
+from sendcloud.client.models.country import Country
+from sendcloud.client.models.shipping_method import ShippingMethod
+from sendcloud.client.sendcloud import Sendcloud
+from sendcloud.models import CachedShippingMethod
+
+logger = logging.getLogger(__name__)
+
+
+class ShippingMethodIndex:
+    """
+    Index of the Sendcloud shipping methods by name.
+
+    The index is built from CachedShippingMethod and CachedCountry and kept in memory per process. It is reloaded when
+    the shipping methods are refreshed or after REFERENCE_DATA_SNAPSHOT_TTL seconds. Only when a name can not be found
+    in the index, the shipping methods are retrieved from Sendcloud.
+    """
+
+    def __init__(self):
+        """Initialize a Shipping Method Index."""
+        self._snapshot = Snapshot("sendcloud-shipping-methods", self._load, ttl=settings.REFERENCE_DATA_SNAPSHOT_TTL)
+
+    @staticmethod
+    def _load() -> Dict[str, ShippingMethod]:
+        """Load the cached shipping methods by name, the first shipping method wins when names are not unique."""
+        shipping_methods = dict()
+        for cached_shipping_method in CachedShippingMethod.objects.prefetch_related("countries").order_by("id"):
+            shipping_methods.setdefault(
+                cached_shipping_method.name,
+                ShippingMethod(
+                    _id=cached_shipping_method.sendcloud_id,
+                    name=cached_shipping_method.name,
+                    carrier=cached_shipping_method.carrier,
+                    min_weight=float(cached_shipping_method.min_weight),
+                    max_weight=float(cached_shipping_method.max_weight),
+                    service_point_input=cached_shipping_method.service_point_input,
+                    price=float(cached_shipping_method.price),
+                    countries=[
+                        Country(
+                            _id=country.sendcloud_id,
+                            name=country.name,
+                            price=float(country.price),
+                            iso_2=country.iso_2,
+                            iso_3=country.iso_3,
+                        )
+                        for country in cached_shipping_method.countries.all()
+                    ],
+                ),
+            )
+        return shipping_methods
+
+    def get(self, sendcloud_client: Sendcloud, name: str) -> Optional[ShippingMethod]:
+        """Get a shipping method by name, retrieves the shipping methods from Sendcloud on a miss."""
+        shipping_method = self._snapshot.get().get(name, None)
+        if shipping_method is not None:
+            return shipping_method
+
+        logger.info("Shipping method '%s' is not cached, retrieving the shipping methods from Sendcloud", name)
+        for shipping_method in sendcloud_client.get_shipping_methods():
+            if shipping_method.name == name:
+                return shipping_method
+        return None
+
+    def invalidate(self) -> None:
+        """Invalidate the index in all processes."""
+        self._snapshot.invalidate()
+
+
+shipping_method_index = ShippingMethodIndex()
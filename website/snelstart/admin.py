@@ -1,9 +1,15 @@
 from django.contrib import admin
 
-from snelstart.models import CachedLand
+from snelstart.models import CachedLand, CachedRelatie
 
 
 @admin.register(CachedLand)
 class CachedLandAdmin(admin.ModelAdmin):
     search_fields = ("naam", "landcode", "landcode_iso")
     list_display = ("naam", "landcode")
+
+
+@admin.register(CachedRelatie)
+class CachedRelatieAdmin(admin.ModelAdmin):
+    search_fields = ("naam", "btw_nummer", "snelstart_id")
+    list_display = ("naam", "btw_nummer", "modified_on")
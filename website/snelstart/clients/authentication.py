@@ -1,26 +1,21 @@
 import logging
-import time
 from typing import Optional
 
 import requests
 
-from mode_groothandel.clients.authentication import AuthClient
-from mode_groothandel.clients.cache.cache import CacheFileHandler
+from mode_groothandel.clients.authentication import TokenAuthClient
+from mode_groothandel.clients.cache.cache import CacheHandler
 
 logger = logging.getLogger(__name__)
 
 
-class SnelstartAuthClient(AuthClient):
+class SnelstartAuthClient(TokenAuthClient):
 
     TOKEN_URL = "https://auth.snelstart.nl/b2b/token"
 
-    def __init__(self, client_key: str, cache: Optional[CacheFileHandler] = None):
+    def __init__(self, client_key: str, cache: Optional[CacheHandler] = None):
         self.client_key = client_key
-
-        if cache is not None:
-            self.cache = cache
-        else:
-            self.cache = CacheFileHandler()
+        super().__init__(cache=cache)
 
         self._session = requests.Session()
 
@@ -32,7 +27,7 @@ class SnelstartAuthClient(AuthClient):
         body = f"grant_type=clientkey&clientkey={self.client_key}"
 
         try:
-            response = self._session.post(self.TOKEN_URL, headers=headers, data=body)
+            response = self._session.post(self.TOKEN_URL, headers=headers, data=body, timeout=self.requests_timeout)
             response.raise_for_status()
         except requests.exceptions.HTTPError as http_error:
             response = http_error.response
@@ -66,29 +61,3 @@ class SnelstartAuthClient(AuthClient):
                 response.text,
             )
             return None
-
-    @staticmethod
-    def token_is_valid(token: dict) -> bool:
-        if "expires_at" not in token.keys():
-            return False
-
-        now = int(time.time())
-        return token["expires_at"] - now > 60
-
-    @staticmethod
-    def _add_custom_values_to_token(token: dict) -> dict:
-        token["expires_at"] = int(time.time()) + token["expires_in"]
-        return token
-
-    def get_access_token(self) -> Optional[dict]:
-        cached_token = self.cache.get_cached_token()
-        if cached_token is not None and self.token_is_valid(cached_token):
-            return cached_token["access_token"]
-        else:
-            new_token = self.request_access_token()
-            if new_token is not None:
-                new_token = self._add_custom_values_to_token(new_token)
-                self.cache.save_token_to_cache(new_token)
-                return new_token["access_token"]
-            else:
-                return None
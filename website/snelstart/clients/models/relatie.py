@@ -1,16 +1,28 @@
+from datetime import datetime
 from typing import Optional
 
+from dateutil import parser
+
 from mode_groothandel.clients.utils import get_value_or_error, get_value_or_none
 
 
 class Relatie:
 
-    def __init__(self, _id: str, naam: str, email: Optional[str], telefoon: Optional[str], btw_nummer: Optional[str]):
+    def __init__(
+        self,
+        _id: str,
+        naam: str,
+        email: Optional[str],
+        telefoon: Optional[str],
+        btw_nummer: Optional[str],
+        modified_on: Optional[datetime] = None,
+    ):
         self.id = _id
         self.naam = naam
         self.email = email
         self.telefoon = telefoon
         self.btw_nummer = btw_nummer
+        self.modified_on = modified_on
 
     @staticmethod
     def from_data(data: dict) -> "Relatie":
@@ -20,4 +32,5 @@ class Relatie:
             email=get_value_or_none(data, "email", str),
             telefoon=get_value_or_none(data, "telefoon", str),
             btw_nummer=get_value_or_none(data, "btwNummer", str),
+            modified_on=get_value_or_none(data, "modifiedOn", lambda x: parser.parse(str(x))),
         )
@@ -4,7 +4,9 @@ from typing import Optional, Any, List
 from django.conf import settings
 
 from mode_groothandel.clients.api import ApiClient
-from mode_groothandel.clients.cache.cache import CacheFileHandler
+from mode_groothandel.clients.cache.cache import get_token_cache_handler
+from mode_groothandel.clients.rate_limit import get_rate_limiter
+from mode_groothandel.clients.registry import client_registry
 from snelstart.clients.authentication import SnelstartAuthClient
 from snelstart.clients.models.btw_tarief import BtwTarief
 from snelstart.clients.models.grootboek import Grootboek
@@ -23,17 +25,29 @@ class Snelstart(ApiClient):
 
     @staticmethod
     def get_client() -> "Snelstart":
+        return client_registry.get_or_create("snelstart", Snelstart._create_client)
+
+    @staticmethod
+    def _create_client() -> "Snelstart":
         snelstart_client_key = settings.SNELSTART_CLIENT_KEY
         snelstart_subscription_key = settings.SNELSTART_SUBSCRIPTION_KEY
 
         cache_path = settings.SNELSTART_CACHE_PATH
 
         snelstart_auth_client = SnelstartAuthClient(
-            snelstart_client_key, cache=CacheFileHandler(cache_path=cache_path)
+            snelstart_client_key, cache=get_token_cache_handler("snelstart", cache_path=cache_path)
         )
 
         return Snelstart(
-            snelstart_subscription_key, "https://b2bapi.snelstart.nl/v2/", auth_manager=snelstart_auth_client
+            snelstart_subscription_key,
+            "https://b2bapi.snelstart.nl/v2/",
+            auth_manager=snelstart_auth_client,
+            pool_connections=settings.SNELSTART_POOL_CONNECTIONS,
+            pool_maxsize=settings.SNELSTART_POOL_MAXSIZE,
+            rate_limiter=get_rate_limiter(
+                "b2bapi.snelstart.nl", settings.SNELSTART_RATE_LIMIT, settings.SNELSTART_RATE_LIMIT_BURST
+            ),
+            rate_limit_retries=settings.RATE_LIMIT_RETRIES,
         )
 
     @property
@@ -0,0 +1,21 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from snelstart.services import refresh_cached_relaties
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Refresh Cached Relaties."""
+
+    def add_arguments(self, parser):
+        """Add command line arguments."""
+        parser.add_argument("--full", action="store_true", help="Retrieve all relaties instead of the modified ones")
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        created, updated, deleted = refresh_cached_relaties(full=options["full"])
+
+        print(f"Cached relaties refreshed\nCreated: {created}\nUpdated: {updated}\nDeleted: {deleted}")
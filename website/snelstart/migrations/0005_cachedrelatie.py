@@ -0,0 +1,26 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("snelstart", "0004_delete_taxmapping"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedRelatie",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("snelstart_id", models.UUIDField(unique=True)),
+                ("naam", models.CharField(max_length=200)),
+                ("normalized_naam", models.CharField(db_index=True, max_length=200)),
+                ("btw_nummer", models.CharField(blank=True, db_index=True, max_length=100, null=True)),
+                ("email", models.CharField(blank=True, max_length=200, null=True)),
+                ("telefoon", models.CharField(blank=True, max_length=100, null=True)),
+                ("modified_on", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("snelstart", "0005_cachedrelatie"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cachedland",
+            name="landcode",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
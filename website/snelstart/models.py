@@ -34,10 +34,26 @@ class CachedLand(models.Model):
 
     naam = models.CharField(max_length=100)
     landcode_iso = models.CharField(max_length=100, null=True, blank=True)
-    landcode = models.CharField(max_length=100)
+    landcode = models.CharField(max_length=100, db_index=True)
     snelstart_id = models.UUIDField(unique=True)
     uri = models.CharField(max_length=200)
 
     def __str__(self):
         """Convert this object to string."""
         return self.naam
+
+
+class CachedRelatie(models.Model):
+
+    snelstart_id = models.UUIDField(unique=True)
+    naam = models.CharField(max_length=200)
+    # Lowercase name with collapsed whitespace, used for matching Uphance customers to relaties.
+    normalized_naam = models.CharField(max_length=200, db_index=True)
+    btw_nummer = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    email = models.CharField(max_length=200, null=True, blank=True)
+    telefoon = models.CharField(max_length=100, null=True, blank=True)
+    modified_on = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        """Convert this object to string."""
+        return self.naam
@@ -1,8 +1,17 @@
+import logging
+import re
+from typing import Optional
+
 import pytz
 from django.conf import settings
+from django.db.models import Max
 
+from mode_groothandel.reconciliation import reconcile
+from snelstart.clients.models.relatie import Relatie
 from snelstart.clients.snelstart import Snelstart
-from snelstart.models import CachedGrootboek, CachedBtwTarief, CachedLand
+from snelstart.models import CachedGrootboek, CachedBtwTarief, CachedLand, CachedRelatie
+
+logger = logging.getLogger(__name__)
 
 
 def refresh_cached_grootboeken() -> (int, int, int):
@@ -12,48 +21,26 @@ def refresh_cached_grootboeken() -> (int, int, int):
 
     grootboeken = snelstart.get_grootboeken()
 
-    grootboeken_created, grootboeken_updated = list(), list()
-
-    for grootboek in grootboeken:
-        try:
-            cached_grootboek = CachedGrootboek.objects.get(snelstart_id=grootboek.id)
-            cached_grootboek.modified_on = timezone.localize(grootboek.modified_on)
-            cached_grootboek.omschrijving = grootboek.omschrijving
-            cached_grootboek.kostenplaats_verplicht = grootboek.kostenplaats_verplicht
-            cached_grootboek.rekening_code = grootboek.rekening_code
-            cached_grootboek.nonactief = grootboek.nonactief
-            cached_grootboek.nummer = grootboek.nummer
-            cached_grootboek.grootboekfunctie = grootboek.grootboekfunctie
-            cached_grootboek.vat_rate_code = grootboek.vat_rate_code
-            cached_grootboek.uri = grootboek.uri
-            cached_grootboek.save()
-            grootboeken_updated.append(cached_grootboek)
-        except CachedGrootboek.DoesNotExist:
-            created_grootboek = CachedGrootboek.objects.create(
-                modified_on=timezone.localize(grootboek.modified_on),
-                omschrijving=grootboek.omschrijving,
-                kostenplaats_verplicht=grootboek.kostenplaats_verplicht,
-                rekening_code=grootboek.rekening_code,
-                nonactief=grootboek.nonactief,
-                nummer=grootboek.nummer,
-                grootboekfunctie=grootboek.grootboekfunctie,
-                grootboek_rubriek=grootboek.grootboek_rubriek,
-                vat_rate_code=grootboek.vat_rate_code,
-                snelstart_id=grootboek.id,
-                uri=grootboek.uri,
-            )
-            grootboeken_created.append(created_grootboek)
-
-    # Remove all non-updated grootboeken
-    created_grootboeken_ids = [x.id for x in grootboeken_created]
-    updated_grootboeken_ids = [x.id for x in grootboeken_updated]
-
-    all_ids = created_grootboeken_ids + updated_grootboeken_ids
-
-    grootboeken_untouched = CachedGrootboek.objects.exclude(id__in=all_ids)
-    grootboeken_deleted_count, _ = grootboeken_untouched.delete()
-
-    return len(grootboeken_created), len(grootboeken_updated), grootboeken_deleted_count
+    return reconcile(
+        CachedGrootboek,
+        ["snelstart_id"],
+        (
+            {
+                "modified_on": timezone.localize(grootboek.modified_on),
+                "omschrijving": grootboek.omschrijving,
+                "kostenplaats_verplicht": grootboek.kostenplaats_verplicht,
+                "rekening_code": grootboek.rekening_code,
+                "nonactief": grootboek.nonactief,
+                "nummer": grootboek.nummer,
+                "grootboekfunctie": grootboek.grootboekfunctie,
+                "grootboek_rubriek": grootboek.grootboek_rubriek,
+                "vat_rate_code": grootboek.vat_rate_code,
+                "snelstart_id": grootboek.id,
+                "uri": grootboek.uri,
+            }
+            for grootboek in grootboeken
+        ),
+    ).as_tuple()
 
 
 def refresh_cached_tax_types() -> (int, int, int):
@@ -63,36 +50,19 @@ def refresh_cached_tax_types() -> (int, int, int):
 
     tax_types = snelstart.get_btwtarieven()
 
-    tax_types_created, tax_types_updated = list(), list()
-
-    for tax_type in tax_types:
-        try:
-            cached_tax_type = CachedBtwTarief.objects.get(
-                btw_soort=tax_type.btw_soort, datum_vanaf=timezone.localize(tax_type.datum_vanaf)
-            )
-            cached_tax_type.btw_percentage = tax_type.btw_percentage
-            cached_tax_type.datum_tot_en_met = timezone.localize(tax_type.datum_tot_en_met)
-            cached_tax_type.save()
-            tax_types_updated.append(cached_tax_type)
-        except CachedBtwTarief.DoesNotExist:
-            created_tax_type = CachedBtwTarief.objects.create(
-                btw_soort=tax_type.btw_soort,
-                btw_percentage=tax_type.btw_percentage,
-                datum_vanaf=timezone.localize(tax_type.datum_vanaf),
-                datum_tot_en_met=timezone.localize(tax_type.datum_tot_en_met),
-            )
-            tax_types_created.append(created_tax_type)
-
-    # Remove all non-updated tax types
-    created_tax_type_ids = [x.id for x in tax_types_created]
-    updated_tax_type_ids = [x.id for x in tax_types_updated]
-
-    all_ids = created_tax_type_ids + updated_tax_type_ids
-
-    tax_types_untouched = CachedBtwTarief.objects.exclude(id__in=all_ids)
-    grootboeken_deleted_count, _ = tax_types_untouched.delete()
-
-    return len(tax_types_created), len(tax_types_updated), grootboeken_deleted_count
+    return reconcile(
+        CachedBtwTarief,
+        ["btw_soort", "datum_vanaf"],
+        (
+            {
+                "btw_soort": tax_type.btw_soort,
+                "btw_percentage": tax_type.btw_percentage,
+                "datum_vanaf": timezone.localize(tax_type.datum_vanaf),
+                "datum_tot_en_met": timezone.localize(tax_type.datum_tot_en_met),
+            }
+            for tax_type in tax_types
+        ),
+    ).as_tuple()
 
 
 def refresh_landen() -> (int, int, int):
@@ -100,34 +70,91 @@ def refresh_landen() -> (int, int, int):
 
     landen = snelstart.get_landen()
 
-    landen_created, landen_updated = list(), list()
-
-    for land in landen:
-        try:
-            cached_land = CachedLand.objects.get(snelstart_id=land.id)
-            cached_land.naam = land.naam
-            cached_land.landcode_iso = land.landcode_iso
-            cached_land.landcode = land.landcode
-            cached_land.uri = land.uri
-            cached_land.save()
-            landen_updated.append(cached_land)
-        except CachedLand.DoesNotExist:
-            created_land = CachedLand.objects.create(
-                naam=land.naam,
-                landcode_iso=land.landcode_iso,
-                landcode=land.landcode,
-                snelstart_id=land.id,
-                uri=land.uri,
-            )
-            landen_created.append(created_land)
-
-    # Remove all non-updated tax types
-    created_landen_ids = [x.id for x in landen_created]
-    updated_landen_ids = [x.id for x in landen_updated]
-
-    all_ids = created_landen_ids + updated_landen_ids
-
-    landen_untouched = CachedLand.objects.exclude(id__in=all_ids)
-    landen_deleted_count, _ = landen_untouched.delete()
-
-    return len(landen_created), len(landen_updated), landen_deleted_count
+    return reconcile(
+        CachedLand,
+        ["snelstart_id"],
+        (
+            {
+                "naam": land.naam,
+                "landcode_iso": land.landcode_iso,
+                "landcode": land.landcode,
+                "snelstart_id": land.id,
+                "uri": land.uri,
+            }
+            for land in landen
+        ),
+    ).as_tuple()
+
+
+def normalize_relatie_name(naam: str) -> str:
+    """Normalize a relatie name for matching, names are compared case-insensitive and ignoring extra whitespace."""
+    return re.sub(r"\s+", " ", naam).strip().casefold()
+
+
+def _relatie_to_row(relatie: Relatie) -> dict:
+    """Convert a relatie retrieved from Snelstart to the fields of a cached relatie."""
+    modified_on = relatie.modified_on
+    if modified_on is not None and modified_on.tzinfo is None:
+        modified_on = pytz.timezone(settings.TIME_ZONE).localize(modified_on)
+
+    return {
+        "snelstart_id": relatie.id,
+        "naam": relatie.naam,
+        "normalized_naam": normalize_relatie_name(relatie.naam),
+        "btw_nummer": relatie.btw_nummer or None,
+        "email": relatie.email,
+        "telefoon": relatie.telefoon,
+        "modified_on": modified_on,
+    }
+
+
+def cache_relatie(relatie: Relatie) -> CachedRelatie:
+    """Store a relatie retrieved from (or written to) Snelstart in the cache."""
+    row = _relatie_to_row(relatie)
+    snelstart_id = row.pop("snelstart_id")
+    cached_relatie, _ = CachedRelatie.objects.update_or_create(snelstart_id=snelstart_id, defaults=row)
+    return cached_relatie
+
+
+def refresh_cached_relaties(full: bool = False, page_size: Optional[int] = None) -> (int, int, int):
+    """
+    Refresh the cached relaties from Snelstart.
+
+    By default only the relaties modified since the last modified cached relatie are retrieved. A full refresh
+    retrieves all relaties and removes cached relaties that do not exist in Snelstart anymore.
+    """
+    snelstart = Snelstart.get_client()
+    page_size = page_size or settings.SNELSTART_RELATIES_PAGE_SIZE
+
+    _filter = None
+    if not full:
+        last_modified_on = CachedRelatie.objects.aggregate(last_modified_on=Max("modified_on"))["last_modified_on"]
+        if last_modified_on is not None:
+            last_modified_on = last_modified_on.astimezone(pytz.timezone(settings.TIME_ZONE)).replace(tzinfo=None)
+            _filter = f"ModifiedOn ge datetime'{last_modified_on.isoformat(timespec='seconds')}'"
+        else:
+            full = True
+
+    seen_ids = set()
+    relaties_created, relaties_updated = 0, 0
+
+    skip = 0
+    while True:
+        relaties = snelstart.get_relaties(skip=skip, top=page_size, _filter=_filter)
+        result = reconcile(
+            CachedRelatie, ["snelstart_id"], [_relatie_to_row(relatie) for relatie in relaties], delete_missing=False
+        )
+        relaties_created += result.created
+        relaties_updated += result.updated
+        seen_ids.update(relatie.id for relatie in relaties)
+
+        if len(relaties) < page_size:
+            break
+        skip += page_size
+
+    relaties_deleted_count = 0
+    if full:
+        relaties_deleted_count, _ = CachedRelatie.objects.exclude(snelstart_id__in=seen_ids).delete()
+
+    logger.info(f"Refreshed cached relaties ({relaties_created} created, {relaties_updated} updated)")
+    return relaties_created, relaties_updated, relaties_deleted_count
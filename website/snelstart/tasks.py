@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from snelstart.services import refresh_cached_relaties as refresh_cached_relaties_service
+
+
+@shared_task
+def refresh_cached_relaties(full: bool = False):
+    """Refresh the cached relaties from Snelstart."""
+    refresh_cached_relaties_service(full=full)
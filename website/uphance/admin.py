@@ -6,8 +6,9 @@ from django.utils.html import format_html
 from mode_groothandel.clients.api import ApiException
 from snelstart.services import refresh_cached_tax_types, refresh_cached_grootboeken
 from uphance.forms import TaxMappingAdminForm
-from uphance.models import Country, TaxMapping, ChannelMapping
+from uphance.models import Country, TaxMapping, ChannelMapping, WebhookEvent
 from uphance.services import refresh_cached_channels
+from uphance.tasks import process_webhook_event
 
 
 @admin.register(Country)
@@ -89,3 +90,26 @@ class ChannelMappingAdmin(admin.ModelAdmin):
             return super(ChannelMappingAdmin, self).changeform_view(
                 request, object_id=object_id, form_url=form_url, extra_context=extra_context
             )
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "event", "status", "attempts", "created", "processed")
+    list_filter = ("status", "event")
+    readonly_fields = ("event", "payload", "status", "attempts", "message", "created", "claimed", "processed")
+    actions = ["_requeue"]
+
+    def has_add_permission(self, request):
+        """Webhook events are only created by Uphance."""
+        return False
+
+    @admin.action(description="Process selected webhook events again")
+    def _requeue(self, request, queryset):
+        """Put webhook events back in the inbox and enqueue them."""
+        webhook_event_ids = list(queryset.exclude(status=WebhookEvent.STATUS_PROCESSING).values_list("id", flat=True))
+        WebhookEvent.objects.filter(id__in=webhook_event_ids).update(
+            status=WebhookEvent.STATUS_PENDING, attempts=0, message=None, processed=None
+        )
+        for webhook_event_id in webhook_event_ids:
+            process_webhook_event.delay(webhook_event_id)
+        self.message_user(request, f"{len(webhook_event_ids)} webhook event(s) enqueued")
@@ -4,6 +4,8 @@ from uphance.api.v1.views import (
     InvoiceCreateUpdateDeleteApiView,
     CreditNoteCreateUpdateDeleteApiView,
     PickTicketCreateUpdateDeleteApiView,
+    CustomerCreateUpdateDeleteApiView,
+    SalesOrderCreateUpdateDeleteApiView,
 )
 
 urlpatterns = [
@@ -18,4 +20,14 @@ urlpatterns = [
         PickTicketCreateUpdateDeleteApiView.as_view(),
         name="uphance_pick_ticket_create_update_destroy_view",
     ),
+    path(
+        "customers/",
+        CustomerCreateUpdateDeleteApiView.as_view(),
+        name="uphance_customer_create_update_destroy_view",
+    ),
+    path(
+        "sales_orders/",
+        SalesOrderCreateUpdateDeleteApiView.as_view(),
+        name="uphance_sales_order_create_update_destroy_view",
+    ),
 ]
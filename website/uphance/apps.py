@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UphanceConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "uphance"
+
+    def ready(self):
+        """Connect the signals of this app."""
+        from uphance import signals  # noqa: F401
@@ -0,0 +1,230 @@
+import contextvars
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import batched, takewhile
+from typing import Any, Deque, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from customers.resolution import CustomerResolutionContext
+from mode_groothandel.exceptions import SynchronizationError
+from mutations.models import Mutation
+from mutations.services import buffered_mutations
+from snelstart.clients.snelstart import Snelstart
+from uphance.clients.uphance import Uphance
+from uphance.models import BackfillCheckpoint
+from uphance.services import DocumentType
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BackfillProgress:
+    """Counters of a backfill run."""
+
+    synchronised: int = 0
+    updated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    # The IDs of the documents that failed.
+    failed_ids: List[int] = field(default_factory=list)
+
+    @property
+    def handled(self) -> int:
+        """The amount of documents handled."""
+        return self.synchronised + self.updated + self.skipped + self.failed
+
+
+class BackfillEngine:
+    """
+    Synchronise a range of Uphance documents with a bounded pool of workers.
+
+    Documents are retrieved in order and handed to the unit of work of the document type (the try_create_* service
+    functions) on a thread pool, all workers share the rate limit of the API clients. At most twice the amount of
+    workers documents are in flight at the same time. The IDs of the documents in the range that are already
+    synchronised are loaded with one query up front, these documents are skipped, or updated when force_update is set.
+
+    Progress is checkpointed in the database: the checkpoint is the highest ID up to which all documents are handled,
+    so a restarted backfill of the same range resumes after it. A document that failed (the unit of work raised, the
+    document is not synchronised after it, or the update returned an error) stops the checkpoint from advancing and the
+    range is not marked finished, the document is picked up again when the backfill is resumed. The Mutations recorded
+    by the workers are buffered and written in bulk.
+    """
+
+    # The amount of documents checked for being synchronised (and of which the customers are resolved) at once.
+    batch_size = 100
+    # The amount of seconds between progress reports.
+    report_interval = 30
+
+    def __init__(
+        self,
+        document_type: DocumentType,
+        documents: range,
+        workers: Optional[int] = None,
+        trigger: int = Mutation.TRIGGER_MANUAL,
+        restart: bool = False,
+        force_update: bool = False,
+    ):
+        """Initialize a Backfill Engine."""
+        self.document_type = document_type
+        self.documents = documents
+        self.workers = max(1, workers if workers is not None else settings.BACKFILL_WORKERS)
+        self.trigger = trigger
+        self.restart = restart
+        self.force_update = force_update
+        self.progress = BackfillProgress()
+        self._checkpoint: Optional[BackfillCheckpoint] = None
+        self._blocked = False
+        self._resumed_from = None
+        self._started_at = None
+        self._reported_at = None
+
+    def _get_checkpoint(self) -> BackfillCheckpoint:
+        """Get the checkpoint of the range, it is reset when the backfill is restarted."""
+        # An update of a range is tracked separately from the initial synchronisation of the range.
+        document_type = f"{self.document_type.name}:update" if self.force_update else self.document_type.name
+        checkpoint, _ = BackfillCheckpoint.objects.get_or_create(
+            document_type=document_type, start=self.documents.start, stop=self.documents.stop
+        )
+        if self.restart:
+            checkpoint.last_id = None
+            checkpoint.finished = None
+            checkpoint.save()
+        return checkpoint
+
+    def _advance(self, document_id: int) -> None:
+        """Advance the checkpoint to a handled document."""
+        if self._blocked:
+            return
+        self._checkpoint.last_id = document_id
+        BackfillCheckpoint.objects.filter(id=self._checkpoint.id).update(last_id=document_id, updated=timezone.now())
+
+    def _synchronise(
+        self, uphance_client: Uphance, document: Any, customer_context: CustomerResolutionContext, update: bool
+    ) -> bool:
+        """Run the unit of work for a document on a worker thread, returns whether it succeeded."""
+        try:
+            if update:
+                return self.document_type.update(uphance_client, document, self.trigger, customer_context) is None
+            # The unit of work records a failure as a Mutation, so check whether the document got synchronised.
+            self.document_type.synchronise(uphance_client, document, self.trigger, customer_context)
+            return self.document_type.is_synchronised(document.id)
+        finally:
+            # Threads get their own database connections, which are not closed by Django.
+            connections.close_all()
+
+    def _complete(self, document_id: int, future: Optional[Future], update: bool) -> None:
+        """Register a handled document, future is None when the document was skipped."""
+        if future is None:
+            self.progress.skipped += 1
+        else:
+            try:
+                succeeded = future.result()
+            except Exception as e:
+                logger.error(f"An error occurred while synchronising {self.document_type.name} {document_id}: {e}")
+                succeeded = False
+
+            if not succeeded:
+                self.progress.failed += 1
+                self.progress.failed_ids.append(document_id)
+                self._blocked = True
+            elif update:
+                self.progress.updated += 1
+            else:
+                self.progress.synchronised += 1
+        self._advance(document_id)
+        self._report()
+
+    def _drain(self, window: Deque[Tuple[int, Optional[Future], bool]], maximum_in_flight: int) -> None:
+        """Complete documents in order until at most maximum_in_flight documents are in flight."""
+        while len(window) > 0:
+            document_id, future, update = window[0]
+            if future is not None and not future.done() and len(window) <= maximum_in_flight:
+                return
+            window.popleft()
+            self._complete(document_id, future, update)
+
+    def _report(self, force: bool = False) -> None:
+        """Log the throughput and the estimated time until the backfill is finished."""
+        now = time.monotonic()
+        if not force and now - self._reported_at < self.report_interval:
+            return
+        self._reported_at = now
+
+        elapsed = max(now - self._started_at, 1e-6)
+        throughput = self.progress.handled / elapsed
+        current_id = self._checkpoint.last_id if self._checkpoint.last_id is not None else self.documents.start - 1
+        ids_done = current_id - self._resumed_from
+        ids_left = self.documents.stop - 1 - current_id
+        eta = f"{ids_left * elapsed / ids_done:.0f} seconds" if ids_done > 0 else "unknown"
+        logger.info(
+            f"Backfill of {self.document_type.name} at {current_id}: {self.progress.synchronised} synchronised, "
+            f"{self.progress.updated} updated, {self.progress.skipped} skipped, {self.progress.failed} failed "
+            f"({throughput:.2f} documents/second, ETA {eta})"
+        )
+
+    def run(self) -> BackfillProgress:
+        """Run (or resume) the backfill."""
+        self._checkpoint = self._get_checkpoint()
+        if self._checkpoint.finished is not None:
+            logger.info(f"Backfill of {self.document_type.name} {self.documents} is already finished")
+            return self.progress
+
+        since_id = self._checkpoint.last_id if self._checkpoint.last_id is not None else self.documents.start - 1
+        self._resumed_from = since_id
+        if self._checkpoint.last_id is not None:
+            logger.info(f"Resuming backfill of {self.document_type.name} after {since_id}")
+
+        uphance_client = Uphance.get_client()
+        if not uphance_client.set_current_organisation(settings.UPHANCE_ORGANISATION):
+            raise SynchronizationError("Could not set the current Uphance organisation")
+        customer_context = CustomerResolutionContext(uphance_client, Snelstart.get_client(), self.trigger)
+
+        synchronised_ids = self.document_type.synchronised_ids(
+            uphance_id__gt=since_id, uphance_id__lt=self.documents.stop
+        )
+        logger.info(f"{len(synchronised_ids)} {self.document_type.name} in the range are already synchronised")
+
+        self._started_at = self._reported_at = time.monotonic()
+        documents = takewhile(
+            lambda x: x.id < self.documents.stop, self.document_type.iterate(uphance_client, since_id)
+        )
+        window: Deque[Tuple[int, Optional[Future], bool]] = deque()
+        with buffered_mutations(), ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for batch in batched(documents, self.batch_size):
+                pending = [document for document in batch if self.force_update or document.id not in synchronised_ids]
+                if self.document_type.prefetch is not None and len(pending) > 0:
+                    self.document_type.prefetch(customer_context, pending)
+
+                for document in batch:
+                    update = document.id in synchronised_ids
+                    if update and not self.force_update:
+                        window.append((document.id, None, update))
+                    else:
+                        # The workers record their Mutations in the recorder of this thread.
+                        future = executor.submit(
+                            contextvars.copy_context().run,
+                            self._synchronise,
+                            uphance_client,
+                            document,
+                            customer_context,
+                            update,
+                        )
+                        window.append((document.id, future, update))
+                    self._drain(window, 2 * self.workers)
+            self._drain(window, 0)
+
+        if not self._blocked:
+            BackfillCheckpoint.objects.filter(id=self._checkpoint.id).update(finished=timezone.now())
+        self._report(force=True)
+        if self.progress.failed > 0:
+            logger.warning(
+                f"Backfill of {self.document_type.name} {self.documents} is not finished, failed documents: "
+                f"{', '.join(str(document_id) for document_id in self.progress.failed_ids)}"
+            )
+        return self.progress
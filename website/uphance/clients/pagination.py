@@ -0,0 +1,58 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator
+
+from mode_groothandel.clients.utils import get_value_or_error, apply_from_data_or_error
+from uphance.clients.models.page_meta import PageMeta
+
+logger = logging.getLogger(__name__)
+
+
+def iterate_pages[T](
+    fetch_page: Callable[[int], dict],
+    objects_key: str,
+    from_data: Callable[[Any], T],
+    start_page: int = 1,
+    workers: int = 1,
+) -> Iterator[T]:
+    """
+    Iterate over the objects of all pages of an Uphance list endpoint.
+
+    The first page tells how many pages there are. While the objects of a page are processed by the caller, the next
+    pages are fetched by a pool of workers (only one when sweeping is not needed). Pages are yielded in order and
+    objects are only parsed when they are yielded, so at most `workers` raw pages are kept in memory. All requests go
+    through the client and thus respect the shared rate limiter.
+
+    :param fetch_page: function retrieving the raw response of a page number
+    :param objects_key: the key of the objects in the response
+    :param from_data: function converting raw object data to an object
+    :param start_page: the page to start at
+    :param workers: the maximum amount of pages fetched at the same time
+    """
+    workers = max(workers, 1)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="uphance-pages")
+    pending = deque([executor.submit(fetch_page, start_page)])
+    next_page_number = start_page + 1
+    last_page_number = None
+    try:
+        while len(pending) > 0:
+            response = pending.popleft().result()
+
+            if last_page_number is None:
+                meta = apply_from_data_or_error(PageMeta.from_data, response, "meta")
+                last_page_number = meta.total_pages if meta.next_page is not None else start_page
+                if last_page_number > start_page:
+                    logger.debug(
+                        "Fetching %s pages (%s objects) with %s workers", meta.total_pages, meta.total_count, workers
+                    )
+
+            while len(pending) < workers and next_page_number <= last_page_number:
+                pending.append(executor.submit(fetch_page, next_page_number))
+                next_page_number += 1
+
+            for data in get_value_or_error(response, objects_key):
+                yield from_data(data)
+    finally:
+        # The caller might stop iterating early, pages that are still being fetched are then discarded.
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,10 +1,13 @@
 import logging
-from typing import Optional
+from typing import Iterator, Optional
 
 from django.conf import settings
+from django.core.cache import cache
 
 from mode_groothandel.clients.api import ApiClient
-from mode_groothandel.clients.cache.cache import CacheFileHandler
+from mode_groothandel.clients.cache.cache import get_token_cache_handler
+from mode_groothandel.clients.rate_limit import get_rate_limiter
+from mode_groothandel.clients.registry import client_registry
 from mode_groothandel.clients.utils import (
     get_value_or_error,
     apply_from_data_or_error,
@@ -18,6 +21,7 @@ from uphance.clients.models.customer import Customer
 from uphance.clients.models.invoice import Invoice
 from uphance.clients.models.pick_ticket import PickTicket
 from uphance.clients.models.sales_order import SalesOrder
+from uphance.clients.pagination import iterate_pages
 
 logger = logging.getLogger(__name__)
 
@@ -27,21 +31,87 @@ class Uphance(ApiClient):
 
     @staticmethod
     def get_client() -> "Uphance":
+        return client_registry.get_or_create("uphance", Uphance._create_client)
+
+    @staticmethod
+    def _create_client() -> "Uphance":
         uphance_username = settings.UPHANCE_USERNAME
         uphance_password = settings.UPHANCE_PASSWORD
 
         cache_path = settings.UPHANCE_CACHE_PATH
 
         uphance_auth_client = UphanceAuthClient(
-            uphance_username, uphance_password, cache=CacheFileHandler(cache_path=cache_path)
+            uphance_username, uphance_password, cache=get_token_cache_handler("uphance", cache_path=cache_path)
         )
 
-        return Uphance("https://api.uphance.com/", auth_manager=uphance_auth_client)
+        return Uphance(
+            "https://api.uphance.com/",
+            auth_manager=uphance_auth_client,
+            pool_connections=settings.UPHANCE_POOL_CONNECTIONS,
+            pool_maxsize=settings.UPHANCE_POOL_MAXSIZE,
+            rate_limiter=get_rate_limiter(
+                "api.uphance.com", settings.UPHANCE_RATE_LIMIT, settings.UPHANCE_RATE_LIMIT_BURST
+            ),
+            rate_limit_retries=settings.RATE_LIMIT_RETRIES,
+        )
 
     @property
     def api_url(self) -> str:
         return self.prefix
 
+    def _get_page(self, endpoint: str, since_id: Optional[int] = None, page: int = 1) -> dict:
+        """Retrieve the raw response of a page of a list endpoint."""
+        queries = [("since_id", str(since_id) if since_id is not None else None), ("page", str(page))]
+        return self._get(endpoint + self._create_querystring_safe(queries))
+
+    @staticmethod
+    def _response_cache_key(url: str) -> str:
+        """Get the key a response is cached under, responses differ per organisation."""
+        return f"uphance:{settings.UPHANCE_ORGANISATION}:{url}"
+
+    def _get_cached(self, url: str, timeout: Optional[int]) -> dict:
+        """
+        Retrieve the raw response of an endpoint through the Django cache.
+
+        Responses are cached for timeout seconds, a timeout of 0 (or None) disables caching for the endpoint. Cached
+        responses are removed when a webhook indicates the object changed, see invalidate_customer and
+        invalidate_sales_order.
+        """
+        if not timeout:
+            return self._get(url)
+
+        key = self._response_cache_key(url)
+        response = cache.get(key, None)
+        if response is None:
+            response = self._get(url)
+            cache.set(key, response, timeout=timeout)
+        return response
+
+    @staticmethod
+    def _customer_url(customer_id: int) -> str:
+        return "customers/" + str(customer_id)
+
+    @staticmethod
+    def _order_url(order_id: int) -> str:
+        return f"sales_orders/{order_id}"
+
+    @staticmethod
+    def _orders_url(order_number: Optional[int]) -> str:
+        return "sales_orders/" + Uphance._create_querystring_safe([("by_order_number", str(order_number))])
+
+    @staticmethod
+    def invalidate_customer(customer_id: int) -> None:
+        """Remove a cached customer."""
+        cache.delete(Uphance._response_cache_key(Uphance._customer_url(customer_id)))
+
+    @staticmethod
+    def invalidate_sales_order(order_id: int, order_number: Optional[int] = None) -> None:
+        """Remove a cached sales order, and the cached sales orders with its order number."""
+        keys = [Uphance._response_cache_key(Uphance._order_url(order_id))]
+        if order_number is not None:
+            keys.append(Uphance._response_cache_key(Uphance._orders_url(order_number)))
+        cache.delete_many(keys)
+
     def organisations(self):
         return self._get("organisations")
 
@@ -66,24 +136,29 @@ class Uphance(ApiClient):
             return None
 
     def invoices(self, since_id: Optional[int] = None, page: int = 1) -> ApiPage[Invoice]:
-        queries = [("since_id", str(since_id) if since_id is not None else None), ("page", str(page))]
-        url = "invoices/" + self._create_querystring_safe(queries)
-        response = self._get(url)
+        response = self._get_page("invoices/", since_id=since_id, page=page)
         return ApiPage.from_response(response, "invoices", Invoice.from_data)
 
+    def iter_invoices(self, since_id: Optional[int] = None, workers: int = 1) -> Iterator[Invoice]:
+        """Iterate over all invoices (since since_id), the next `workers` pages are fetched in the background."""
+        return iterate_pages(
+            lambda page: self._get_page("invoices/", since_id=since_id, page=page),
+            "invoices",
+            Invoice.from_data,
+            workers=workers,
+        )
+
     def channels(self) -> list[Channel]:
         """Retrieve the channels from Uphance."""
         data = self._get("channels")
         return apply_from_data_to_list_or_error(Channel.from_data, data, "channels")
 
     def order(self, order_id: int) -> SalesOrder:
-        url = f"sales_orders/{order_id}"
-        response = self._get(url)
+        response = self._get_cached(self._order_url(order_id), settings.UPHANCE_SALES_ORDER_CACHE_TTL)
         return SalesOrder.from_data(response)
 
     def orders(self, order_number: Optional[int]) -> ApiPage[SalesOrder]:
-        url = "sales_orders/" + self._create_querystring_safe([("by_order_number", str(order_number))])
-        response = self._get(url)
+        response = self._get_cached(self._orders_url(order_number), settings.UPHANCE_SALES_ORDER_CACHE_TTL)
         return ApiPage.from_response(response, "sales_orders", SalesOrder.from_data)
 
     def credit_note(self, credit_note_id: int) -> CreditNote:
@@ -92,28 +167,46 @@ class Uphance(ApiClient):
         return apply_from_data_or_error(CreditNote.from_data, data, "credit_notes")
 
     def credit_notes(self, since_id: Optional[int] = None, page: int = 1) -> ApiPage[CreditNote]:
-        queries = [("since_id", str(since_id) if since_id is not None else None), ("page", str(page))]
-        url = "credit_notes/" + self._create_querystring_safe(queries)
-        response = self._get(url)
+        response = self._get_page("credit_notes/", since_id=since_id, page=page)
         return ApiPage.from_response(response, "credit_notes", CreditNote.from_data)
 
+    def iter_credit_notes(self, since_id: Optional[int] = None, workers: int = 1) -> Iterator[CreditNote]:
+        """Iterate over all credit notes (since since_id), the next `workers` pages are fetched in the background."""
+        return iterate_pages(
+            lambda page: self._get_page("credit_notes/", since_id=since_id, page=page),
+            "credit_notes",
+            CreditNote.from_data,
+            workers=workers,
+        )
+
     def pick_ticket(self, pick_ticket_id: int) -> PickTicket:
         url = f"pick_tickets/{pick_ticket_id}"
         data = self._get(url)
         return apply_from_data_or_error(PickTicket.from_data, data, "pick_ticket")
 
     def pick_tickets(self, since_id: Optional[int] = None, page: int = 1) -> ApiPage[PickTicket]:
-        queries = [("since_id", str(since_id) if since_id is not None else None), ("page", str(page))]
-        url = "pick_tickets/" + self._create_querystring_safe(queries)
-        response = self._get(url)
+        response = self._get_page("pick_tickets/", since_id=since_id, page=page)
         return ApiPage.from_response(response, "pick_tickets", PickTicket.from_data)
 
+    def iter_pick_tickets(self, since_id: Optional[int] = None, workers: int = 1) -> Iterator[PickTicket]:
+        """Iterate over all pick tickets (since since_id), the next `workers` pages are fetched in the background."""
+        return iterate_pages(
+            lambda page: self._get_page("pick_tickets/", since_id=since_id, page=page),
+            "pick_tickets",
+            PickTicket.from_data,
+            workers=workers,
+        )
+
     def customer_by_id(self, customer_id: int) -> Customer:
-        response = self._get("customers/" + str(customer_id))
+        response = self._get_cached(self._customer_url(customer_id), settings.UPHANCE_CUSTOMER_CACHE_TTL)
         return apply_from_data_or_error(Customer.from_data, response, "customer")
 
     def customers(self, page: int = 1) -> ApiPage[Customer]:
-        queries = [("page", str(page))]
-        url = "customers/" + self._create_querystring_safe(queries)
-        response = self._get(url)
+        response = self._get_page("customers/", page=page)
         return ApiPage.from_response(response, "customers", Customer.from_data)
+
+    def iter_customers(self, workers: int = 1) -> Iterator[Customer]:
+        """Iterate over all customers, the next `workers` pages are fetched in the background."""
+        return iterate_pages(
+            lambda page: self._get_page("customers/", page=page), "customers", Customer.from_data, workers=workers
+        )
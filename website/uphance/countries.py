@@ -0,0 +1,127 @@
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from mode_groothandel.snapshots import Snapshot
+from snelstart.models import CachedLand
+from uphance.models import Country
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ResolvedLand:
+    """A Snelstart land, detached from the database."""
+
+    snelstart_id: uuid.UUID
+    naam: str
+    landcode: str
+    landcode_iso: Optional[str]
+
+
+@dataclass(frozen=True)
+class ResolvedCountry:
+    """An Uphance country with its mappings, detached from the database."""
+
+    country_code: str
+    shipping_method_name: Optional[str]
+    mapped_land: Optional[ResolvedLand]
+
+
+@dataclass(frozen=True)
+class CountryData:
+    """The countries by country code and the Snelstart landen by landcode."""
+
+    countries: Dict[str, ResolvedCountry]
+    landen: Dict[str, List[ResolvedLand]]
+
+
+class CountryResolver:
+    """
+    Resolve Uphance countries and their Snelstart landen without querying the database.
+
+    The countries, landen and their mappings are loaded in a process-local snapshot, which is replaced as a whole when
+    signals indicate that a Country, CachedLand or CachedShippingMethod changed (e.g. in the admin or by
+    refresh_landen).
+    """
+
+    def __init__(self):
+        """Initialize a Country Resolver."""
+        self._snapshot = Snapshot("countries", self._load, ttl=settings.REFERENCE_DATA_SNAPSHOT_TTL)
+
+    @staticmethod
+    def _resolve_land(cached_land: CachedLand) -> ResolvedLand:
+        """Convert a CachedLand to a ResolvedLand."""
+        return ResolvedLand(
+            snelstart_id=cached_land.snelstart_id,
+            naam=cached_land.naam,
+            landcode=cached_land.landcode,
+            landcode_iso=cached_land.landcode_iso,
+        )
+
+    @staticmethod
+    def _load() -> CountryData:
+        """Load the countries and landen."""
+        landen = dict()
+        for cached_land in CachedLand.objects.all():
+            landen.setdefault(cached_land.landcode, list()).append(CountryResolver._resolve_land(cached_land))
+
+        countries = dict()
+        for country in Country.objects.select_related(
+            "mapped_shipping_method_for_pick_tickets", "mapped_country_code_in_snelstart"
+        ):
+            countries[country.country_code] = ResolvedCountry(
+                country_code=country.country_code,
+                shipping_method_name=(
+                    country.mapped_shipping_method_for_pick_tickets.name
+                    if country.mapped_shipping_method_for_pick_tickets is not None
+                    else None
+                ),
+                mapped_land=(
+                    CountryResolver._resolve_land(country.mapped_country_code_in_snelstart)
+                    if country.mapped_country_code_in_snelstart is not None
+                    else None
+                ),
+            )
+        return CountryData(countries=countries, landen=landen)
+
+    def get_country(self, country_code: str) -> ResolvedCountry:
+        """
+        Get an Uphance country.
+
+        Countries that are not known yet are created, so that they can be mapped in the admin.
+        """
+        country = self._snapshot.get().countries.get(country_code, None)
+        if country is not None:
+            return country
+
+        _, created = Country.objects.get_or_create(country_code=country_code)
+        if created:
+            logger.info("Created country %s", country_code)
+        # Reload, the country might have been created (and mapped) by another process after the snapshot was loaded.
+        self._snapshot.invalidate()
+        return self._snapshot.get().countries.get(
+            country_code, ResolvedCountry(country_code=country_code, shipping_method_name=None, mapped_land=None)
+        )
+
+    def get_land(self, country_code: str) -> Optional[ResolvedLand]:
+        """Get the Snelstart land of an Uphance country, returns None when it can not be determined."""
+        country = self.get_country(country_code)
+        if country.mapped_land is not None:
+            # If a custom mapping exists.
+            return country.mapped_land
+
+        landen = self._snapshot.get().landen.get(country_code, list())
+        if len(landen) != 1:
+            return None
+        return landen[0]
+
+    def invalidate(self) -> None:
+        """Invalidate the countries in all processes."""
+        self._snapshot.invalidate()
+
+
+country_resolver = CountryResolver()
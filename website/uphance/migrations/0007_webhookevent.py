@@ -0,0 +1,34 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("uphance", "0006_remove_taxmapping_tax_name_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookEvent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("event", models.CharField(max_length=100)),
+                ("payload", models.JSONField()),
+                (
+                    "status",
+                    models.PositiveIntegerField(
+                        choices=[(0, "Pending"), (1, "Processing"), (2, "Succeeded"), (3, "Failed")],
+                        db_index=True,
+                        default=0,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("message", models.TextField(blank=True, null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("claimed", models.DateTimeField(blank=True, null=True)),
+                ("processed", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("uphance", "0007_webhookevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncCursor",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("document_type", models.CharField(max_length=100, unique=True)),
+                ("last_id", models.IntegerField(blank=True, null=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
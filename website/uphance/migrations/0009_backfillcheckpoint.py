@@ -0,0 +1,34 @@
+# Generated by Django 6.0.9 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("uphance", "0008_synccursor"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BackfillCheckpoint",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("document_type", models.CharField(max_length=100)),
+                ("start", models.PositiveIntegerField()),
+                ("stop", models.PositiveIntegerField()),
+                (
+                    "last_id",
+                    models.PositiveIntegerField(
+                        blank=True, help_text="All documents up to and including this ID are handled.", null=True
+                    ),
+                ),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "unique_together": {("document_type", "start", "stop")},
+            },
+        ),
+    ]
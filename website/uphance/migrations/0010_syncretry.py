@@ -0,0 +1,27 @@
+# Generated by Django 6.0.9 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("uphance", "0009_backfillcheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncRetry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("document_type", models.CharField(max_length=100)),
+                ("uphance_id", models.IntegerField()),
+                ("attempts", models.PositiveIntegerField(default=1)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "unique_together": {("document_type", "uphance_id")},
+            },
+        ),
+    ]
@@ -57,3 +57,82 @@ class TaxMapping(models.Model):
 
     class Meta:
         unique_together = ("channel_mapping", "tax_amount")
+
+
+class WebhookEvent(models.Model):
+    """Webhook received from Uphance that is waiting to be (or has been) processed."""
+
+    STATUS_PENDING = 0
+    STATUS_PROCESSING = 1
+    STATUS_SUCCEEDED = 2
+    STATUS_FAILED = 3
+
+    STATUSES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_PROCESSING, "Processing"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    event = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.PositiveIntegerField(choices=STATUSES, default=STATUS_PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    message = models.TextField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    claimed = models.DateTimeField(null=True, blank=True)
+    processed = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        """Convert this object to string."""
+        return f"{self.event} webhook ({self.id})"
+
+
+class SyncCursor(models.Model):
+    """The ID of the last Uphance document of a type that was handled by the periodic synchronisation."""
+
+    document_type = models.CharField(max_length=100, unique=True)
+    last_id = models.IntegerField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Convert this object to string."""
+        return f"Synchronisation cursor for {self.document_type} ({self.last_id})"
+
+
+class SyncRetry(models.Model):
+    """An Uphance document that was not synchronised by the periodic synchronisation and is retried in later runs."""
+
+    document_type = models.CharField(max_length=100)
+    uphance_id = models.IntegerField()
+    attempts = models.PositiveIntegerField(default=1)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Convert this object to string."""
+        return f"Retry of {self.document_type} {self.uphance_id} ({self.attempts} attempts)"
+
+    class Meta:
+        unique_together = (("document_type", "uphance_id"),)
+
+
+class BackfillCheckpoint(models.Model):
+    """Progress of a backfill of a range of Uphance documents, so that an interrupted backfill can be resumed."""
+
+    document_type = models.CharField(max_length=100)
+    start = models.PositiveIntegerField()
+    stop = models.PositiveIntegerField()
+    last_id = models.PositiveIntegerField(
+        null=True, blank=True, help_text="All documents up to and including this ID are handled."
+    )
+    finished = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Convert this object to string."""
+        return f"Backfill of {self.document_type} {self.start}-{self.stop} ({self.last_id})"
+
+    class Meta:
+        unique_together = (("document_type", "start", "stop"),)
@@ -1,5 +1,35 @@
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models import F, Max
+from django.utils import timezone
+
+from credit_notes.models import CreditNote
+from customers.resolution import CustomerResolutionContext
+from credit_notes.services import try_create_credit_note, try_delete_credit_note, try_update_credit_note
+from invoices.models import Invoice
+from invoices.services import try_create_invoice, try_delete_invoice, try_update_invoice
+from mode_groothandel.clients.utils import get_value_or_error
+from mode_groothandel.exceptions import SynchronizationError, is_transient_error
+from mode_groothandel.reconciliation import reconcile
+from mutations.models import Mutation
+from mutations.services import buffered_mutations
+from pick_tickets.models import PickTicket
+from pick_tickets.services import try_create_pick_ticket, try_delete_pick_ticket, try_create_or_update_pick_ticket
+from sendcloud.client.sendcloud import Sendcloud
+from snelstart.clients.snelstart import Snelstart
+from uphance.clients.models.credit_note import CreditNote as UphanceCreditNote
+from uphance.clients.models.invoice import Invoice as UphanceInvoice
+from uphance.clients.models.pick_ticket import PickTicket as UphancePickTicket
 from uphance.clients.uphance import Uphance
-from uphance.models import CachedChannel
+from uphance.models import CachedChannel, SyncCursor, SyncRetry, WebhookEvent
+
+logger = logging.getLogger(__name__)
 
 
 def refresh_cached_channels() -> (int, int, int):
@@ -7,30 +37,370 @@ def refresh_cached_channels() -> (int, int, int):
 
     channels = uphance.channels()
 
-    channels_created, channels_updated = list(), list()
+    return reconcile(
+        CachedChannel,
+        ["channel_id"],
+        (
+            {
+                "channel_id": channel.channel_id,
+                "name": channel.channel_name,
+                "currency": channel.currency,
+            }
+            for channel in channels
+        ),
+    ).as_tuple()
+
+
+def _create_invoice(invoice: dict) -> Optional[Exception]:
+    """Create an invoice in Snelstart."""
+    invoice = UphanceInvoice.from_data(invoice)
+    return try_create_invoice(Uphance.get_client(), Snelstart.get_client(), invoice, Mutation.TRIGGER_WEBHOOK)
+
+
+def _update_invoice(invoice: dict) -> Optional[Exception]:
+    """Update an invoice in Snelstart."""
+    invoice = UphanceInvoice.from_data(invoice)
+    return try_update_invoice(Uphance.get_client(), Snelstart.get_client(), invoice, Mutation.TRIGGER_WEBHOOK)
+
+
+def _delete_invoice(invoice: dict) -> Optional[Exception]:
+    """Delete an invoice from Snelstart."""
+    invoice_id = get_value_or_error(invoice, "id")
+    return try_delete_invoice(Snelstart.get_client(), invoice_id, Mutation.TRIGGER_WEBHOOK)
+
+
+def _create_credit_note(credit_note: dict) -> Optional[Exception]:
+    """Create a credit note in Snelstart."""
+    credit_note = UphanceCreditNote.from_data(credit_note)
+    return try_create_credit_note(Uphance.get_client(), Snelstart.get_client(), credit_note, Mutation.TRIGGER_WEBHOOK)
+
+
+def _update_credit_note(credit_note: dict) -> Optional[Exception]:
+    """Update a credit note in Snelstart."""
+    credit_note = UphanceCreditNote.from_data(credit_note)
+    return try_update_credit_note(Uphance.get_client(), Snelstart.get_client(), credit_note, Mutation.TRIGGER_WEBHOOK)
+
+
+def _delete_credit_note(credit_note: dict) -> Optional[Exception]:
+    """Delete a credit note from Snelstart."""
+    credit_note_id = get_value_or_error(credit_note, "id")
+    return try_delete_credit_note(Snelstart.get_client(), credit_note_id, Mutation.TRIGGER_WEBHOOK)
+
+
+def _create_pick_ticket(pick_ticket: dict) -> Optional[Exception]:
+    """Create a pick ticket in Sendcloud."""
+    pick_ticket = UphancePickTicket.from_data(pick_ticket)
+    return try_create_pick_ticket(Sendcloud.get_client(), pick_ticket, Mutation.TRIGGER_WEBHOOK)
+
+
+def _create_or_update_pick_ticket(pick_ticket: dict) -> Optional[Exception]:
+    """Create or update a pick ticket in Sendcloud."""
+    pick_ticket = UphancePickTicket.from_data(pick_ticket)
+    return try_create_or_update_pick_ticket(Sendcloud.get_client(), pick_ticket, Mutation.TRIGGER_WEBHOOK)
+
+
+def _delete_pick_ticket(pick_ticket: dict) -> Optional[Exception]:
+    """Delete a pick ticket from Sendcloud."""
+    pick_ticket_id = get_value_or_error(pick_ticket, "id")
+    return try_delete_pick_ticket(Sendcloud.get_client(), pick_ticket_id, Mutation.TRIGGER_WEBHOOK)
+
+
+# Maps a webhook event to the key of the object in the payload and the function handling it. A handler returns the
+# error when the synchronisation failed.
+WEBHOOK_EVENT_HANDLERS: Dict[str, Tuple[str, Callable[[dict], Optional[Exception]]]] = {
+    "invoice_create": ("invoice", _create_invoice),
+    "invoice_update": ("invoice", _update_invoice),
+    "invoice_delete": ("invoice", _delete_invoice),
+    "credit_note_create": ("credit_note", _create_credit_note),
+    "credit_note_update": ("credit_note", _update_credit_note),
+    "credit_note_delete": ("credit_note", _delete_credit_note),
+    "pick_ticket_create": ("pick_ticket", _create_pick_ticket),
+    "pick_ticket_update": ("pick_ticket", _create_or_update_pick_ticket),
+    "pick_ticket_delete": ("pick_ticket", _delete_pick_ticket),
+}
+
+
+def claim_webhook_event(webhook_event_id: int) -> bool:
+    """Mark a pending webhook event as processing, returns False if another worker already claimed it."""
+    claimed = WebhookEvent.objects.filter(id=webhook_event_id, status=WebhookEvent.STATUS_PENDING).update(
+        status=WebhookEvent.STATUS_PROCESSING, attempts=F("attempts") + 1, claimed=timezone.now()
+    )
+    return claimed == 1
+
+
+def process_webhook_event(webhook_event_id: int) -> bool:
+    """
+    Process a webhook event from the inbox.
+
+    An event of which the synchronisation failed with a transient error (see is_transient_error) or an unexpected
+    exception is put back in the inbox until WEBHOOK_MAXIMUM_ATTEMPTS is reached, other failures are permanent.
+    Returns True when the event should be processed again later.
+    """
+    if not claim_webhook_event(webhook_event_id):
+        return False
+
+    webhook_event = WebhookEvent.objects.get(id=webhook_event_id)
+
+    try:
+        object_key, handler = WEBHOOK_EVENT_HANDLERS[webhook_event.event]
+        error = handler(get_value_or_error(webhook_event.payload, object_key))
+        transient = error is not None and is_transient_error(error)
+    except Exception as e:
+        error, transient = e, True
+
+    if error is not None:
+        logger.error(f"An error occurred while processing webhook event {webhook_event.id}: {error}")
+        if transient and webhook_event.attempts < settings.WEBHOOK_MAXIMUM_ATTEMPTS:
+            webhook_event.status = WebhookEvent.STATUS_PENDING
+        else:
+            webhook_event.status = WebhookEvent.STATUS_FAILED
+            webhook_event.processed = timezone.now()
+        webhook_event.message = str(error)
+        webhook_event.save(update_fields=["status", "message", "processed"])
+        return webhook_event.status == WebhookEvent.STATUS_PENDING
+
+    webhook_event.status = WebhookEvent.STATUS_SUCCEEDED
+    webhook_event.message = None
+    webhook_event.processed = timezone.now()
+    webhook_event.save(update_fields=["status", "message", "processed"])
+    return False
+
+
+def release_stale_webhook_events() -> Tuple[int, int]:
+    """Put webhook events that are processing for too long (e.g. a killed worker) back in the inbox."""
+    stale_before = timezone.now() - timedelta(seconds=settings.WEBHOOK_PROCESSING_TIMEOUT)
+    stale_webhook_events = WebhookEvent.objects.filter(status=WebhookEvent.STATUS_PROCESSING, claimed__lt=stale_before)
+
+    released = stale_webhook_events.filter(attempts__lt=settings.WEBHOOK_MAXIMUM_ATTEMPTS).update(
+        status=WebhookEvent.STATUS_PENDING
+    )
+    failed = stale_webhook_events.update(
+        status=WebhookEvent.STATUS_FAILED,
+        processed=timezone.now(),
+        message="Processing did not finish within the processing timeout",
+    )
+    return released, failed
+
+
+@dataclass(frozen=True)
+class DocumentType:
+    """A type of Uphance document that is synchronised periodically."""
+
+    name: str
+    # The model storing the synchronised documents, with an uphance_id field.
+    model: type[models.Model]
+    # The field of the model that is set once the document is synchronised.
+    synchronised_field: str
+    # The setting with the maximum amount of documents to synchronise per run.
+    maximum_setting: str
+    # Iterate over the documents in Uphance with an ID higher than since_id.
+    iterate: Callable[[Uphance, Optional[int]], Iterator[Any]]
+    # Retrieve one document from Uphance by its ID.
+    get: Callable[[Uphance, int], Optional[Any]]
+    # Synchronise one document, the unit of work of the poller. Returns the error when the synchronisation failed.
+    synchronise: Callable[[Uphance, Any, int, CustomerResolutionContext], Optional[Exception]]
+    # Update one document that is already synchronised. Returns the error when the update failed.
+    update: Callable[[Uphance, Any, int, CustomerResolutionContext], Optional[Exception]]
+    # Resolve the customers of a batch of documents before they are synchronised.
+    prefetch: Optional[Callable[[CustomerResolutionContext, List[Any]], None]] = None
+
+    def is_synchronised(self, uphance_id: int) -> bool:
+        """Whether a document is synchronised."""
+        return uphance_id in self.synchronised_ids(uphance_id=uphance_id)
+
+    def synchronised_ids(self, **filters) -> Set[int]:
+        """Get the Uphance IDs of the synchronised documents matching filters with one query."""
+        return set(
+            self.model.objects.filter(**filters)
+            .exclude(**{self.synchronised_field: None})
+            .values_list("uphance_id", flat=True)
+        )
+
+
+INVOICES = DocumentType(
+    name="invoices",
+    model=Invoice,
+    synchronised_field="snelstart_id",
+    maximum_setting="MAXIMUM_AMOUNT_OF_INVOICES_TO_SYNC",
+    iterate=lambda uphance_client, since_id: uphance_client.iter_invoices(since_id=since_id),
+    get=lambda uphance_client, invoice_id: uphance_client.invoice(invoice_id),
+    synchronise=lambda uphance_client, invoice, trigger, customer_context: try_create_invoice(
+        uphance_client, Snelstart.get_client(), invoice, trigger, customer_context
+    ),
+    update=lambda uphance_client, invoice, trigger, customer_context: try_update_invoice(
+        uphance_client, Snelstart.get_client(), invoice, trigger, customer_context
+    ),
+    prefetch=lambda customer_context, invoices: customer_context.prefetch_customers(
+        invoice.company_id for invoice in invoices
+    ),
+)
+
+CREDIT_NOTES = DocumentType(
+    name="credit_notes",
+    model=CreditNote,
+    synchronised_field="snelstart_id",
+    maximum_setting="MAXIMUM_AMOUNT_OF_CREDIT_NOTES_TO_SYNC",
+    iterate=lambda uphance_client, since_id: uphance_client.iter_credit_notes(since_id=since_id),
+    get=lambda uphance_client, credit_note_id: uphance_client.credit_note(credit_note_id),
+    synchronise=lambda uphance_client, credit_note, trigger, customer_context: try_create_credit_note(
+        uphance_client, Snelstart.get_client(), credit_note, trigger, customer_context
+    ),
+    update=lambda uphance_client, credit_note, trigger, customer_context: try_update_credit_note(
+        uphance_client, Snelstart.get_client(), credit_note, trigger, customer_context
+    ),
+    prefetch=lambda customer_context, credit_notes: customer_context.prefetch_orders(
+        credit_note.order_number for credit_note in credit_notes
+    ),
+)
+
+PICK_TICKETS = DocumentType(
+    name="pick_tickets",
+    model=PickTicket,
+    synchronised_field="sendcloud_id",
+    maximum_setting="MAXIMUM_AMOUNT_OF_PICK_TICKETS_TO_SYNC",
+    iterate=lambda uphance_client, since_id: uphance_client.iter_pick_tickets(since_id=since_id),
+    get=lambda uphance_client, pick_ticket_id: uphance_client.pick_ticket(pick_ticket_id),
+    synchronise=lambda uphance_client, pick_ticket, trigger, customer_context: try_create_or_update_pick_ticket(
+        Sendcloud.get_client(), pick_ticket, trigger
+    ),
+    update=lambda uphance_client, pick_ticket, trigger, customer_context: try_create_or_update_pick_ticket(
+        Sendcloud.get_client(), pick_ticket, trigger
+    ),
+)
+
+
+def get_or_create_sync_cursor(document_type: DocumentType) -> SyncCursor:
+    """Get the cursor of a document type, a new cursor starts at the highest Uphance ID in the database."""
+    try:
+        return SyncCursor.objects.get(document_type=document_type.name)
+    except SyncCursor.DoesNotExist:
+        last_id = document_type.model.objects.aggregate(last_id=Max("uphance_id"))["last_id"]
+        cursor, _ = SyncCursor.objects.get_or_create(document_type=document_type.name, defaults={"last_id": last_id})
+        return cursor
+
+
+def _record_failed_document(document_type: DocumentType, uphance_id: int) -> None:
+    """Remember a document that is not synchronised after the unit of work, so that later runs retry it."""
+    retry = SyncRetry.objects.filter(document_type=document_type.name, uphance_id=uphance_id).first()
+    if retry is None:
+        SyncRetry.objects.create(document_type=document_type.name, uphance_id=uphance_id)
+        return
+
+    retry.attempts += 1
+    retry.save(update_fields=["attempts", "updated"])
+    if retry.attempts >= settings.SYNC_MAXIMUM_ATTEMPTS:
+        logger.warning(f"Stopped retrying {document_type.name} {uphance_id} after {retry.attempts} attempts")
+
+
+def retry_documents(
+    document_type: DocumentType,
+    uphance_client: Uphance,
+    customer_context: CustomerResolutionContext,
+    trigger: int,
+    maximum: Optional[int] = None,
+) -> int:
+    """
+    Retry documents that were not synchronised by earlier runs, returns the amount of documents synchronised.
+
+    Every document is retried at most SYNC_MAXIMUM_ATTEMPTS times. A document is forgotten when it is synchronised
+    (also when it was synchronised by a webhook) or when it does not exist in Uphance anymore.
+    """
+    retries = SyncRetry.objects.filter(
+        document_type=document_type.name, attempts__lt=settings.SYNC_MAXIMUM_ATTEMPTS
+    ).order_by("uphance_id")
+    if maximum is not None:
+        retries = retries[:maximum]
+
+    synchronised = 0
+    for retry in retries:
+        if document_type.is_synchronised(retry.uphance_id):
+            retry.delete()
+            continue
 
-    for channel in channels:
         try:
-            cached_channel = CachedChannel.objects.get(channel_id=channel.channel_id)
-            cached_channel.name = channel.channel_name
-            cached_channel.currency = channel.currency
-            cached_channel.save()
-            channels_updated.append(cached_channel)
-        except CachedChannel.DoesNotExist:
-            created_channel = CachedChannel.objects.create(
-                channel_id=channel.channel_id,
-                name=channel.channel_name,
-                currency=channel.currency,
-            )
-            channels_created.append(created_channel)
+            document = document_type.get(uphance_client, retry.uphance_id)
+            if document is None:
+                logger.info(f"Stopped retrying {document_type.name} {retry.uphance_id} as it does not exist anymore")
+                retry.delete()
+                continue
+            document_type.synchronise(uphance_client, document, trigger, customer_context)
+        except Exception as e:
+            logger.error(f"An error occurred while retrying {document_type.name} {retry.uphance_id}: {e}")
+
+        if document_type.is_synchronised(retry.uphance_id):
+            retry.delete()
+            synchronised += 1
+        else:
+            _record_failed_document(document_type, retry.uphance_id)
+    return synchronised
+
+
+def poll_documents(document_type: DocumentType, trigger: int = Mutation.TRIGGER_CRON) -> Tuple[int, int]:
+    """
+    Synchronise documents created in Uphance since the cursor of a document type.
 
-    # Remove all non-updated channels
-    created_channel_ids = [x.id for x in channels_created]
-    updated_channel_ids = [x.id for x in channels_updated]
+    Pages are drained until the maximum amount of documents per run is synchronised. Documents that are already
+    synchronised (e.g. by a webhook) are skipped. The cursor is advanced over every handled document, a document that
+    failed (recorded as a failed Mutation by the unit of work) or was ignored (e.g. a pick ticket that is not shipped
+    yet) is remembered and retried by later runs (see retry_documents) before the new documents. When the unit of work
+    raises, the run stops. The customers of the documents in a run are resolved once, before the first document is
+    synchronised. The Mutations of a run are written in bulk.
 
-    all_ids = created_channel_ids + updated_channel_ids
+    Returns the amount of documents synchronised (including retried documents) and skipped.
+    """
+    lock_key = f"sync-cursor:{document_type.name}:lock"
+    if not cache.add(lock_key, timezone.now().isoformat(), timeout=settings.SYNC_CURSOR_LOCK_TIMEOUT):
+        logger.info(f"Synchronisation of {document_type.name} is already running")
+        return 0, 0
 
-    channels_untouched = CachedChannel.objects.exclude(id__in=all_ids)
-    channels_deleted_count, _ = channels_untouched.delete()
+    try:
+        with buffered_mutations():
+            uphance_client = Uphance.get_client()
+            if not uphance_client.set_current_organisation(settings.UPHANCE_ORGANISATION):
+                raise SynchronizationError("Could not set the current Uphance organisation")
 
-    return len(channels_created), len(channels_updated), channels_deleted_count
+            cursor = get_or_create_sync_cursor(document_type)
+            maximum = getattr(settings, document_type.maximum_setting)
+
+            synchronised_ids = document_type.synchronised_ids(uphance_id__gt=cursor.last_id or 0)
+
+            # Collect the batch first, so that the customers of all documents can be resolved before any is posted.
+            documents, pending = list(), list()
+            for document in document_type.iterate(uphance_client, cursor.last_id):
+                if maximum is not None and len(pending) >= maximum:
+                    break
+                documents.append(document)
+                if document.id not in synchronised_ids:
+                    pending.append(document)
+
+            customer_context = CustomerResolutionContext(uphance_client, Snelstart.get_client(), trigger)
+            if document_type.prefetch is not None and len(pending) > 0:
+                document_type.prefetch(customer_context, pending)
+
+            # Retried before the new documents, so documents failing in this run are only retried by the next run.
+            retried = retry_documents(document_type, uphance_client, customer_context, trigger, maximum)
+
+            last_id = cursor.last_id
+            synchronised, skipped, failed = 0, 0, 0
+            for document in documents:
+                if document.id in synchronised_ids:
+                    skipped += 1
+                else:
+                    document_type.synchronise(uphance_client, document, trigger, customer_context)
+                    if document_type.is_synchronised(document.id):
+                        synchronised += 1
+                    else:
+                        _record_failed_document(document_type, document.id)
+                        failed += 1
+
+                if last_id is None or document.id > last_id:
+                    last_id = document.id
+                    SyncCursor.objects.filter(id=cursor.id).update(last_id=last_id, updated=timezone.now())
+
+            logger.info(
+                f"Synchronised {synchronised}, retried {retried}, skipped {skipped} and failed {failed} "
+                f"{document_type.name}"
+            )
+            return synchronised + retried, skipped
+    finally:
+        cache.delete(lock_key)
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from mode_groothandel.reconciliation import reconciled
+from sendcloud.models import CachedShippingMethod
+from snelstart.models import CachedBtwTarief, CachedLand
+from uphance.countries import country_resolver
+from uphance.models import TaxMapping, ChannelMapping, CachedChannel, Country
+from uphance.tax_mappings import tax_mapping_resolver
+
+
+@receiver(post_save, sender=TaxMapping)
+@receiver(post_delete, sender=TaxMapping)
+@receiver(post_save, sender=ChannelMapping)
+@receiver(post_delete, sender=ChannelMapping)
+@receiver(post_save, sender=CachedChannel)
+@receiver(post_delete, sender=CachedChannel)
+@receiver(reconciled, sender=CachedChannel)
+@receiver(post_save, sender=CachedBtwTarief)
+@receiver(post_delete, sender=CachedBtwTarief)
+@receiver(reconciled, sender=CachedBtwTarief)
+def invalidate_tax_mappings(sender, **kwargs):
+    """Invalidate the tax mappings when one of the models they are loaded from changes."""
+    tax_mapping_resolver.invalidate()
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+@receiver(post_save, sender=CachedLand)
+@receiver(post_delete, sender=CachedLand)
+@receiver(reconciled, sender=CachedLand)
+@receiver(post_save, sender=CachedShippingMethod)
+@receiver(post_delete, sender=CachedShippingMethod)
+@receiver(reconciled, sender=CachedShippingMethod)
+def invalidate_countries(sender, **kwargs):
+    """Invalidate the countries when one of the models they are loaded from changes."""
+    country_resolver.invalidate()
@@ -0,0 +1,21 @@
+from celery import shared_task
+
+from uphance.models import WebhookEvent
+from uphance.services import process_webhook_event as process_webhook_event_service, release_stale_webhook_events
+
+
+@shared_task(bind=True, max_retries=None)
+def process_webhook_event(self, webhook_event_id: int):
+    """Process a webhook event from the inbox."""
+    if process_webhook_event_service(webhook_event_id):
+        raise self.retry(countdown=min(60 * 2**self.request.retries, 3600))
+
+
+@shared_task
+def requeue_webhook_events():
+    """Enqueue all pending webhook events, for example when the broker lost them or a worker was killed."""
+    release_stale_webhook_events()
+    for webhook_event_id in WebhookEvent.objects.filter(status=WebhookEvent.STATUS_PENDING).values_list(
+        "id", flat=True
+    ):
+        process_webhook_event.delay(webhook_event_id)
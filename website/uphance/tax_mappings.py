@@ -0,0 +1,75 @@
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List
+
+from django.conf import settings
+
+from mode_groothandel.snapshots import Snapshot
+from uphance.models import TaxMapping
+
+
+@dataclass(frozen=True)
+class ResolvedTaxMapping:
+    """A tax mapping with its tax type, detached from the database."""
+
+    id: int
+    grootboekcode: uuid.UUID
+    grootboekcode_shipping: uuid.UUID
+    btw_soort: str
+    btw_percentage: float
+
+
+def percentage_key(percentage: float | int | str | Decimal) -> Decimal:
+    """Convert a tax percentage to an exact key, so 21, 21.0 and "21.00" are equal and float errors are ignored."""
+    return Decimal(str(percentage)).quantize(Decimal("0.01"))
+
+
+class TaxMappingResolver:
+    """
+    Resolve the tax mapping of a channel for a tax percentage without querying the database.
+
+    The tax mappings of all channels are loaded in a process-local snapshot, which is invalidated by signals when a
+    TaxMapping, ChannelMapping, CachedChannel or CachedBtwTarief changes.
+    """
+
+    def __init__(self):
+        """Initialize a Tax Mapping Resolver."""
+        self._snapshot = Snapshot("tax-mappings", self._load, ttl=settings.REFERENCE_DATA_SNAPSHOT_TTL)
+
+    @staticmethod
+    def _load() -> Dict[int, Dict[Decimal, List[ResolvedTaxMapping]]]:
+        """Load the tax mappings per channel ID and tax percentage."""
+        tax_mappings = dict()
+        for tax_mapping in TaxMapping.objects.select_related("channel_mapping__channel", "tax_amount"):
+            channel_tax_mappings = tax_mappings.setdefault(tax_mapping.channel_mapping.channel.channel_id, dict())
+            channel_tax_mappings.setdefault(percentage_key(tax_mapping.tax_amount.btw_percentage), list()).append(
+                ResolvedTaxMapping(
+                    id=tax_mapping.id,
+                    grootboekcode=tax_mapping.grootboekcode,
+                    grootboekcode_shipping=tax_mapping.grootboekcode_shipping,
+                    btw_soort=tax_mapping.tax_amount.btw_soort,
+                    btw_percentage=tax_mapping.tax_amount.btw_percentage,
+                )
+            )
+        return tax_mappings
+
+    def get(self, channel_id: int, percentage: float | int | str | Decimal) -> ResolvedTaxMapping:
+        """
+        Get the tax mapping of a channel for a tax percentage.
+
+        Raises TaxMapping.DoesNotExist or TaxMapping.MultipleObjectsReturned like a queryset get would.
+        """
+        tax_mappings = self._snapshot.get().get(channel_id, dict()).get(percentage_key(percentage), list())
+        if len(tax_mappings) == 0:
+            raise TaxMapping.DoesNotExist(f"Tax mapping for {percentage} in channel {channel_id} does not exist")
+        elif len(tax_mappings) > 1:
+            raise TaxMapping.MultipleObjectsReturned(f"Multiple tax mappings for {percentage} in channel {channel_id}")
+        return tax_mappings[0]
+
+    def invalidate(self) -> None:
+        """Invalidate the tax mappings in all processes."""
+        self._snapshot.invalidate()
+
+
+tax_mapping_resolver = TaxMappingResolver()